@@ -1,2 +1,7 @@
-from setkit.datasets.base.dataset import RootflowDataItem, RootflowDataset
+from setkit.datasets.base.dataset import (
+    RootflowDataItem,
+    RootflowDataset,
+    ShardedRootflowDataset,
+)
+from setkit.datasets.base.iterable import IterableRootflowDataset
 from setkit.datasets.base.loader import RootflowDataLoader
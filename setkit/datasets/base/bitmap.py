@@ -0,0 +1,771 @@
+"""Compressed bitmaps of dataset indices.
+
+Houses :class:`IndexBitmap`, a roaring style bitmap which the indices of a
+:class:`RootflowDatasetView` may be stored as, such as the result of
+:meth:`FunctionalDataset.where`. A view keeping 90% of a large dataset would otherwise
+hold an index for every one of its items, where a bitmap holds a bit per item of the
+underlying dataset at most, and much less for long runs of kept (or removed) items.
+
+The indices are split by their upper bits into containers of :data:`CONTAINER_SIZE`
+indices each, and each container is stored in whichever of three forms is smallest
+for the indices it holds:
+    * :class:`ArrayContainer`, a sorted array of the indices, for sparse containers.
+    * :class:`BitmapContainer`, a bit for each possible index, for dense containers.
+    * :class:`RunContainer`, the first and last index of each run of consecutive
+      indices, for containers with few runs (such as nearly full containers).
+
+The number of indices before each container, and the number before each word of
+bitmap containers or each run of run containers, are kept as well, so the index at a
+position (its select) and the position of an index (its rank) take a binary search
+over containers and a constant amount of work within one. Set operations between
+bitmaps are done container by container, as bitwise operations on the words of the
+containers.
+
+Attributes:
+    CONTAINER_BITS: The number of lower bits of an index, which are stored in its
+        container.
+    CONTAINER_SIZE: The number of indices each container covers.
+    ARRAY_CONTAINER_LIMIT: The largest number of indices an :class:`ArrayContainer`
+        holds, beyond which a :class:`BitmapContainer` is smaller.
+"""
+
+from typing import Callable, Iterable, Iterator, List, Sequence, Union
+import numpy as np
+
+CONTAINER_BITS = 16
+CONTAINER_SIZE = 1 << CONTAINER_BITS
+ARRAY_CONTAINER_LIMIT = 4096
+
+_BYTE_BITS = np.unpackbits(
+    np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder="little"
+)
+_BYTE_POPCOUNT = _BYTE_BITS.sum(axis=1, dtype=np.uint8)
+# The position of the k-th set bit of each byte, for each k
+_BYTE_SELECT = np.array(
+    [np.resize(np.flatnonzero(bits), 8) for bits in _BYTE_BITS], dtype=np.int64
+)
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Counts the set bits of each 64 bit word"""
+    counts = _BYTE_POPCOUNT[words.astype("<u8").view(np.uint8)]
+    return counts.reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+def _select_in_words(words: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    """Finds the bit of each word with the given number of set bits below it"""
+    word_bytes = words.astype("<u8").view(np.uint8).reshape(-1, 8)
+    byte_ranks = np.cumsum(_BYTE_POPCOUNT[word_bytes], axis=1, dtype=np.uint8)
+    byte_indices = np.sum(byte_ranks <= ranks[:, None], axis=1)
+    rows = np.arange(len(words))
+    ranks_in_byte = ranks - np.where(
+        byte_indices > 0, byte_ranks[rows, byte_indices - 1], 0
+    )
+    return (
+        byte_indices * 8 + _BYTE_SELECT[word_bytes[rows, byte_indices], ranks_in_byte]
+    )
+
+
+def _mask_words(mask: np.ndarray) -> np.ndarray:
+    """Packs a boolean mask of a container into its 64 bit words"""
+    return np.packbits(mask, bitorder="little").view("<u8")
+
+
+def _words_mask(words: np.ndarray) -> np.ndarray:
+    """Unpacks the 64 bit words of a container into a boolean mask"""
+    return np.unpackbits(words.astype("<u8").view(np.uint8), bitorder="little").view(
+        np.bool_
+    )
+
+
+class Container:
+    """The indices of a bitmap which share their upper bits.
+
+    Indices within a container are its lower bits, in `[0, CONTAINER_SIZE)`.
+    Subclasses implement each operation for one form of storage.
+
+    Attributes:
+        cardinality (int): The number of indices in the container.
+    """
+
+    cardinality: int
+
+    def select(self, position: int) -> int:
+        """Returns the index at a position within the container"""
+        raise NotImplementedError
+
+    def rank(self, values: np.ndarray) -> np.ndarray:
+        """Returns the number of indices in the container less than each value"""
+        raise NotImplementedError
+
+    def values(self) -> np.ndarray:
+        """Returns every index of the container, in ascending order"""
+        raise NotImplementedError
+
+    def mask(self) -> np.ndarray:
+        """Returns a boolean mask of the indices of the container"""
+        mask = np.zeros(CONTAINER_SIZE, dtype=bool)
+        mask[self.values()] = True
+        return mask
+
+    def words(self) -> np.ndarray:
+        """Returns the container as the 64 bit words of a bitmap"""
+        return _mask_words(self.mask())
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of the arrays of the container"""
+        raise NotImplementedError
+
+
+class ArrayContainer(Container):
+    """Stores the indices of a container as a sorted array.
+
+    Attributes:
+        indices (np.ndarray): The sorted indices, as 16 bit integers.
+    """
+
+    def __init__(self, indices: np.ndarray) -> None:
+        self.indices = indices.astype(np.uint16)
+        self.cardinality = len(indices)
+
+    def select(self, position: int) -> int:
+        return int(self.indices[position])
+
+    def rank(self, values: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.indices, values)
+
+    def values(self) -> np.ndarray:
+        return self.indices.astype(np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        return self.indices.nbytes
+
+
+class BitmapContainer(Container):
+    """Stores the indices of a container as a bit for each possible index.
+
+    Attributes:
+        bitmap (np.ndarray): The bits, as 64 bit words.
+        word_ranks (np.ndarray): The number of indices before each word.
+    """
+
+    def __init__(self, bitmap: np.ndarray) -> None:
+        self.bitmap = bitmap
+        counts = _popcount(bitmap)
+        # At most 65472 indices precede the last word, so the ranks fit 16 bits
+        self.word_ranks = np.concatenate(([0], np.cumsum(counts[:-1]))).astype(
+            np.uint16
+        )
+        self.cardinality = int(self.word_ranks[-1]) + int(counts[-1])
+
+    def select(self, position: int) -> int:
+        word_index = int(np.searchsorted(self.word_ranks, position, side="right")) - 1
+        word = int(self.bitmap[word_index])
+        # Clear the lower set bits of the word, up to the one selected
+        for _ in range(position - int(self.word_ranks[word_index])):
+            word &= word - 1
+        return word_index * 64 + (word & -word).bit_length() - 1
+
+    def rank(self, values: np.ndarray) -> np.ndarray:
+        word_indices = values >> 6
+        below = (np.uint64(1) << (values & 63).astype(np.uint64)) - np.uint64(1)
+        return self.word_ranks[word_indices] + _popcount(
+            self.bitmap[word_indices] & below
+        )
+
+    def values(self) -> np.ndarray:
+        return np.flatnonzero(_words_mask(self.bitmap))
+
+    def mask(self) -> np.ndarray:
+        return _words_mask(self.bitmap)
+
+    def words(self) -> np.ndarray:
+        return self.bitmap
+
+    @property
+    def nbytes(self) -> int:
+        return self.bitmap.nbytes + self.word_ranks.nbytes
+
+
+class RunContainer(Container):
+    """Stores the indices of a container as runs of consecutive indices.
+
+    Attributes:
+        starts (np.ndarray): The first index of each run, as 16 bit integers.
+        ends (np.ndarray): The last index of each run, as 16 bit integers.
+        run_ranks (np.ndarray): The number of indices before each run.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray) -> None:
+        self.starts = starts.astype(np.uint16)
+        self.ends = ends.astype(np.uint16)
+        lengths = ends.astype(np.int64) - starts + 1
+        self.run_ranks = np.concatenate(([0], np.cumsum(lengths[:-1]))).astype(np.int32)
+        self.cardinality = int(lengths.sum())
+
+    def select(self, position: int) -> int:
+        run = int(np.searchsorted(self.run_ranks, position, side="right")) - 1
+        return int(self.starts[run]) + position - int(self.run_ranks[run])
+
+    def rank(self, values: np.ndarray) -> np.ndarray:
+        runs = np.searchsorted(self.starts, values, side="right") - 1
+        clipped_runs = np.maximum(runs, 0)
+        starts = self.starts[clipped_runs].astype(np.int64)
+        lengths = self.ends[clipped_runs].astype(np.int64) - starts + 1
+        ranks = self.run_ranks[clipped_runs] + np.minimum(values - starts, lengths)
+        return np.where(runs < 0, 0, ranks)
+
+    def values(self) -> np.ndarray:
+        return np.flatnonzero(self.mask())
+
+    def mask(self) -> np.ndarray:
+        boundaries = np.zeros(CONTAINER_SIZE + 1, dtype=np.int32)
+        boundaries[self.starts] += 1
+        boundaries[self.ends.astype(np.int64) + 1] -= 1
+        return np.cumsum(boundaries[:-1]) > 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.starts.nbytes + self.ends.nbytes + self.run_ranks.nbytes
+
+
+def container_from_mask(mask: np.ndarray) -> Union[Container, None]:
+    """Stores the indices of a boolean mask in the smallest form of container.
+
+    Args:
+        mask (np.ndarray): A boolean mask of the indices of a container.
+
+    Returns:
+        Union[Container, None]: The container, or `None` if the mask is empty.
+    """
+    cardinality = int(np.count_nonzero(mask))
+    if cardinality == 0:
+        return None
+    run_starts = mask.copy()
+    run_starts[1:] &= ~mask[:-1]
+    num_runs = int(np.count_nonzero(run_starts))
+    # Runs take 8 bytes, array indices 2 bytes, and a bitmap 10 kilobytes
+    if num_runs * 8 < min(cardinality * 2, 10240):
+        run_ends = mask.copy()
+        run_ends[:-1] &= ~mask[1:]
+        return RunContainer(np.flatnonzero(run_starts), np.flatnonzero(run_ends))
+    if cardinality <= ARRAY_CONTAINER_LIMIT:
+        return ArrayContainer(np.flatnonzero(mask))
+    return BitmapContainer(_mask_words(mask))
+
+
+def container_from_values(values: np.ndarray) -> Union[Container, None]:
+    """Stores sorted, unique indices in the smallest form of container.
+
+    Args:
+        values (np.ndarray): The indices, within `[0, CONTAINER_SIZE)`.
+
+    Returns:
+        Union[Container, None]: The container, or `None` if there are no indices.
+    """
+    if len(values) == 0:
+        return None
+    breaks = np.flatnonzero(np.diff(values) != 1) + 1
+    if (len(breaks) + 1) * 8 < min(len(values) * 2, 10240):
+        starts = values[np.concatenate(([0], breaks))]
+        ends = values[np.concatenate((breaks - 1, [len(values) - 1]))]
+        return RunContainer(starts, ends)
+    if len(values) <= ARRAY_CONTAINER_LIMIT:
+        return ArrayContainer(values)
+    mask = np.zeros(CONTAINER_SIZE, dtype=bool)
+    mask[values] = True
+    return BitmapContainer(_mask_words(mask))
+
+
+class IndexBitmap:
+    """A compressed, sorted set of non-negative indices.
+
+    Behaves as a read only sequence of its indices in ascending order, so it may be
+    used as the indices of a :class:`RootflowDatasetView`. Indexing a bitmap with an
+    integer selects the index at that position, indexing it with a contiguous slice
+    returns another bitmap, and indexing it with anything else returns an array of
+    indices. Bitmaps are combined with `&`, `|` and `-`.
+
+    Example:
+        >>> bitmap = IndexBitmap.from_mask(np.arange(10) % 3 != 0)
+        >>> bitmap[2], len(bitmap), bitmap.rank(7)
+        (4, 6, 4)
+        >>> (bitmap & IndexBitmap.from_indices(range(5))).tolist()
+        [1, 2, 4]
+
+    Attributes:
+        keys (np.ndarray): The upper bits of the indices of each container.
+        containers (List[Container]): The non-empty containers, in order of their
+            keys.
+        offsets (np.ndarray): The number of indices before each container, followed
+            by the total number of indices.
+    """
+
+    def __init__(self, keys: Sequence[int], containers: List[Container]) -> None:
+        """Creates a bitmap from its containers.
+
+        Args:
+            keys (Sequence[int]): The upper bits of each container's indices, in
+                ascending order.
+            containers (List[Container]): The non-empty container of each key.
+        """
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.containers = containers
+        cardinalities = [container.cardinality for container in containers]
+        self.offsets = np.concatenate(([0], np.cumsum(cardinalities, dtype=np.int64)))
+        self._tables = None
+
+    def __getstate__(self) -> dict:
+        # The select tables are rebuilt when they are next needed
+        return {**self.__dict__, "_tables": None}
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> "IndexBitmap":
+        """Creates a bitmap of the positions where a boolean mask is `True`.
+
+        Args:
+            mask (np.ndarray): A one dimensional boolean mask.
+
+        Returns:
+            IndexBitmap: The bitmap.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        keys, containers = [], []
+        for key, start in enumerate(range(0, len(mask), CONTAINER_SIZE)):
+            chunk = mask[start : start + CONTAINER_SIZE]
+            if len(chunk) < CONTAINER_SIZE:
+                chunk = np.concatenate(
+                    (chunk, np.zeros(CONTAINER_SIZE - len(chunk), dtype=bool))
+                )
+            container = container_from_mask(chunk)
+            if container is not None:
+                keys.append(key)
+                containers.append(container)
+        return cls(keys, containers)
+
+    @classmethod
+    def from_indices(cls, indices: Union[Sequence[int], range]) -> "IndexBitmap":
+        """Creates a bitmap of non-negative indices.
+
+        Args:
+            indices (Union[Sequence[int], range]): The indices, in any order, which
+                may repeat.
+
+        Returns:
+            IndexBitmap: The bitmap.
+
+        Raises:
+            ValueError: If an index is negative.
+        """
+        if isinstance(indices, range) and indices.step == 1:
+            return cls._from_run(indices.start, indices.stop)
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) > 1 and not np.all(indices[1:] > indices[:-1]):
+            indices = np.unique(indices)
+        return cls.from_sorted_chunks([indices])
+
+    @classmethod
+    def from_sorted_chunks(cls, chunks: Iterable[np.ndarray]) -> "IndexBitmap":
+        """Creates a bitmap from chunks of sorted, unique indices.
+
+        Each chunk follows the last, so the indices are only held a chunk at a time.
+
+        Args:
+            chunks (Iterable[np.ndarray]): The chunks of non-negative indices, where
+                every index is greater than those of the chunks before it.
+
+        Returns:
+            IndexBitmap: The bitmap.
+
+        Raises:
+            ValueError: If an index is negative.
+        """
+        keys, groups = [], []
+        for chunk in chunks:
+            chunk = np.asarray(chunk, dtype=np.int64)
+            if len(chunk) == 0:
+                continue
+            if chunk[0] < 0:
+                raise ValueError("Cannot store negative indices in a bitmap")
+            chunk_keys = chunk >> CONTAINER_BITS
+            boundaries = np.flatnonzero(np.diff(chunk_keys)) + 1
+            for group in np.split(chunk, boundaries):
+                key = int(group[0]) >> CONTAINER_BITS
+                if keys and keys[-1] == key:
+                    groups[-1].append(group)
+                else:
+                    keys.append(key)
+                    groups.append([group])
+        containers = [
+            container_from_values(np.concatenate(group) & (CONTAINER_SIZE - 1))
+            for group in groups
+        ]
+        return cls(keys, containers)
+
+    @classmethod
+    def _from_run(cls, start: int, stop: int) -> "IndexBitmap":
+        """Creates a bitmap of the indices in `[start, stop)`"""
+        if start < 0:
+            raise ValueError("Cannot store negative indices in a bitmap")
+        keys, containers = [], []
+        if stop > start:
+            for key in range(
+                start >> CONTAINER_BITS, ((stop - 1) >> CONTAINER_BITS) + 1
+            ):
+                base = key << CONTAINER_BITS
+                first = max(start - base, 0)
+                last = min(stop - base, CONTAINER_SIZE) - 1
+                keys.append(key)
+                containers.append(RunContainer(np.array([first]), np.array([last])))
+        return cls(keys, containers)
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __iter__(self) -> Iterator[int]:
+        for chunk in self.chunks():
+            yield from chunk.tolist()
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        indices = self.to_array()
+        return indices if dtype is None else indices.astype(dtype, copy=False)
+
+    def __contains__(self, index: int) -> bool:
+        if not isinstance(index, (int, np.integer)) or index < 0:
+            return False
+        key = int(index) >> CONTAINER_BITS
+        position = np.searchsorted(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return False
+        container = self.containers[position]
+        low = np.array([int(index) & (CONTAINER_SIZE - 1)])
+        return bool(container.rank(low + 1)[0] > container.rank(low)[0])
+
+    def __getitem__(
+        self, index: Union[int, slice, Sequence[int]]
+    ) -> Union[int, "IndexBitmap", np.ndarray]:
+        """Selects the indices at positions of the bitmap.
+
+        Args:
+            index (Union[int, slice, Sequence[int]]): A position, a slice of
+                positions, or an array of positions. Negative positions count from
+                the end of the bitmap.
+
+        Returns:
+            Union[int, IndexBitmap, np.ndarray]: The index at an integer position, a
+                bitmap of the indices of a contiguous slice, or an array of indices.
+
+        Raises:
+            IndexError: If a position is out of range.
+        """
+        length = len(self)
+        if isinstance(index, (int, np.integer)):
+            position = int(index) + length if index < 0 else int(index)
+            if not 0 <= position < length:
+                raise IndexError(f"Bitmap index {index} out of range")
+            container_index = (
+                int(np.searchsorted(self.offsets, position, side="right")) - 1
+            )
+            return (
+                int(self.keys[container_index]) << CONTAINER_BITS
+            ) + self.containers[container_index].select(
+                position - int(self.offsets[container_index])
+            )
+        if isinstance(index, slice):
+            start, stop, step = index.indices(length)
+            if step == 1:
+                return self._slice(start, max(start, stop))
+            positions = np.arange(start, stop, step, dtype=np.int64)
+        else:
+            positions = np.asarray(index, dtype=np.int64)
+            if len(positions) > 0 and (
+                positions.min() < -length or positions.max() >= length
+            ):
+                raise IndexError(f"Index out of range for {length} indices")
+            positions = np.where(positions < 0, positions + length, positions)
+        return _compact(self._select(positions))
+
+    def _select(self, positions: np.ndarray) -> np.ndarray:
+        """Selects the indices at valid, non-negative positions"""
+        if self._tables is None:
+            self._tables = _SelectTables(self)
+        return self._tables.select(positions)
+
+    def _slice(self, start: int, stop: int) -> "IndexBitmap":
+        """Returns a bitmap of the indices at positions `[start, stop)`"""
+        if start >= stop:
+            return IndexBitmap([], [])
+        first = np.searchsorted(self.offsets, start, side="right") - 1
+        last = np.searchsorted(self.offsets, stop - 1, side="right") - 1
+        containers = []
+        for container_index in range(first, last + 1):
+            container = self.containers[container_index]
+            offset = self.offsets[container_index]
+            local_start = max(start - offset, 0)
+            local_stop = min(stop - offset, container.cardinality)
+            # Only the first and last containers may be cut
+            if local_start > 0 or local_stop < container.cardinality:
+                container = container_from_values(
+                    container.values()[local_start:local_stop]
+                )
+            containers.append(container)
+        return IndexBitmap(self.keys[first : last + 1], containers)
+
+    def rank(self, indices: Union[int, Sequence[int]]) -> Union[int, np.ndarray]:
+        """Counts the indices of the bitmap less than each given index.
+
+        The rank of an index in the bitmap is its position.
+
+        Args:
+            indices (Union[int, Sequence[int]]): An index, or an array of indices.
+
+        Returns:
+            Union[int, np.ndarray]: The number of indices less than each index.
+        """
+        values = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        keys = values >> CONTAINER_BITS
+        container_indices = np.searchsorted(self.keys, keys)
+        ranks = self.offsets[container_indices].copy()
+        matched = np.flatnonzero(
+            (container_indices < len(self.keys))
+            & (self.keys[np.minimum(container_indices, len(self.keys) - 1)] == keys)
+            & (values >= 0)
+        )
+        for container_index in np.unique(container_indices[matched]):
+            group = matched[container_indices[matched] == container_index]
+            ranks[group] += self.containers[container_index].rank(
+                values[group] & (CONTAINER_SIZE - 1)
+            )
+        ranks[values < 0] = 0
+        return int(ranks[0]) if np.ndim(indices) == 0 else ranks
+
+    def chunks(self) -> Iterator[np.ndarray]:
+        """Yields the indices of the bitmap a container at a time, as int64 arrays"""
+        for key, container in zip(self.keys, self.containers):
+            yield container.values() + (int(key) << CONTAINER_BITS)
+
+    def to_array(self) -> np.ndarray:
+        """Returns every index of the bitmap as an int32 (or int64) array"""
+        if not self.containers:
+            return np.empty(0, dtype=np.int32)
+        return _compact(np.concatenate(list(self.chunks())))
+
+    def tolist(self) -> List[int]:
+        """Returns every index of the bitmap as a list"""
+        return list(self)
+
+    def to_mask(self, length: int) -> np.ndarray:
+        """Returns a boolean mask of the indices of the bitmap, of a given length"""
+        mask = np.zeros(length, dtype=bool)
+        for key, container in zip(self.keys, self.containers):
+            start = int(key) << CONTAINER_BITS
+            if start < length:
+                mask[start : start + CONTAINER_SIZE] = container.mask()[
+                    : length - start
+                ]
+        return mask
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of the arrays of the bitmap"""
+        return (
+            self.keys.nbytes
+            + self.offsets.nbytes
+            + sum(container.nbytes for container in self.containers)
+        )
+
+    def __and__(self, other: "IndexBitmap") -> "IndexBitmap":
+        return self._combine(other, np.bitwise_and, keep_self=False, keep_other=False)
+
+    def __or__(self, other: "IndexBitmap") -> "IndexBitmap":
+        return self._combine(other, np.bitwise_or, keep_self=True, keep_other=True)
+
+    def __sub__(self, other: "IndexBitmap") -> "IndexBitmap":
+        return self._combine(
+            other,
+            lambda words, other_words: words & ~other_words,
+            keep_self=True,
+            keep_other=False,
+        )
+
+    def _combine(
+        self,
+        other: "IndexBitmap",
+        operation: Callable[[np.ndarray, np.ndarray], np.ndarray],
+        keep_self: bool,
+        keep_other: bool,
+    ) -> "IndexBitmap":
+        """Combines two bitmaps container by container.
+
+        Containers of keys in both bitmaps are combined with a bitwise operation on
+        their words. Containers of keys in only one bitmap are kept as they are, if
+        that bitmap's containers are kept by the operation, and dropped otherwise.
+        """
+        if not isinstance(other, IndexBitmap):
+            return NotImplemented
+        keys, containers = [], []
+        containers_by_key = dict(zip(self.keys.tolist(), self.containers))
+        other_containers_by_key = dict(zip(other.keys.tolist(), other.containers))
+        for key in np.union1d(self.keys, other.keys).tolist():
+            container = containers_by_key.get(key)
+            other_container = other_containers_by_key.get(key)
+            if container is not None and other_container is not None:
+                result = container_from_mask(
+                    _words_mask(operation(container.words(), other_container.words()))
+                )
+            elif container is not None:
+                result = container if keep_self else None
+            else:
+                result = other_container if keep_other else None
+            if result is not None:
+                keys.append(key)
+                containers.append(result)
+        return IndexBitmap(keys, containers)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, IndexBitmap):
+            return NotImplemented
+        return len(self) == len(other) and np.array_equal(
+            self.to_array(), other.to_array()
+        )
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"IndexBitmap(length={len(self)}, containers={len(self.containers)})"
+
+
+class _SelectTables:
+    """The containers of a bitmap, gathered by form, to select many positions at once.
+
+    Selecting an array of positions one container at a time costs a few numpy calls
+    for every container the positions fall in. Instead, the containers of each form
+    are concatenated, along with the position in the bitmap of each run and of each
+    bitmap word, and the positions in every container of a form are selected with
+    a single search. The containers' own arrays are replaced with views of the
+    concatenated arrays, so their indices are not held twice.
+    """
+
+    def __init__(self, bitmap: IndexBitmap) -> None:
+        self.offsets = bitmap.offsets
+        self.bases = bitmap.keys << CONTAINER_BITS
+        self.kinds = np.array(
+            [_CONTAINER_KINDS[type(container)] for container in bitmap.containers],
+            dtype=np.int8,
+        )
+        by_kind = {kind: [] for kind in _CONTAINER_KINDS}
+        for container_index, container in enumerate(bitmap.containers):
+            by_kind[type(container)].append((container_index, container))
+        position_dtype = np.int32 if len(bitmap) < np.iinfo(np.int32).max else np.int64
+
+        arrays = by_kind[ArrayContainer]
+        self.array_values = np.concatenate(
+            [container.indices for _, container in arrays] or [np.empty(0, np.uint16)]
+        )
+        # The position in the bitmap of each array container, minus its start
+        self.array_starts = np.zeros(len(bitmap.containers), dtype=np.int64)
+        start = 0
+        for container_index, container in arrays:
+            self.array_starts[container_index] = start - self.offsets[container_index]
+            container.indices = self.array_values[start : start + container.cardinality]
+            start += container.cardinality
+
+        runs = by_kind[RunContainer]
+        self.run_starts = np.concatenate(
+            [container.starts for _, container in runs] or [np.empty(0, np.uint16)]
+        )
+        # The position in the bitmap of the first index of each run
+        self.run_positions = np.concatenate(
+            [
+                (container.run_ranks + self.offsets[container_index]).astype(
+                    position_dtype
+                )
+                for container_index, container in runs
+            ]
+            or [np.empty(0, position_dtype)]
+        )
+
+        bitmaps = by_kind[BitmapContainer]
+        self.words = np.concatenate(
+            [container.bitmap for _, container in bitmaps] or [np.empty(0, np.uint64)]
+        )
+        # The position in the bitmap of the first index of each word
+        self.word_positions = np.concatenate(
+            [
+                (container.word_ranks + self.offsets[container_index]).astype(
+                    position_dtype
+                )
+                for container_index, container in bitmaps
+            ]
+            or [np.empty(0, position_dtype)]
+        )
+        words_per_container = CONTAINER_SIZE // 64
+        for slot, (_, container) in enumerate(bitmaps):
+            container.bitmap = self.words[
+                slot * words_per_container : (slot + 1) * words_per_container
+            ]
+
+    def select(self, positions: np.ndarray) -> np.ndarray:
+        """Selects the indices at valid, non-negative positions of the bitmap"""
+        container_indices = np.searchsorted(self.offsets, positions, side="right") - 1
+        kinds = self.kinds[container_indices]
+        indices = self.bases[container_indices]
+        for kind, select in (
+            (_CONTAINER_KINDS[ArrayContainer], self._select_arrays),
+            (_CONTAINER_KINDS[RunContainer], self._select_runs),
+            (_CONTAINER_KINDS[BitmapContainer], self._select_bitmaps),
+        ):
+            selected = np.flatnonzero(kinds == kind)
+            if len(selected) > 0:
+                indices[selected] += select(
+                    container_indices[selected], positions[selected]
+                )
+        return indices
+
+    def _select_arrays(
+        self, container_indices: np.ndarray, positions: np.ndarray
+    ) -> np.ndarray:
+        return self.array_values[self.array_starts[container_indices] + positions]
+
+    def _select_runs(
+        self, container_indices: np.ndarray, positions: np.ndarray
+    ) -> np.ndarray:
+        # Searching with the type of the positions avoids converting every run's
+        runs = (
+            np.searchsorted(
+                self.run_positions,
+                positions.astype(self.run_positions.dtype),
+                side="right",
+            )
+            - 1
+        )
+        return self.run_starts[runs] + (positions - self.run_positions[runs])
+
+    def _select_bitmaps(
+        self, container_indices: np.ndarray, positions: np.ndarray
+    ) -> np.ndarray:
+        # Of words with the same position, the last is the one which is not empty
+        words = (
+            np.searchsorted(
+                self.word_positions,
+                positions.astype(self.word_positions.dtype),
+                side="right",
+            )
+            - 1
+        )
+        word_ranks = positions - self.word_positions[words]
+        return (words % (CONTAINER_SIZE // 64)) * 64 + _select_in_words(
+            self.words[words], word_ranks
+        )
+
+
+_CONTAINER_KINDS = {ArrayContainer: 0, RunContainer: 1, BitmapContainer: 2}
+
+
+def _compact(indices: np.ndarray) -> np.ndarray:
+    """Stores non-negative indices as int32 where they all fit"""
+    if len(indices) == 0 or indices.max() <= np.iinfo(np.int32).max:
+        return indices.astype(np.int32)
+    return indices
@@ -0,0 +1,185 @@
+"""On-disk caching for rootflow datasets.
+
+Houses the utilities used by :class:`RootflowDataset` to cache the output of
+:meth:`RootflowDataset.prepare_data` (and optionally :meth:`RootflowDataset.setup`)
+in a binary file next to the dataset root, so that the source files do not need to be
+parsed again each time the dataset is created.
+
+Attributes:
+    CACHE_FORMAT_VERSION: Version of the cache file layout. Caches written with a
+        different version are ignored.
+    CACHE_VALIDATION_MODES: Supported ways of detecting changes to the source files.
+"""
+
+from typing import Any, List, Tuple, Union
+import hashlib
+import logging
+import os
+import pickle
+
+import setkit.datasets.base.dataset as rootflow_datasets
+
+CACHE_FORMAT_VERSION = 1
+CACHE_VALIDATION_MODES = ("stat", "hash")
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def directory_fingerprint(directory: str, validation: str = "stat") -> List[tuple]:
+    """Fingerprints the contents of a directory.
+
+    Collects the relative path, size and modification time of every file within the
+    directory, recursively. If validation is `"hash"` the modification time is
+    replaced with a hash of the file contents, which is slower to compute but does
+    not change when files are copied or touched.
+
+    Args:
+        directory (str): The directory to fingerprint.
+        validation (:obj:`str`, optional): Either `"stat"` or `"hash"`.
+
+    Returns:
+        List[tuple]: A sorted list with one entry for each file in the directory.
+
+    Raises:
+        ValueError: If the validation mode is not supported.
+    """
+    if validation not in CACHE_VALIDATION_MODES:
+        raise ValueError(
+            f"Unsupported cache validation {validation}, expected one of {CACHE_VALIDATION_MODES}"
+        )
+    fingerprint = []
+    for parent, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            path = os.path.join(parent, file_name)
+            file_stat = os.stat(path)
+            if validation == "hash":
+                signature = file_hash(path)
+            else:
+                signature = file_stat.st_mtime_ns
+            relative_path = os.path.relpath(path, directory)
+            fingerprint.append((relative_path, file_stat.st_size, signature))
+    fingerprint.sort()
+    return fingerprint
+
+
+def file_hash(path: str) -> str:
+    """Returns the blake2b hash of a file's contents"""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(root: str, dataset_name: str, stage: str) -> str:
+    """Returns the location of a dataset cache file.
+
+    Caches are stored in a directory next to the dataset root, named after the root
+    with a `.cache` suffix. For example, the root `/data/my_dataset` would store its
+    caches in `/data/my_dataset.cache/`.
+
+    Args:
+        root (str): The dataset root.
+        dataset_name (str): The name of the dataset class.
+        stage (str): The stage of loading which is cached. (`"prepared"` or `"setup"`)
+
+    Returns:
+        str: The path to the cache file.
+    """
+    cache_directory = os.path.normpath(root) + ".cache"
+    return os.path.join(cache_directory, f"{dataset_name}.{stage}.pkl")
+
+
+def load_cached_data(path: str, header: dict) -> Union[Any, None]:
+    """Loads cached data, if the cache is valid.
+
+    The cache header is read and compared before any data is unpickled, so that
+    stale caches are rejected cheaply.
+
+    Args:
+        path (str): The path to the cache file.
+        header (dict): The expected header, containing the format version and the
+            fingerprint of the source files.
+
+    Returns:
+        Union[Any, None]: The cached data, or `None` if there is no valid cache.
+    """
+    try:
+        with open(path, "rb") as cache_file:
+            if pickle.load(cache_file) != header:
+                logging.info(f"Cache at '{path}' is out of date.")
+                return None
+            return unpack_data(pickle.load(cache_file))
+    except FileNotFoundError:
+        return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as error:
+        logging.warning(f"Could not read cache at '{path}': {error}")
+        return None
+
+
+def save_cached_data(path: str, header: dict, data: Any) -> None:
+    """Saves data to a cache file.
+
+    The file is written to a temporary location first and then moved into place, so
+    that concurrent readers never observe a partially written cache.
+
+    Args:
+        path (str): The path to the cache file.
+        header (dict): The header to store, see :func:`load_cached_data`.
+        data (Any): The data to cache.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as cache_file:
+        pickle.dump(header, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(pack_data(data), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+
+
+def cache_header(root: str, validation: str = "stat") -> dict:
+    """Creates the header identifying a valid cache for a dataset root.
+
+    Args:
+        root (str): The dataset root.
+        validation (:obj:`str`, optional): Either `"stat"` or `"hash"`.
+
+    Returns:
+        dict: The cache header.
+    """
+    return {
+        "version": CACHE_FORMAT_VERSION,
+        "validation": validation,
+        "fingerprint": directory_fingerprint(root, validation),
+    }
+
+
+def pack_data(data: Any) -> Tuple[str, Any]:
+    """Packs dataset data for pickling.
+
+    Lists of :class:`RootflowDataItem`s are split into three lists, which pickle and
+    unpickle much faster than a list of individual item objects.
+    """
+    if isinstance(data, list) and all(
+        isinstance(item, rootflow_datasets.RootflowDataItem) for item in data
+    ):
+        ids, values, targets = [], [], []
+        for item in data:
+            ids.append(item.id)
+            values.append(item.data)
+            targets.append(item.target)
+        return ("items", (ids, values, targets))
+    return ("object", data)
+
+
+def unpack_data(packed_data: Tuple[str, Any]) -> Any:
+    """Reverses :func:`pack_data`."""
+    kind, data = packed_data
+    if kind == "items":
+        new_item = rootflow_datasets.RootflowDataItem.__new__
+        items = []
+        for id, value, target in zip(*data):
+            # Bypass __init__, the targets have already been unpacked
+            item = new_item(rootflow_datasets.RootflowDataItem)
+            item.id, item.data, item.target = id, value, target
+            items.append(item)
+        return items
+    return data
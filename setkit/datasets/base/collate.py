@@ -0,0 +1,301 @@
+"""Schema specialized collation for rootflow data loaders.
+
+Torch's `default_collate` inspects the type of every element of every batch to decide
+how to collate it, and batches of examples without targets have to be copied into new
+dictionaries to remove the target first. (See :func:`default_collate_without_key`)
+Since every example of a rootflow dataset has the same structure, the structure of a
+single example is instead inferred once, as a schema of fields, and each batch is
+collated by the fields of the schema without inspecting its elements:
+    * tensors and numeric numpy arrays are written straight into a preallocated
+      batch tensor (in shared memory, inside data loader workers).
+    * numbers are converted to a tensor with a single call.
+    * strings are kept as a list.
+    * dictionaries and sequences are collated field by field, as long as every
+      example of the batch has the same keys or length.
+    * fields which are `None` for every example of a batch, such as the targets of
+      an unlabeled dataset, are left out of the batch.
+
+Anything else, including batches which do not match the schema, is collated by
+torch's `default_collate`. See :class:`SchemaCollate`.
+"""
+
+from typing import Any, Dict, List, Mapping, Sequence, Union
+import numbers
+import numpy as np
+import torch
+from torch.utils.data import get_worker_info
+from torch.utils.data.dataloader import default_collate
+
+from setkit.datasets.base.storage import NUMERIC_KINDS
+
+# Returned by fields whose values are all absent, which are left out of the batch
+_ABSENT = object()
+
+
+class CollateField:
+    """Collates the values of a single field of a batch.
+
+    Subclasses implement :meth:`collate` for one kind of value.
+    """
+
+    def collate(self, values: Sequence) -> Any:
+        """Collates the values of the field, one for each example of a batch"""
+        raise NotImplementedError
+
+
+class TensorField(CollateField):
+    """Stacks tensors, or numeric numpy arrays, into a preallocated batch tensor.
+
+    Attributes:
+        dtype (torch.dtype): The type of the elements.
+        shape (tuple): The shape of each value.
+        is_numpy (bool): Whether the values are numpy arrays, rather than tensors.
+    """
+
+    def __init__(self, dtype: torch.dtype, shape: tuple, is_numpy: bool) -> None:
+        self.dtype = dtype
+        self.shape = shape
+        self.is_numpy = is_numpy
+
+    def collate(self, values: Sequence) -> torch.Tensor:
+        if isinstance(values, np.ndarray) and values.dtype.kind in NUMERIC_KINDS:
+            return _from_numpy(values)
+        output = torch.empty((len(values),) + self.shape, dtype=self.dtype)
+        # Batches collated in workers are sent to the main process in shared memory
+        if get_worker_info() is not None:
+            output.share_memory_()
+        try:
+            if self.is_numpy:
+                np.stack(values, out=output.numpy())
+            else:
+                torch.stack(values, out=output)
+        except TypeError:
+            return default_collate(values)
+        return output
+
+
+class ScalarField(CollateField):
+    """Converts numbers (python or numpy scalars) into a batch tensor"""
+
+    def collate(self, values: Sequence) -> torch.Tensor:
+        return _from_numpy(np.asarray(values))
+
+
+class ListField(CollateField):
+    """Keeps the values, such as strings, as a list"""
+
+    def collate(self, values: Sequence) -> list:
+        return values if isinstance(values, list) else list(values)
+
+
+class OptionalField(CollateField):
+    """Collates a field which was absent (`None`) in the example of the schema.
+
+    Batches in which every value of the field is absent leave the field out, and
+    batches in which only some are absent are collated by `default_collate`. Once
+    a batch has every value present, the field is inferred from it.
+
+    Attributes:
+        field (CollateField): The field inferred from the first value present, or
+            `None` until a value is present.
+    """
+
+    def __init__(self) -> None:
+        self.field = None
+
+    def collate(self, values: Sequence) -> Any:
+        absent = [value is None for value in values]
+        if all(absent):
+            return _ABSENT
+        if any(absent):
+            # Raises the error of `default_collate` for batches containing `None`
+            return default_collate(values)
+        if self.field is None:
+            self.field = infer_field(
+                next(value for value in values if value is not None)
+            )
+        return self.field.collate(values)
+
+
+class MappingField(CollateField):
+    """Collates dictionaries key by key, leaving out keys whose values are absent.
+
+    Batches of dictionaries with a different number of keys than the schema are
+    collated by `default_collate`.
+
+    Attributes:
+        fields (Dict[str, CollateField]): The field of each key.
+    """
+
+    def __init__(self, fields: Dict[Any, CollateField]) -> None:
+        self.fields = fields
+
+    def collate(self, values: Sequence[Mapping]) -> dict:
+        if any(len(value) != len(self.fields) for value in values):
+            return default_collate(values)
+        collated = {}
+        for key, field in self.fields.items():
+            collated_value = field.collate([value[key] for value in values])
+            if collated_value is not _ABSENT:
+                collated[key] = collated_value
+        return collated
+
+
+class SequenceField(CollateField):
+    """Collates fixed length sequences position by position, like `default_collate`.
+
+    Batches of sequences with a different length than the schema are collated by
+    `default_collate`, which raises an error for sequences of unequal lengths.
+
+    Attributes:
+        fields (List[CollateField]): The field of each position of the sequence.
+        sequence_type (type): The type of the collated sequence.
+    """
+
+    def __init__(self, fields: List[CollateField], sequence_type: type) -> None:
+        self.fields = fields
+        self.sequence_type = sequence_type
+
+    def collate(self, values: Sequence[Sequence]) -> Sequence:
+        if any(len(value) != len(self.fields) for value in values):
+            return default_collate(values)
+        collated = [
+            field.collate([value[position] for value in values])
+            for position, field in enumerate(self.fields)
+        ]
+        return self.sequence_type(collated)
+
+
+class DefaultField(CollateField):
+    """Collates values with torch's `default_collate`"""
+
+    def collate(self, values: Sequence) -> Any:
+        return default_collate(values)
+
+
+def infer_field(example: Any) -> CollateField:
+    """Infers how a field is collated from a single example of its values.
+
+    Args:
+        example (Any): The value of the field for one example.
+
+    Returns:
+        CollateField: The field.
+    """
+    if example is None:
+        return OptionalField()
+    if isinstance(example, torch.Tensor):
+        return TensorField(example.dtype, tuple(example.shape), is_numpy=False)
+    if isinstance(example, np.ndarray):
+        if example.dtype.kind not in NUMERIC_KINDS:
+            return DefaultField()
+        dtype = torch.from_numpy(np.empty(0, dtype=example.dtype)).dtype
+        return TensorField(dtype, example.shape, is_numpy=True)
+    if isinstance(example, (numbers.Number, np.number, np.bool_)) and not isinstance(
+        example, complex
+    ):
+        return ScalarField()
+    if isinstance(example, (str, bytes)):
+        return ListField()
+    if isinstance(example, Mapping):
+        return MappingField({key: infer_field(value) for key, value in example.items()})
+    if isinstance(example, (tuple, list)):
+        fields = [infer_field(value) for value in example]
+        if any(isinstance(field, OptionalField) for field in fields):
+            return DefaultField()
+        sequence_type = tuple if type(example) is tuple else list
+        return SequenceField(fields, sequence_type)
+    return DefaultField()
+
+
+class SchemaCollate:
+    """A collate function specialized to the schema of a dataset's examples.
+
+    The schema is inferred from a single example, which is either given, or taken
+    from the first batch collated. Batches may be given as a dictionary of columns,
+    as returned by :meth:`FunctionalDataset.index_batch`, or as a list of examples
+    with :meth:`collate_rows`. Numeric numpy columns (which were gathered in bulk) are
+    converted to tensors directly, and keys which are absent (`None`) for every
+    example of a batch are left out of the batch.
+
+    Example:
+        >>> collate = SchemaCollate({"id": "a", "data": np.zeros(3), "target": None})
+        >>> collate.collate_rows(examples)
+        {"id": [...], "data": tensor(...)}
+
+    Attributes:
+        fields (Dict[str, CollateField]): The field of each key, or `None` until
+            the schema is inferred.
+    """
+
+    def __init__(self, example: Mapping = None) -> None:
+        """Creates a collate function.
+
+        Args:
+            example (:obj:`Mapping`, optional): An example, as a dictionary of its id,
+                data and target. If not given, the first example of the first batch
+                collated is used.
+        """
+        self.fields = None if example is None else self._infer_fields(example)
+
+    def __call__(self, column_batch: Mapping[str, Sequence]) -> dict:
+        """Collates a batch of columns.
+
+        Args:
+            column_batch (Mapping[str, Sequence]): A dictionary mapping each key to a
+                column of values.
+
+        Returns:
+            dict: The collated batch.
+        """
+        if self.fields is None:
+            self.fields = self._infer_fields(
+                {key: _first(column) for key, column in column_batch.items()}
+            )
+        collated_batch = {}
+        for key, field in self.fields.items():
+            column = column_batch[key]
+            if isinstance(column, np.ndarray) and column.dtype.kind in NUMERIC_KINDS:
+                collated_batch[key] = _from_numpy(column)
+            elif column is not None:
+                collated_column = field.collate(column)
+                if collated_column is not _ABSENT:
+                    collated_batch[key] = collated_column
+        return collated_batch
+
+    def collate_rows(self, rows: List[Mapping]) -> dict:
+        """Collates a batch of examples, each a dictionary with the same keys.
+
+        Args:
+            rows (List[Mapping]): The examples.
+
+        Returns:
+            dict: The collated batch.
+        """
+        if self.fields is None:
+            self.fields = self._infer_fields(rows[0])
+        collated_batch = {}
+        for key, field in self.fields.items():
+            collated_column = field.collate([row[key] for row in rows])
+            if collated_column is not _ABSENT:
+                collated_batch[key] = collated_column
+        return collated_batch
+
+    @staticmethod
+    def _infer_fields(example: Mapping) -> Dict[str, CollateField]:
+        """Infers the field of each key of an example"""
+        return {key: infer_field(value) for key, value in example.items()}
+
+
+def _first(column: Union[Sequence, None]) -> Any:
+    """Returns the first value of a column, or `None` for missing or empty columns"""
+    if column is None or len(column) == 0:
+        return None
+    return column[0]
+
+
+def _from_numpy(array: np.ndarray) -> torch.Tensor:
+    """Converts a numeric numpy array to a tensor, copying read only arrays"""
+    if not array.flags.writeable:
+        array = array.copy()
+    return torch.from_numpy(array)
@@ -1,11 +1,12 @@
 """Base dataset classes for rootflow
 
-Houses RootflowDataset and the associated classes RootflowDatasetView and
-ConcatRootflowDatasetView
+Houses RootflowDataset and the associated classes RootflowDatasetView,
+ConcatRootflowDatasetView and JoinedRootflowDatasetView
 """
 
 from typing import (
     Callable,
+    Dict,
     Hashable,
     Mapping,
     Sequence,
@@ -15,17 +16,52 @@ from typing import (
     Any,
     Iterator,
 )
+from bisect import bisect_right
+from functools import partial
 import logging
 import os
+import numpy as np
 from setkit import __location__ as ROOTFLOW_LOCATION
 from setkit.datasets.base.functional import FunctionalDataset
+from setkit.datasets.base.bitmap import IndexBitmap
 from setkit.datasets.base.utils import (
     batch_enumerate,
-    map_functions,
-    get_unique,
-    infer_task_from_targets,
+    compose_indices,
+    get_unique_array,
+    index_array,
+    search_indices,
+    TaskAccumulator,
+    accumulate_tasks,
+    combine_tasks,
+    map_functions_over_batch,
+    merge_batches,
+)
+from setkit.datasets.base.storage import (
+    ColumnarStorage,
+    MemmapStorage,
+    ShardedStorage,
+    SharedStorage,
+    apply_map_plan,
+    concatenate_batches,
+    map_values,
+)
+from setkit.datasets.base.parallel import chunk_slices, run_chunks
+from setkit.datasets.base.id_index import ID_INDEX_CHUNK_SIZE, IdIndex, id_array
+from setkit.datasets.base.sketches import hash_values
+from setkit.datasets.base.statistics import ColumnSketch, merge_sketches
+from setkit.datasets.base.pipeline import TransformPipeline
+from setkit.datasets.base.download import DownloadLock
+from setkit.datasets.base.cache import (
+    cache_header,
+    cache_path,
+    load_cached_data,
+    save_cached_data,
 )
 
+STORAGE_BACKENDS = (None, "list", "columnar", "shared")
+CACHE_STAGES = {False: None, True: "prepared", "prepared": "prepared", "setup": "setup"}
+TASK_INFERENCE_CHUNK_SIZE = 65536
+
 
 class RootflowDataset(FunctionalDataset):
     """Abstract class for a rootflow dataset.
@@ -51,8 +87,18 @@ class RootflowDataset(FunctionalDataset):
     your dataset needs to perform, you may also implement the :meth:`setup` method.
     """
 
+    _derived_state = FunctionalDataset._derived_state + ("_id_index",)
+
     def __init__(
-        self, root: str = None, download: bool = None, tasks: List[dict] = []
+        self,
+        root: str = None,
+        download: bool = None,
+        tasks: List[dict] = [],
+        storage: str = None,
+        cache: Union[bool, str] = False,
+        cache_validation: str = "stat",
+        num_workers: int = 0,
+        task_inference_sample: int = None,
     ) -> None:
         """Creates an instance of a rootflow dataset.
 
@@ -73,13 +119,57 @@ class RootflowDataset(FunctionalDataset):
         If the dataset is succesfully loaded, it will then attempt to infer the task
         type, given the data targets, if tasks are not provided.
 
+        When caching is enabled, the loaded data is stored in a binary file next to
+        root (in `<root>.cache/`), and will be reused the next time the dataset is
+        created, as long as none of the files in root have changed. Only enable the
+        cache for datasets whose data depends solely on the files in root. Since
+        :meth:`setup` is not run when the data is loaded from a `"setup"` cache, it
+        may then only change `self.data`.
+
+        By default the data is kept as the list of :class:`RootflowDataItem`s returned
+        by :meth:`prepare_data`. Setting storage to `"columnar"` will instead convert
+        the data, after :meth:`setup`, into a :class:`ColumnarStorage`, which keeps
+        the ids, data and targets in separate contiguous arrays. (Significantly
+        reducing memory usage for large datasets of numeric data) Setting it to
+        `"shared"` places those columns in shared memory, as a :class:`SharedStorage`,
+        so that data loader worker processes all read the same copy of the data.
+
         Args:
             root (:obj:`str`, optional): Where the data is or should be stored.
             download (:obj:`bool`, optional): Whether the dataset should download the
                 data.
             tasks: (:type:`List[bool]`, optional): Dataset task names, types and shapes.
+            storage (:obj:`str`, optional): The storage backend for the data, either
+                `"list"` (the default), `"columnar"` or `"shared"`.
+            cache (:obj:`Union[bool, str]`, optional): Whether to cache the loaded
+                data on disk. `True` or `"prepared"` caches the output of
+                :meth:`prepare_data`, while `"setup"` caches the data after
+                :meth:`setup` has also been run, in which case :meth:`setup` must
+                not set any attribute but `data`.
+            cache_validation (:obj:`str`, optional): How changes to the files in root
+                are detected, either `"stat"` (file sizes and modification times) or
+                `"hash"` (file sizes and content hashes).
+            num_workers (:obj:`int`, optional): The number of worker processes used
+                to infer the tasks.
+            task_inference_sample (:obj:`int`, optional): If given, tasks are inferred
+                from only the first `task_inference_sample` targets.
+
+        Raises:
+            ValueError: If the storage backend or cache option is not supported, or
+                if :meth:`setup` sets attributes besides `data` which would not be
+                restored from a `"setup"` cache.
         """
+        if storage not in STORAGE_BACKENDS:
+            raise ValueError(
+                f"Unsupported storage {storage}, expected one of {STORAGE_BACKENDS}"
+            )
+        if cache not in CACHE_STAGES:
+            raise ValueError(
+                f"Unsupported cache {cache}, expected one of {tuple(CACHE_STAGES)}"
+            )
         super().__init__()
+        self._pending_maps = {"data": [], "target": []}
+        self._lazy_results = {"data": {}, "target": {}}
         self.DEFAULT_DIRECTORY = os.path.join(
             ROOTFLOW_LOCATION, "datasets/data", type(self).__name__, "data"
         )
@@ -89,9 +179,51 @@ class RootflowDataset(FunctionalDataset):
             )
             root = self.DEFAULT_DIRECTORY
 
+        cache_stage = CACHE_STAGES[cache]
+        cached_data = None
+        if cache_stage is not None and download is not True:
+            cached_data = self._load_cache(root, cache_stage, cache_validation)
+
+        if cached_data is None:
+            self._load_data(root, download)
+            logging.info(f"Loaded {type(self).__name__} from '{root}'.")
+            if cache_stage == "prepared":
+                self._save_cache(root, cache_stage, cache_validation)
+        else:
+            self.data = cached_data
+            logging.info(f"Loaded {type(self).__name__} from cache.")
+
+        if cached_data is None or cache_stage == "prepared":
+            attributes = dict(vars(self)) if cache_stage == "setup" else None
+            self.setup()
+            if attributes is not None:
+                self._check_setup_attributes(attributes)
+            logging.info(f"Setup {type(self).__name__}.")
+
+            if storage == "columnar" and not isinstance(self.data, ColumnarStorage):
+                self.data = ColumnarStorage.from_items(self.data)
+                logging.info(f"Converted {type(self).__name__} to columnar storage.")
+
+            if cache_stage == "setup":
+                self._save_cache(root, cache_stage, cache_validation)
+
+        # Shared storage only lives as long as this process, so it is never cached
+        if storage == "shared" and not isinstance(self.data, SharedStorage):
+            self.data = SharedStorage.from_storage(self.data)
+            logging.info(f"Moved {type(self).__name__} to shared memory storage.")
+
+        if tasks is not None and len(tasks) == 0:
+            tasks = self._infer_tasks(num_workers, task_inference_sample)
+            logging.info(f"Tasks not specified, setting automatically")
+        self._tasks = tasks
+
+    def _load_data(self, root: str, download: bool) -> None:
+        """Loads the data, downloading it first if necessary"""
         if download is None:
             try:
-                self.data = self.prepare_data(root)
+                # Waits for any download in progress, so a partial download is not read
+                with DownloadLock(root, shared=True):
+                    self.data = self.prepare_data(root)
             except FileNotFoundError:
                 logging.warning(
                     f"Dataset {type(self).__name__} could not be loaded from location '{root}'."
@@ -99,12 +231,20 @@ class RootflowDataset(FunctionalDataset):
                 download = True
 
         if download is True:
-            logging.info(
-                f"Downloading {type(self).__name__} data to location '{root}'."
-            )
-            if not os.path.exists(root):
-                os.makedirs(root)
-            self.download(root)
+            # Only one process downloads, any others wait for it to finish
+            with DownloadLock(root) as lock:
+                if lock.completed_by_other():
+                    logging.info(
+                        f"{type(self).__name__} data was downloaded to '{root}' by another process."
+                    )
+                else:
+                    logging.info(
+                        f"Downloading {type(self).__name__} data to location '{root}'."
+                    )
+                    if not os.path.exists(root):
+                        os.makedirs(root)
+                    self.download(root)
+                    lock.mark_complete()
             self.data = self.prepare_data(root)
         elif download is False:
             try:
@@ -113,27 +253,53 @@ class RootflowDataset(FunctionalDataset):
                 raise FileNotFoundError(
                     f"Could not load the data for {type(self).__name__} from '{root}'\nMake sure that the data is located at '{root}'.\nAlso consider setting download to `True`."
                 )
-        logging.info(f"Loaded {type(self).__name__} from '{root}'.")
 
-        self.setup()
-        logging.info(f"Setup {type(self).__name__}.")
-
-        if tasks is not None and len(tasks) == 0:
-            tasks = self._infer_tasks()
-            logging.info(f"Tasks not specified, setting automatically")
-        self._tasks = tasks
+    def _check_setup_attributes(self, attributes: dict) -> None:
+        """Checks that :meth:`setup` only set `data`, since nothing else is cached"""
+        changed = [
+            name
+            for name, value in vars(self).items()
+            if name != "data"
+            and (name not in attributes or attributes[name] is not value)
+        ]
+        if changed:
+            raise ValueError(
+                f"{type(self).__name__}.setup() set {changed}, which would be lost "
+                "when loading from a 'setup' cache. Only `data` may be set by setup() "
+                "when caching after setup, consider using cache='prepared' instead."
+            )
 
-    def prepare_data(self, directory: str) -> List["RootflowDataItem"]:
+    def _load_cache(self, root: str, stage: str, validation: str) -> Any:
+        """Loads the cached data for a stage, or returns None if it is out of date"""
+        if not os.path.isdir(root):
+            return None
+        path = cache_path(root, type(self).__name__, stage)
+        return load_cached_data(path, cache_header(root, validation))
+
+    def _save_cache(self, root: str, stage: str, validation: str) -> None:
+        """Caches the current data for a stage"""
+        if not os.path.isdir(root):
+            logging.info(f"Not caching {type(self).__name__}, '{root}' does not exist.")
+            return
+        path = cache_path(root, type(self).__name__, stage)
+        save_cached_data(path, cache_header(root, validation), self.data)
+        logging.info(f"Cached {type(self).__name__} data to '{path}'.")
+
+    def prepare_data(
+        self, directory: str
+    ) -> Union[List["RootflowDataItem"], ColumnarStorage]:
         """Prepares data for a rootflow dataset.
 
         Loads the data from a directory path and returns a list of
         :class:`RootflowDataItem`s, one for each dataset example in dataset.
+        Alternatively, a :class:`ColumnarStorage` containing the examples may be
+        returned.
 
         Args:
             directory (str): The directory where we should look for our data.
 
         Returns:
-            List[RootflowDataItem]: The loaded data items.
+            Union[List[RootflowDataItem], ColumnarStorage]: The loaded data items.
         """
         raise NotImplementedError
 
@@ -146,7 +312,11 @@ class RootflowDataset(FunctionalDataset):
         raise NotImplementedError
 
     def setup(self):
-        """Performs additional setup steps for the dataset"""
+        """Performs additional setup steps for the dataset
+
+        When the dataset is cached after setup, (with `cache="setup"`) this is only
+        run when the cache is created, so it may only change `self.data`.
+        """
         pass
 
     def tasks(self):
@@ -165,48 +335,60 @@ class RootflowDataset(FunctionalDataset):
         """
         return self._tasks
 
-    def _infer_tasks(self):
-        """Splits targets and infers task information"""
-        example_targets = self.index(0)[2]
+    def _infer_tasks(self, num_workers: int = 0, sample_size: int = None):
+        """Splits targets and infers task information
+
+        Reads the raw target column once, in chunks, accumulating every task at the
+        same time. See :class:`TaskAccumulator`.
+        """
+        length = len(self) if sample_size is None else min(sample_size, len(self))
+        if length == 0:
+            return None
+        example_targets = self._read_column("target", slice(0, 1))[0]
         if example_targets is None:
             return None
         if isinstance(example_targets, Mapping):
-            tasks = []
-
-            def multitask_generator(task_name):
-                for item in self:
-                    yield item["target"][task_name]
-
-            for task_name in example_targets.keys():
-                generator = multitask_generator(task_name)
-                task_type, task_shape = infer_task_from_targets(generator)
-                tasks.append(
-                    {"name": task_name, "type": task_type, "shape": task_shape}
-                )
-            return tasks
+            task_names = list(example_targets.keys())
         else:
-
-            def single_task_generator():
-                for item in self:
-                    yield item["target"]
-
-            task_type, task_shape = infer_task_from_targets(single_task_generator())
-            return [{"name": "task", "type": task_type, "shape": task_shape}]
+            task_names = None
+        chunk_accumulators = run_chunks(
+            partial(accumulate_tasks, task_names),
+            chunk_slices(
+                length,
+                num_workers,
+                chunk_size=TASK_INFERENCE_CHUNK_SIZE if num_workers <= 0 else None,
+            ),
+            partial(self._read_column, "target"),
+            num_workers,
+            description=f"Inferring {type(self).__name__} tasks",
+        )
+        tasks = []
+        for task_name, accumulators in zip(
+            task_names or ["task"], zip(*chunk_accumulators)
+        ):
+            accumulator = TaskAccumulator()
+            for chunk_accumulator in accumulators:
+                accumulator.merge(chunk_accumulator)
+            task_type, task_shape = accumulator.result()
+            tasks.append({"name": task_name, "type": task_type, "shape": task_shape})
+        return tasks
 
     # TODO: Decide how to handle map edge cases
     # Represents some dangerous interior mutability
     # Does not play well with views (What should we change and not change. Do we allow different parts of the dataset to have different data?)
     # Does not play well with datasets who need to have data be memmaped or hdf5ed from disk
+    # (MemmapStorage is opened read only, so mapping loads the mapped column into memory)
 
-    # While splitting out the dataset into three lists, (ids, data, targets) might
-    # make batch mapping faster because we can do true slice assignment, it may also
-    # decrease the load speed for indexing the dataset (cache locality of the different
-    # item members for the given index) TODO: Test this
+    # Datasets using columnar storage split the data into three columns, (ids, data,
+    # targets) so that batch mapping can use vectorized functions and write the
+    # results back in bulk.
     def map(
         self,
         function: Union[Callable, List[Callable]],
         targets: bool = False,
         batch_size: int = None,
+        num_workers: int = 0,
+        lazy: bool = False,
     ) -> Union["RootflowDataset", "RootflowDatasetView"]:
         """Maps a function over the dataset.
 
@@ -214,6 +396,22 @@ class RootflowDataset(FunctionalDataset):
         dataset. Returns `self` to assist with the functional API, but mutates internal
         state so is not functional at all.
 
+        For datasets with columnar storage, batched functions are given slices of the
+        column, as numpy arrays for numeric columns, and may return numpy arrays.
+
+        If num_workers is given, the dataset is split into contiguous chunks, (each a
+        whole number of batches) and only the mapped column of each chunk is sent to
+        a pool of worker processes. The results are written back in order, once every
+        chunk has been mapped. See :mod:`setkit.datasets.base.parallel`.
+
+        If lazy is set, the function is not applied straight away, but recorded in a
+        plan of pending maps. Pending maps are applied together, only to the items
+        which are accessed, and the results are kept so that each item is only mapped
+        once. Batched functions may then be called on any batch of the items, so
+        should treat each item independently. :meth:`materialize` applies the whole
+        plan to every item in a single pass, and any eager map materializes the
+        plan first, so that maps are always applied in the order they were given.
+
         Args:
             function (Union[Callable, List[Callable]]): The function or functions you
                 would like to map over the dataset.
@@ -221,10 +419,15 @@ class RootflowDataset(FunctionalDataset):
                 over the data item targets, instead of the data.
             batch_size (:obj:`int`, optional): A batch size, if the functions to map
                 support or require batches of inputs.
+            num_workers (:obj:`int`, optional): The number of worker processes to map
+                with. If 0, the map is run in the calling process.
+            lazy (:obj:`bool`, optional): Whether to defer the map until items are
+                accessed, or the dataset is materialized.
 
         Raises:
             AssertionError: If a batched function does not return a list of the same
                 length as its inputs.
+            RuntimeError: If the function fails in a worker process.
         """
         assert hasattr(
             function, "__call__"
@@ -235,7 +438,26 @@ class RootflowDataset(FunctionalDataset):
         else:
             attribute = "data"
 
-        if batch_size is None:
+        self._lineage.advance()
+        if lazy:
+            results = self._lazy_results[attribute]
+            if results:
+                # Items already read have had the earlier maps applied, so only the
+                # new map is applied to them
+                indices = list(results)
+                mapped_values = apply_map_plan(
+                    [(function, batch_size)], [results[index] for index in indices]
+                )
+                self._lazy_results[attribute] = dict(zip(indices, mapped_values))
+            self._pending_maps[attribute].append((function, batch_size))
+            return self
+        self.materialize(num_workers)
+
+        if num_workers > 0:
+            self._parallel_map(attribute, function, batch_size, num_workers)
+        elif isinstance(self.data, ColumnarStorage):
+            self.data.map_column(attribute, function, batch_size)
+        elif batch_size is None:
             for idx, data_item in enumerate(self.data):
                 setattr(data_item, attribute, function(getattr(data_item, attribute)))
                 self.data[idx] = data_item
@@ -259,6 +481,171 @@ class RootflowDataset(FunctionalDataset):
 
         return self
 
+    def _parallel_map(
+        self, attribute: str, function: Callable, batch_size: int, num_workers: int
+    ) -> None:
+        """Maps a function over chunks of an attribute in worker processes"""
+        slices = chunk_slices(len(self), num_workers, multiple_of=batch_size)
+        mapped_chunks = run_chunks(
+            partial(map_values, function, batch_size=batch_size),
+            slices,
+            partial(self._read_column, attribute),
+            num_workers,
+            description=f"Mapping {type(self).__name__}",
+        )
+        if isinstance(self.data, ColumnarStorage):
+            self.data.set_column(attribute, concatenate_batches(mapped_chunks))
+        else:
+            for chunk_slice, mapped_chunk in zip(slices, mapped_chunks):
+                for data_item, value in zip(self.data[chunk_slice], mapped_chunk):
+                    setattr(data_item, attribute, value)
+
+    @property
+    def has_pending_maps(self) -> bool:
+        """Whether there are lazy maps which have not been materialized"""
+        return any(self._pending_maps.values())
+
+    def materialize(self, num_workers: int = 0) -> "RootflowDataset":
+        """Applies any pending lazy maps to the whole dataset.
+
+        Each attribute is read once and passed through every pending map, in order,
+        before being written back. Items which were already mapped when accessed keep
+        their mapped values, rather than being mapped again.
+
+        Args:
+            num_workers (:obj:`int`, optional): The number of worker processes to map
+                with. If 0, the maps are run in the calling process.
+
+        Returns:
+            RootflowDataset: The dataset, to assist with the functional API.
+        """
+        for attribute, map_plan in self._pending_maps.items():
+            if not map_plan:
+                continue
+            mapped_chunks = run_chunks(
+                partial(apply_map_plan, map_plan),
+                chunk_slices(len(self), num_workers),
+                partial(self._read_column, attribute),
+                num_workers,
+                description=f"Materializing {type(self).__name__}",
+            )
+            mapped_values = concatenate_batches(mapped_chunks)
+            for index, value in self._lazy_results[attribute].items():
+                mapped_values[index] = value
+            if isinstance(self.data, ColumnarStorage):
+                self.data.set_column(attribute, mapped_values)
+            else:
+                for data_item, value in zip(self.data, mapped_values):
+                    setattr(data_item, attribute, value)
+            self._pending_maps[attribute] = []
+            self._lazy_results[attribute] = {}
+        return self
+
+    def share_memory(self) -> "RootflowDataset":
+        """Moves the data to shared memory, so that the dataset pickles as a handle.
+
+        Data which is already memory mapped from disk is left where it is. See
+        :class:`SharedStorage`.
+
+        Returns:
+            RootflowDataset: The dataset, to assist with the functional API.
+        """
+        if not isinstance(self.data, (MemmapStorage, ShardedStorage)):
+            self.data = SharedStorage.from_storage(self.data)
+            logging.info(f"Moved {type(self).__name__} to shared memory storage.")
+        return self
+
+    def _lazy_map(
+        self, attribute: str, indices: Sequence[int], values: Union[Sequence, None]
+    ) -> list:
+        """Applies the pending maps of an attribute to the raw values of some items"""
+        results = self._lazy_results[attribute]
+        if values is None:
+            values = [None] * len(indices)
+        # The position of the first read of each item which has not been mapped
+        missing = {}
+        for position, index in enumerate(indices):
+            if index not in results and index not in missing:
+                missing[index] = position
+        if missing:
+            mapped_values = apply_map_plan(
+                self._pending_maps[attribute],
+                [values[position] for position in missing.values()],
+            )
+            results.update(zip(missing, mapped_values))
+        return [results[index] for index in indices]
+
+    def _read_column(
+        self, attribute: str, chunk_slice: slice
+    ) -> Union[np.ndarray, list]:
+        """Reads the raw values of an attribute for a slice of the dataset"""
+        if isinstance(self.data, ColumnarStorage):
+            values = self.data.gather(
+                attribute, range(chunk_slice.start, chunk_slice.stop)
+            )
+            if values is None:
+                values = [None] * (chunk_slice.stop - chunk_slice.start)
+            return values
+        return [getattr(data_item, attribute) for data_item in self.data[chunk_slice]]
+
+    def _read_ids(
+        self, indices: Union[slice, Sequence[int]]
+    ) -> Union[np.ndarray, list]:
+        """Reads the ids of a slice or some items, naming items without an id"""
+        if isinstance(indices, slice):
+            ids = self._read_column("id", indices)
+            indices = range(indices.start, indices.stop)
+        elif isinstance(self.data, ColumnarStorage):
+            ids = self.data.gather("id", indices)
+            if ids is None:
+                ids = [None] * len(indices)
+        else:
+            ids = [self.data[index].id for index in indices]
+        if isinstance(ids, np.ndarray) and ids.dtype.kind in "biuf":
+            return ids
+        return [
+            f"{type(self).__name__}-{index}" if id is None else id
+            for id, index in zip(ids, indices)
+        ]
+
+    def _get_id_index(self) -> IdIndex:
+        """Returns the hash index of the ids of the dataset, building it if needed.
+
+        The ids are read and hashed in chunks, so they are never all held as python
+        objects at once. The index is built once, and is not pickled.
+        """
+        id_index = getattr(self, "_id_index", None)
+        if id_index is None:
+            chunk_hashes = run_chunks(
+                hash_values,
+                chunk_slices(len(self), 0, chunk_size=ID_INDEX_CHUNK_SIZE),
+                self._read_ids,
+                description=f"Indexing {type(self).__name__} ids",
+            )
+            id_index = IdIndex(
+                (
+                    np.concatenate(chunk_hashes)
+                    if chunk_hashes
+                    else np.empty(0, dtype=np.uint64)
+                ),
+                self._position_ids,
+            )
+            self._id_index = id_index
+        return id_index
+
+    def _id_positions(self, ids: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        """Finds the positions of ids in the dataset by their hashes"""
+        return self._get_id_index().lookup(hashes, ids)
+
+    def _position_hashes(self) -> np.ndarray:
+        """Returns the hash of the id of each item of the dataset, in order"""
+        return self._get_id_index().hashes
+
+    def _position_ids(self, positions: np.ndarray) -> Union[np.ndarray, list]:
+        """Returns the ids of the items at some positions of the dataset"""
+        positions = np.asarray(positions, dtype=np.int64)
+        return self._read_ids(np.where(positions < 0, positions + len(self), positions))
+
     def __len__(self) -> int:
         """Gets the length of the dataset."""
         return len(self.data)
@@ -277,16 +664,140 @@ class RootflowDataset(FunctionalDataset):
             tuple: A tuple of three items, respectively, the id of the data item, the
                 data content of the item, and the target of the data item.
         """
-        data_item = self.data[index]
-        id, data, target = data_item.id, data_item.data, data_item.target
+        id, data, target = self._read_item(index)
+        if self.has_data_transforms or self.has_target_transforms:
+            data_pipeline, target_pipeline = self._pipelines()
+            if data_pipeline:
+                data = self._apply_transforms(index, data, data_pipeline, "data")
+            if target_pipeline:
+                target = self._apply_transforms(
+                    index, target, target_pipeline, "target"
+                )
+        return (id, data, target)
+
+    def _read_item(self, index: int) -> tuple:
+        """Reads a data example from storage, before any transforms"""
+        if -len(self) <= index < 0:
+            index += len(self)
+        if isinstance(self.data, ColumnarStorage):
+            id, data, target = self.data.row(index)
+        else:
+            data_item = self.data[index]
+            id, data, target = data_item.id, data_item.data, data_item.target
         if id is None:
             id = f"{type(self).__name__}-{index}"
-        if self.has_data_transforms:
-            data = map_functions(data, self.data_transforms)
-        if self.has_target_transforms:
-            target = map_functions(target, self.target_transforms)
+        if self._pending_maps["data"]:
+            (data,) = self._lazy_map("data", [index], [data])
+        if self._pending_maps["target"]:
+            (target,) = self._lazy_map("target", [index], [target])
         return (id, data, target)
 
+    def index_batch(self, indices: Sequence[int]) -> tuple:
+        """Gets a batch of data examples.
+
+        Retrieves multiple data examples at once. For datasets with columnar storage,
+        each column is gathered with a single vectorized operation, and numeric
+        columns are returned as numpy arrays when there are no transforms.
+
+        Args:
+            indices (Sequence[int]): The indices of the items to retrieve.
+
+        Returns:
+            tuple: A tuple of three columns, respectively, the ids, data and targets of
+                the data items.
+        """
+        ids, data, targets = self._read_batch(indices)
+        if self.has_data_transforms or self.has_target_transforms:
+            data_pipeline, target_pipeline = self._pipelines()
+            if data_pipeline:
+                data = self._apply_transforms_batch(
+                    indices, data, data_pipeline, "data"
+                )
+            if target_pipeline:
+                if targets is None:
+                    targets = [None] * len(indices)
+                targets = self._apply_transforms_batch(
+                    indices, targets, target_pipeline, "target"
+                )
+        return (ids, data, targets)
+
+    def _read_batch(self, indices: Sequence[int]) -> tuple:
+        """Reads a batch of data examples from storage, before any transforms"""
+        # Negative indices are counted from the end, so that each item has one index
+        indices = compose_indices(range(len(self)), indices)
+        if isinstance(self.data, ColumnarStorage):
+            ids = self.data.gather("id", indices)
+            data = self.data.gather("data", indices)
+            targets = self.data.gather("target", indices)
+            if ids is None:
+                ids = [None] * len(indices)
+        else:
+            items = [self.data[index] for index in indices]
+            ids = [item.id for item in items]
+            data = [item.data for item in items]
+            targets = [item.target for item in items]
+        ids = [
+            f"{type(self).__name__}-{index}" if id is None else id
+            for id, index in zip(ids, indices)
+        ]
+        if self._pending_maps["data"]:
+            data = self._lazy_map("data", indices, data)
+        if self._pending_maps["target"]:
+            targets = self._lazy_map("target", indices, targets)
+        return (ids, data, targets)
+
+    def _index_raw(self, index: int) -> tuple:
+        """Gets a data example, before the transforms in :meth:`_transform_path`"""
+        if self._cache_owner is not None:
+            return self.index(index)
+        return self._read_item(index)
+
+    def _index_batch_raw(self, indices: Sequence[int]) -> tuple:
+        """Gets a batch of data examples, see :meth:`_index_raw`"""
+        if self._cache_owner is not None:
+            return self.index_batch(indices)
+        return self._read_batch(indices)
+
+    def _transform_path(self) -> Tuple[List[Callable], List[Callable]]:
+        """Returns the data and target transforms not applied by :meth:`_index_raw`"""
+        if self._cache_owner is not None:
+            return ([], [])
+        return self._pipeline_functions()
+
+
+class ShardedRootflowDataset(RootflowDataset):
+    """A dataset saved to disk with :meth:`FunctionalDataset.save`.
+
+    Opens the manifest of the saved dataset, and reads examples from its shards on
+    demand. Each shard is memory mapped the first time one of its rows is accessed,
+    so opening a saved dataset is fast, however large it is, and only the rows which
+    are read are loaded into memory. The tasks of the saved dataset are restored
+    from the manifest, rather than inferred again.
+    """
+
+    def __init__(self, root: str, tasks: List[dict] = None) -> None:
+        """Opens a saved dataset.
+
+        Args:
+            root (str): The directory the dataset was saved in.
+            tasks (:obj:`List[dict]`, optional): Dataset task names, types and
+                shapes, if they should differ from the saved tasks.
+
+        Raises:
+            FileNotFoundError: If no dataset was saved in the directory.
+        """
+        super().__init__(root=root, download=False, tasks=None)
+        if tasks is None:
+            tasks = self.data.metadata.get("tasks")
+            for task in tasks or []:
+                if isinstance(task.get("shape"), list):
+                    task["shape"] = tuple(task["shape"])
+        self._tasks = tasks
+
+    def prepare_data(self, directory: str) -> ShardedStorage:
+        """Opens the sharded storage of the saved dataset"""
+        return ShardedStorage(directory)
+
 
 # TODO Add custom getattr for the dataset views so that if there is a custom
 # attribute on a dataset, a view of that dataset will have the same attribute
@@ -297,26 +808,74 @@ class RootflowDatasetView(FunctionalDataset):
     subset of the dataset without duplication of data. Like :class:`RootflowDataset`
     the view extends :class:`FunctionalDataset`, and provides all of the same
     functional API. (i.e. You can map, transform, take slices, etc)
+
+    Views of views are flattened when they are created. Their indices are composed
+    with those of the parent view, so that they index the underlying dataset
+    directly, and the transforms of every parent view are fused into a single list.
+    Indexing a view therefore costs the same no matter how deep the chain of views.
+
+    Views of the same dataset (or view) may be combined with `&`, `|` and `-`, which
+    are done as bitwise operations on bitmaps of their indices. See
+    :class:`IndexBitmap`.
+
+    Attributes:
+        dataset (FunctionalDataset): The underlying dataset, which is never a view.
+        data_indices (Union[range, np.ndarray, IndexBitmap]): The indices of the view
+            items in `dataset`.
+        parent_views (List[RootflowDatasetView]): The views this view was created
+            from, outermost first, whose transforms are applied to each item.
     """
 
+    _derived_state = FunctionalDataset._derived_state + ("_sorted_indices",)
+
     def __init__(
         self,
         dataset: FunctionalDataset,
-        view_indices: List[int],
+        view_indices: Union[List[int], np.ndarray, range, IndexBitmap],
         sorted: bool = True,
+        unique: bool = False,
     ) -> None:
         """Creates an new view of a dataset.
 
+        Ranges (such as those of slices) are kept as ranges, so a view of a slice
+        takes the same memory however long it is. Bitmaps (such as those of
+        :meth:`where`) are kept as compressed bitmaps. Any other indices are stored
+        as a compact int32 (or int64) array, see :func:`index_array`. Duplicate
+        indices are removed, unless the indices are known to be unique.
+
         Args:
             dataset (FunctionalDataset): The dataset which we are taking a view of.
-            view_indices (List[int]): Indices corresponding to which data items from
-                the dataset we would like to include in the view.
+            view_indices (Union[List[int], np.ndarray, range, IndexBitmap]): Indices
+                corresponding to which data items from the dataset we would like to
+                include in the view.
             sorted (:obj:`bool`, optional): Wether to sort the indices so that the
                 view maintains ordering when iterating.
+            unique (:obj:`bool`, optional): Whether the indices are already known to
+                be unique, so need not be deduplicated.
         """
         super().__init__()
+        if isinstance(view_indices, range):
+            # Ranges never repeat, and are sorted once they are increasing
+            if sorted and view_indices.step < 0:
+                view_indices = view_indices[::-1]
+            unique_indices = view_indices
+        elif isinstance(view_indices, IndexBitmap):
+            # Bitmaps are always sorted and unique
+            unique_indices = view_indices
+        else:
+            unique_indices = index_array(view_indices)
+            if not unique:
+                unique_indices = get_unique_array(unique_indices, ordered=sorted)
+            elif sorted:
+                unique_indices = np.sort(unique_indices)
+        self._lineage = dataset._lineage.find()
+        if isinstance(dataset, RootflowDatasetView):
+            unique_indices = compose_indices(dataset.data_indices, unique_indices)
+            self.parent_views = dataset.parent_views + [dataset]
+            dataset = dataset.dataset
+        else:
+            self.parent_views = []
         self.dataset = dataset
-        unique_indices = get_unique(view_indices, ordered=sorted)
         self.data_indices = unique_indices
 
     def tasks(self) -> List[dict]:
@@ -356,55 +915,298 @@ class RootflowDatasetView(FunctionalDataset):
             tuple: A tuple of three items, respectively, the id of the data item, the
                 data content of the item, and the target of the data item.
         """
-        id, data, target = self.dataset.index(self.data_indices[index])
-        if self.has_data_transforms:
-            data = map_functions(data, self.data_transforms)
-        if self.has_target_transforms:
-            target = map_functions(target, self.target_transforms)
+        id, data, target = self.dataset._index_raw(self.data_indices[index])
+        data_pipeline, target_pipeline = self._pipelines()
+        if data_pipeline:
+            data = self._apply_transforms(index, data, data_pipeline, "data")
+        if target_pipeline:
+            target = self._apply_transforms(index, target, target_pipeline, "target")
         return (id, data, target)
 
+    def index_batch(self, indices: Sequence[int]) -> tuple:
+        """Gets a batch of data examples.
+
+        Maps the indices onto the underlying dataset and retrieves the examples from
+        it in a single batch, see :meth:`FunctionalDataset.index_batch`.
+
+        Args:
+            indices (Sequence[int]): The indices of the items to retrieve.
+
+        Returns:
+            tuple: A tuple of three columns, respectively, the ids, data and targets of
+                the data items.
+        """
+        ids, data, targets = self.dataset._index_batch_raw(
+            self._dataset_indices(indices)
+        )
+        data_pipeline, target_pipeline = self._pipelines()
+        if data_pipeline:
+            data = self._apply_transforms_batch(indices, data, data_pipeline, "data")
+        if target_pipeline:
+            if targets is None:
+                targets = [None] * len(indices)
+            targets = self._apply_transforms_batch(
+                indices, targets, target_pipeline, "target"
+            )
+        return (ids, data, targets)
+
+    def _index_raw(self, index: int) -> tuple:
+        """Gets a data example, before the transforms in :meth:`_transform_path`"""
+        if self._cache_owner is not None:
+            return self.index(index)
+        return self.dataset._index_raw(self.data_indices[index])
+
+    def _index_batch_raw(self, indices: Sequence[int]) -> tuple:
+        """Gets a batch of data examples, see :meth:`_index_raw`"""
+        if self._cache_owner is not None:
+            return self.index_batch(indices)
+        return self.dataset._index_batch_raw(self._dataset_indices(indices))
+
+    def _dataset_indices(self, indices: Sequence[int]) -> Union[range, np.ndarray]:
+        """Maps indices of the view onto indices of the underlying dataset"""
+        if isinstance(self.data_indices, IndexBitmap):
+            # Batches are selected from bitmaps position by position, which is
+            # cheaper than slicing the bitmap for a contiguous batch
+            indices = index_array(indices)
+        return compose_indices(self.data_indices, indices)
+
+    def __and__(self, view: "RootflowDatasetView") -> "RootflowDatasetView":
+        """Selects the items in both `self` and another view of the same dataset"""
+        return self._combine(view, IndexBitmap.__and__)
+
+    def __or__(self, view: "RootflowDatasetView") -> "RootflowDatasetView":
+        """Selects the items in either `self` or another view of the same dataset"""
+        return self._combine(view, IndexBitmap.__or__)
+
+    def __sub__(self, view: "RootflowDatasetView") -> "RootflowDatasetView":
+        """Selects the items in `self` but not in another view of the same dataset"""
+        return self._combine(view, IndexBitmap.__sub__)
+
+    def _combine(
+        self,
+        view: "RootflowDatasetView",
+        operation: Callable[[IndexBitmap, IndexBitmap], IndexBitmap],
+    ) -> "RootflowDatasetView":
+        """Combines the indices of two views of the same dataset as bitmaps.
+
+        Both views must have been taken from the same dataset, or the same view, so
+        that their items have the same transforms. The combined view keeps the
+        transforms of the views it was taken from, but not those added to `self`
+        or `view` themselves, and its items are in the order of the dataset.
+
+        Args:
+            view (RootflowDatasetView): The other view.
+            operation (Callable[[IndexBitmap, IndexBitmap], IndexBitmap]): The set
+                operation which combines the indices of the views.
+
+        Returns:
+            RootflowDatasetView: A new view of the combined indices.
+
+        Raises:
+            AttributeError: If `view` is not a :class:`RootflowDatasetView`.
+            ValueError: If the views were not taken from the same dataset or view.
+        """
+        if not isinstance(view, RootflowDatasetView):
+            raise AttributeError(f"Cannot combine a {type(view)} with a dataset view")
+        same_parents = len(view.parent_views) == len(self.parent_views) and all(
+            parent is other_parent
+            for parent, other_parent in zip(self.parent_views, view.parent_views)
+        )
+        if view.dataset is not self.dataset or not same_parents:
+            raise ValueError("Can only combine views taken from the same dataset")
+        combined_view = RootflowDatasetView(
+            self.dataset,
+            operation(self._index_bitmap(), view._index_bitmap()),
+        )
+        combined_view.parent_views = list(self.parent_views)
+        return combined_view
+
+    def _index_bitmap(self) -> IndexBitmap:
+        """Returns the indices of the view as a bitmap"""
+        if isinstance(self.data_indices, IndexBitmap):
+            return self.data_indices
+        indices = self.data_indices
+        if not isinstance(indices, range):
+            indices = np.where(indices < 0, indices + len(self.dataset), indices)
+        elif indices.step < 0:
+            indices = indices[::-1]
+        return IndexBitmap.from_indices(indices)
+
+    def _id_positions(self, ids: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        """Finds ids in the underlying dataset, and maps their positions onto the view.
+
+        The positions are mapped arithmetically for ranges, by rank for bitmaps, and
+        by a binary search of the sorted indices for arrays.
+        """
+        dataset_positions = self.dataset._id_positions(ids, hashes)
+        found = np.flatnonzero(dataset_positions >= 0)
+        positions = np.full(len(dataset_positions), -1, dtype=np.int64)
+        dataset_positions = dataset_positions[found]
+        indices = self.data_indices
+        if isinstance(indices, range):
+            view_positions, remainders = np.divmod(
+                dataset_positions - indices.start, indices.step
+            )
+            contained = (
+                (remainders == 0)
+                & (view_positions >= 0)
+                & (view_positions < len(indices))
+            )
+            view_positions = np.where(contained, view_positions, -1)
+        elif isinstance(indices, IndexBitmap):
+            view_positions = indices.rank(dataset_positions)
+            contained = indices.rank(dataset_positions + 1) > view_positions
+            view_positions = np.where(contained, view_positions, -1)
+        else:
+            sorted_indices, order = self._get_sorted_indices()
+            view_positions = search_indices(sorted_indices, dataset_positions)
+            if order is not None:
+                view_positions = np.where(
+                    view_positions >= 0, order[view_positions], -1
+                )
+        positions[found] = view_positions
+        return positions
+
+    def _get_sorted_indices(self) -> Tuple[np.ndarray, Union[np.ndarray, None]]:
+        """Returns the array of indices of the view in ascending order.
+
+        Along with the sorted indices, returns the position in the view of each of
+        them, or `None` if the indices were already sorted. Both are kept until the
+        view is pickled.
+        """
+        sorted_indices = getattr(self, "_sorted_indices", None)
+        if sorted_indices is None:
+            indices = self.data_indices
+            if len(indices) > 0 and indices.min() < 0:
+                indices = np.where(indices < 0, indices + len(self.dataset), indices)
+            if len(indices) < 2 or np.all(indices[1:] > indices[:-1]):
+                sorted_indices = (indices, None)
+            else:
+                order = index_array(np.argsort(indices, kind="stable"))
+                sorted_indices = (indices[order], order)
+            self._sorted_indices = sorted_indices
+        return sorted_indices
+
+    def _position_hashes(self) -> np.ndarray:
+        """Returns the hash of the id of each item of the view, in order"""
+        return self.dataset._position_hashes()[index_array(self.data_indices)]
+
+    def _position_ids(self, positions: np.ndarray) -> Union[np.ndarray, list]:
+        """Returns the ids of the items at some positions of the view"""
+        return self.dataset._position_ids(
+            index_array(self._dataset_indices(index_array(positions)))
+        )
+
+    def _transform_path(self) -> Tuple[List[Callable], List[Callable]]:
+        """Returns the data and target transforms not applied by :meth:`_index_raw`"""
+        if self._cache_owner is not None:
+            return ([], [])
+        return self._pipeline_functions()
+
+    def share_memory(self) -> "RootflowDatasetView":
+        """Moves the data of the underlying dataset to shared memory"""
+        self.dataset.share_memory()
+        return self
+
+    def __getstate__(self) -> dict:
+        """Returns the state to pickle, with only the transforms of parent views.
+
+        The parent views, which may hold many more indices than this view, are
+        pickled as only their transforms.
+        """
+        state = super().__getstate__()
+        state["parent_views"] = [
+            TransformLayer(view.data_transforms, view.target_transforms)
+            for view in self.parent_views
+        ]
+        return state
+
+    def _pipeline_functions(self) -> Tuple[List[Callable], List[Callable]]:
+        """Collects the transforms of the dataset, parent views and this view"""
+        data_functions, target_functions = self.dataset._transform_path()
+        layers = self.parent_views + [self]
+        data_functions = list(data_functions) + [
+            function for layer in layers for function in layer.data_transforms
+        ]
+        target_functions = list(target_functions) + [
+            function for layer in layers for function in layer.target_transforms
+        ]
+        return (data_functions, target_functions)
+
+
+class TransformLayer:
+    """The transforms of a parent view, as pickled with a :class:`RootflowDatasetView`.
+
+    Attributes:
+        data_transforms (List[Callable]): The data transforms of the parent view.
+        target_transforms (List[Callable]): The target transforms of the parent view.
+    """
+
+    def __init__(
+        self, data_transforms: List[Callable], target_transforms: List[Callable]
+    ) -> None:
+        self.data_transforms = data_transforms
+        self.target_transforms = target_transforms
+
 
 class ConcatRootflowDatasetView(FunctionalDataset):
-    """Noncopy concatenation of two datasets.
+    """Noncopy concatenation of datasets.
 
     A concat dataset view is a low cost abstraction which allows for interacting with a
-    concatenation of two datasets without duplication of data. Like
+    concatenation of any number of datasets without duplication of data. Like
     :class:`RootflowDataset` the view extends :class:`FunctionalDataset`, and provides
     all of the same functional API. (i.e. You can map, transform, take slices, etc)
+
+    Concatenations of concatenations (such as those created by `sum(datasets)`) are
+    merged automatically. When the view is created, nested concatenations are
+    spliced in as their own leaf datasets, so the view holds a single flat list of
+    leaves, and the correct leaf for an index is found with a binary search over the
+    cumulative leaf lengths. Since transforms may still be added to nested
+    concatenations, the pipeline of each leaf, fusing the transforms of every
+    concatenation above it, is compiled when the view is first indexed, and again
+    only once transforms change.
     """
 
-    def __init__(
-        self,
-        datatset_one: FunctionalDataset,
-        dataset_two: FunctionalDataset,
-    ):
-        """Creates an new concatenated view of two datasets.
-
-        Combines the two given datasets to form a concatenated dataset. Indexing with
-        i < len(`dataset_one`) will access the first dataset and indexing
-        i >= len(`dataset_one`) will access the second dataset. Creating the combination
-        will fail if either of the datasets are not an instance of
-        :class:`FunctionalDataset` or if the datasets each have the same task with
-        different shapes or types.
+    _derived_state = FunctionalDataset._derived_state + (
+        "_leaves",
+        "_leaf_offsets",
+        "_leaf_count",
+        "_spliced",
+        "_segments",
+        "_segment_offsets",
+        "_segment_offset_array",
+        "_segment_pipelines",
+    )
+    _epoch_state = FunctionalDataset._epoch_state + ("_segments_epoch",)
+
+    def __init__(self, *datasets: FunctionalDataset):
+        """Creates an new concatenated view of multiple datasets.
+
+        Combines the given datasets, in order, to form a concatenated dataset. Indexing
+        with i < len(`datasets[0]`) will access the first dataset, the following
+        len(`datasets[1]`) indices will access the second dataset, and so on. Creating
+        the combination will fail if any of the datasets are not an instance of
+        :class:`FunctionalDataset` or if the datasets have the same task with different
+        shapes or types.
 
         Args:
-            dataset_one (FunctionalDataset): The first component of our new dataset.
-            dataset_two (FunctionalDataset): The second component of our new dataset.
+            *datasets (FunctionalDataset): The components of our new dataset.
         """
-        assert isinstance(datatset_one, FunctionalDataset) and isinstance(
-            dataset_two, FunctionalDataset
-        ), f"Cannot concatenate {type(datatset_one)} and {type(dataset_two)}!"
+        for dataset in datasets:
+            assert isinstance(
+                dataset, FunctionalDataset
+            ), f"Cannot concatenate {type(dataset)} with a dataset!"
         super().__init__()
-        self.dataset_one = datatset_one
-        self.dataset_two = dataset_two
-        self.transition_point = len(datatset_one)
-
-        self._tasks = ConcatRootflowDatasetView._combine_tasks(
-            datatset_one.tasks(), dataset_two.tasks()
-        )
+        self.datasets = list(datasets)
+        self._length = sum(len(dataset) for dataset in datasets)
+        self._tasks = combine_tasks([dataset.tasks() for dataset in datasets])
+        for dataset in datasets:
+            self._lineage = self._lineage.merge(dataset._lineage)
+        self._segments_epoch = None
+        self._ensure_leaves()
 
     def tasks(self):
-        """Returns a list of dataset tasks for the two datasets.
+        """Returns a list of dataset tasks for the datasets.
 
         Returns a list containing each unique task for the datasets. The tasks are
         formatted as a dictionary with the following fields:
@@ -419,54 +1221,185 @@ class ConcatRootflowDatasetView(FunctionalDataset):
         """
         return self._tasks
 
-    # TODO This function is doing a bit too much maybe should be refactored
-    # and some of the functionality moved into utils
-    def _combine_tasks(task_list_one, task_list_two):
-        """Returns the unique tasks from two lists of tasks"""
-        tasks = []
+    def map(self, function: Callable, targets: bool = False, batch_size: int = None):
+        raise AttributeError("Cannot map over concatenated datasets!")
 
-        task_names_one = {task["name"] for task in task_list_one}
-        task_names_two = {task["name"] for task in task_list_two}
-        combined_names = task_names_one | task_names_two
-
-        for task_name in combined_names:
-            if task_name in task_names_one and task_name in task_names_two:
-                overlapping_task_one = [
-                    task for task in task_list_one if task["name"] == task_name
-                ][0]
-                overlapping_task_two = [
-                    task for task in task_list_one if task["name"] == task_name
-                ][0]
-
-                task_type_one = overlapping_task_one["type"]
-                task_type_two = overlapping_task_two["type"]
-                if not task_type_one == task_type_two:
-                    raise ValueError(
-                        f"Found two tasks with name {task_name} but types {task_type_one} and {task_type_two}"
-                    )
+    def share_memory(self) -> "ConcatRootflowDatasetView":
+        """Moves the data of each of the datasets to shared memory"""
+        for dataset in self.datasets:
+            dataset.share_memory()
+        return self
 
-                shape_one = overlapping_task_one["shape"]
-                shape_two = overlapping_task_two["shape"]
-                if not shape_one == shape_two:
-                    raise ValueError(
-                        f"Found two tasks with name {task_name} and type {task_type_one} but shapes {shape_one} and {shape_two}"
-                    )
+    def _id_positions(self, ids: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        """Finds ids in each of the datasets, in order, offsetting their positions.
 
-                tasks.append(overlapping_task_one)
-            elif task_name in task_names_one:
-                task = [task for task in task_list_one if task["name"] == task_name][0]
-                tasks.append(task)
-            elif task_name in task_names_two:
-                task = [task for task in task_list_two if task["name"] == task_name][0]
-                tasks.append(task)
-        return tasks
+        Ids found in an earlier dataset are not looked up in the later ones.
+        """
+        positions = np.full(len(hashes), -1, dtype=np.int64)
+        offset = 0
+        for dataset in self.datasets:
+            missing = np.flatnonzero(positions < 0)
+            if len(missing) == 0:
+                break
+            dataset_positions = dataset._id_positions(ids[missing], hashes[missing])
+            found = dataset_positions >= 0
+            positions[missing[found]] = dataset_positions[found] + offset
+            offset += len(dataset)
+        return positions
+
+    def _position_hashes(self) -> np.ndarray:
+        """Returns the hashes of the ids of each of the datasets, concatenated"""
+        return np.concatenate([dataset._position_hashes() for dataset in self.datasets])
+
+    def _position_ids(self, positions: np.ndarray) -> np.ndarray:
+        """Reads the ids at some positions from each of the datasets which hold them"""
+        positions = np.asarray(positions, dtype=np.int64)
+        offsets = np.cumsum([0] + [len(dataset) for dataset in self.datasets])
+        dataset_indices = np.searchsorted(offsets, positions, side="right") - 1
+        ids = np.empty(len(positions), dtype=object)
+        for dataset_index in np.unique(dataset_indices):
+            selected = np.flatnonzero(dataset_indices == dataset_index)
+            ids[selected] = id_array(
+                self.datasets[dataset_index]._position_ids(
+                    positions[selected] - offsets[dataset_index]
+                )
+            )
+        return ids
 
-    def map(self, function: Callable, targets: bool = False, batch_size: int = None):
-        raise AttributeError("Cannot map over concatenated datasets!")
+    def sketches(self, num_workers: int = 0) -> Dict[str, ColumnSketch]:
+        """Gets mergeable sketches of each column of the concatenated datasets.
+
+        Unless the concatenation has transforms of its own, the (cached) sketches of
+        each dataset are merged, rather than reading the datasets again. See
+        :meth:`FunctionalDataset.sketches`.
+
+        Args:
+            num_workers (:obj:`int`, optional): The number of worker processes used to
+                sketch each dataset.
+
+        Returns:
+            Dict[str, ColumnSketch]: The sketch of each column.
+        """
+        if self.data_transforms or self.target_transforms:
+            return super().sketches(num_workers)
+        if self._sketches_epoch != self._transform_epoch():
+            self._sketches = merge_sketches(
+                [dataset.sketches(num_workers) for dataset in self.datasets]
+            )
+            self._sketches_epoch = self._transform_epoch()
+        return self._sketches
 
     def __len__(self):
         """Returns the total length of the concatenated datasets."""
-        return len(self.dataset_one) + len(self.dataset_two)
+        return self._length
+
+    @staticmethod
+    def _splices(dataset: FunctionalDataset) -> bool:
+        """Whether a dataset is spliced in as its leaves, rather than kept as a leaf"""
+        # Concatenations which cache their transforms are kept as leaves
+        return (
+            isinstance(dataset, ConcatRootflowDatasetView)
+            and dataset._cache_owner is None
+        )
+
+    def _ensure_leaves(self) -> None:
+        """Flattens this and any nested concatenations which are not yet flattened.
+
+        Leaves are not pickled, so concatenations are flattened again after
+        unpickling, nested concatenations first.
+        """
+        stack = [(self, False)]
+        while stack:
+            concat, expanded = stack.pop()
+            if getattr(concat, "_leaves", None) is not None:
+                continue
+            if expanded:
+                concat._build_leaves()
+                continue
+            stack.append((concat, True))
+            stack.extend(
+                (dataset, False)
+                for dataset in concat.datasets
+                if isinstance(dataset, ConcatRootflowDatasetView)
+            )
+
+    def _build_leaves(self) -> None:
+        """Flattens the datasets into leaves, splicing in nested concatenations.
+
+        The lists of leaves and offsets of a nested concatenation which comes first
+        are extended in place, as long as no other concatenation has extended them
+        already. The concatenations built by `sum(datasets)` therefore share a single
+        list, and each only reads its first `_leaf_count` leaves.
+        """
+        first = self.datasets[0] if self.datasets else None
+        if self._splices(first) and len(first._leaves) == first._leaf_count:
+            leaves, offsets = first._leaves, first._leaf_offsets
+            remaining = self.datasets[1:]
+        else:
+            leaves, offsets = [], [0]
+            remaining = self.datasets
+        for dataset in remaining:
+            if self._splices(dataset):
+                count = dataset._leaf_count
+                start = offsets[-1]
+                leaves.extend(dataset._leaves[:count])
+                offsets.extend(
+                    [start + offset for offset in dataset._leaf_offsets[1 : count + 1]]
+                )
+            else:
+                leaves.append(dataset)
+                offsets.append(offsets[-1] + len(dataset))
+        self._leaves = leaves
+        self._leaf_offsets = offsets
+        self._leaf_count = len(leaves)
+        self._spliced = [self._splices(dataset) for dataset in self.datasets]
+
+    def _compile_segments(self) -> None:
+        """Compiles the pipeline of each leaf, from the transforms above it.
+
+        Nested concatenations which have started caching their transforms since they
+        were spliced in are indexed as a single segment instead of as their leaves,
+        so that their cache is used. Only then are the offsets recomputed.
+        """
+        self._ensure_leaves()
+        segments, pipelines = [], []
+        collapsed = False
+        stack = [(self, True, [], [])]
+        while stack:
+            dataset, spliced, data_transforms, target_transforms = stack.pop()
+            if spliced and (dataset is self or dataset._cache_owner is None):
+                # Inner transforms run first, lists are only copied when they grow
+                if dataset.data_transforms:
+                    data_transforms = dataset.data_transforms + data_transforms
+                if dataset.target_transforms:
+                    target_transforms = dataset.target_transforms + target_transforms
+                for child, child_spliced in zip(
+                    reversed(dataset.datasets), reversed(dataset._spliced)
+                ):
+                    stack.append(
+                        (child, child_spliced, data_transforms, target_transforms)
+                    )
+                continue
+            collapsed = collapsed or spliced
+            leaf_data_transforms, leaf_target_transforms = dataset._transform_path()
+            segments.append(dataset)
+            pipelines.append(
+                (
+                    TransformPipeline(list(leaf_data_transforms) + data_transforms),
+                    TransformPipeline(list(leaf_target_transforms) + target_transforms),
+                )
+            )
+        if collapsed:
+            offsets = [0]
+            for segment in segments:
+                offsets.append(offsets[-1] + len(segment))
+        else:
+            offsets = self._leaf_offsets[: self._leaf_count + 1]
+        self._segments = segments
+        self._segment_offsets = offsets
+        self._segment_offset_array = np.asarray(offsets, dtype=np.int64)
+        self._segment_pipelines = pipelines
+        self._segments_epoch = self._transform_epoch()
 
     def index(self, index):
         """Gets a single data example.
@@ -482,18 +1415,241 @@ class ConcatRootflowDatasetView(FunctionalDataset):
             tuple: A tuple of three items, respectively, the id of the data item, the
                 data content of the item, and the target of the data item.
         """
-        if index < self.transition_point:
-            selected_dataset = self.dataset_one
-        else:
-            selected_dataset = self.dataset_two
-            index -= self.transition_point
-        id, data, target = selected_dataset.index(index)
-        if self.has_data_transforms:
-            data = map_functions(data, self.data_transforms)
-        if self.has_target_transforms:
-            target = map_functions(target, self.target_transforms)
+        if self._segments_epoch != self._transform_epoch():
+            self._compile_segments()
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(f"Index {index} out of range for length {self._length}")
+        leaf_index = bisect_right(self._segment_offsets, index) - 1
+        id, data, target = self._segments[leaf_index]._index_raw(
+            index - self._segment_offsets[leaf_index]
+        )
+        data_pipeline, target_pipeline = self._segment_pipelines[leaf_index]
+        if data_pipeline:
+            data = self._apply_transforms(index, data, data_pipeline, "data")
+        if target_pipeline:
+            target = self._apply_transforms(index, target, target_pipeline, "target")
         return (id, data, target)
 
+    def index_batch(self, indices: Sequence[int]) -> tuple:
+        """Gets a batch of data examples.
+
+        Groups the indices by the dataset which contains them, retrieves one batch
+        from each of those datasets, and merges the batches back into the order of
+        the given indices. See :meth:`FunctionalDataset.index_batch`.
+
+        Args:
+            indices (Sequence[int]): The indices of the items to retrieve.
+
+        Returns:
+            tuple: A tuple of three columns, respectively, the ids, data and targets of
+                the data items.
+        """
+        if self._segments_epoch != self._transform_epoch():
+            self._compile_segments()
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = np.where(indices < 0, indices + self._length, indices)
+        if len(indices) and not (0 <= indices.min() and indices.max() < self._length):
+            raise IndexError(f"Index out of range for length {self._length}")
+        leaf_offsets = self._segment_offset_array
+        leaf_indices = np.searchsorted(leaf_offsets, indices, side="right") - 1
+        order = np.argsort(leaf_indices, kind="stable")
+        boundaries = np.flatnonzero(np.diff(leaf_indices[order])) + 1
+        positions, id_batches, data_batches, target_batches = [], [], [], []
+        for group in np.split(order, boundaries) if len(order) else []:
+            leaf_index = leaf_indices[group[0]]
+            ids, data, targets = self._segments[leaf_index]._index_batch_raw(
+                (indices[group] - leaf_offsets[leaf_index]).tolist()
+            )
+            if targets is None:
+                targets = [None] * len(group)
+            data_pipeline, target_pipeline = self._segment_pipelines[leaf_index]
+            if data_pipeline:
+                data = self._apply_transforms_batch(
+                    indices[group], data, data_pipeline, "data"
+                )
+            if target_pipeline:
+                targets = self._apply_transforms_batch(
+                    indices[group], targets, target_pipeline, "target"
+                )
+            positions.append(group)
+            id_batches.append(ids)
+            data_batches.append(data)
+            target_batches.append(targets)
+        length = len(indices)
+        return (
+            merge_batches(positions, id_batches, length),
+            merge_batches(positions, data_batches, length),
+            merge_batches(positions, target_batches, length),
+        )
+
+
+class JoinedRootflowDatasetView(FunctionalDataset):
+    """Noncopy join of two datasets by the ids of their items.
+
+    A joined dataset view pairs each item of a dataset with the item of another
+    dataset which has the same id, without duplication of data. Like
+    :class:`RootflowDataset` the view extends :class:`FunctionalDataset`, and provides
+    all of the same functional API. (i.e. You can transform, take slices, etc)
+
+    Each item has the id of the item of the first dataset, and its data and target
+    are pairs of the data and targets of the two items. Items of the first dataset
+    whose id is not in the second are left out. The first time the view is used,
+    the hash of each id of the first dataset is looked up in the id index of the
+    second (see :class:`IdIndex`), and only the positions of the paired items in
+    each dataset are kept.
+
+    Attributes:
+        datasets (List[FunctionalDataset]): The two joined datasets.
+    """
+
+    def __init__(self, dataset: FunctionalDataset, other: FunctionalDataset):
+        """Creates a new joined view of two datasets.
+
+        Args:
+            dataset (FunctionalDataset): The dataset whose items are kept, in order.
+            other (FunctionalDataset): The dataset whose items are paired with them.
+        """
+        for component in (dataset, other):
+            assert isinstance(
+                component, FunctionalDataset
+            ), f"Cannot join {type(component)} with a dataset!"
+        super().__init__()
+        self.datasets = [dataset, other]
+        self._lineage = dataset._lineage.merge(other._lineage)
+        self._alignment = None
+
+    def tasks(self) -> List[dict]:
+        """Returns the tasks of both datasets, whose targets are paired"""
+        return [task for dataset in self.datasets for task in dataset.tasks() or []]
+
+    def map(self, function: Callable, targets: bool = False, batch_size: int = None):
+        raise AttributeError("Cannot map over joined datasets!")
+
+    def share_memory(self) -> "JoinedRootflowDatasetView":
+        """Moves the data of both datasets to shared memory"""
+        for dataset in self.datasets:
+            dataset.share_memory()
+        return self
+
+    def __len__(self):
+        """Returns the number of paired items"""
+        return len(self._align()[0])
+
+    def _align(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the positions of the paired items in each dataset.
+
+        The items are aligned the first time this is called. The alignment is
+        pickled with the view, so that it is not repeated in data loader workers.
+        """
+        if self._alignment is None:
+            dataset, other = self.datasets
+            hashes = dataset._position_hashes()
+            # The ids are read back in chunks, to compare where the hashes match
+            other_positions = np.concatenate(
+                [np.empty(0, dtype=np.int64)]
+                + [
+                    other._id_positions(
+                        id_array(
+                            dataset._position_ids(
+                                np.arange(chunk.start, chunk.stop, dtype=np.int64)
+                            )
+                        ),
+                        hashes[chunk],
+                    )
+                    for chunk in chunk_slices(
+                        len(hashes), 0, chunk_size=ID_INDEX_CHUNK_SIZE
+                    )
+                ]
+            )
+            positions = np.flatnonzero(other_positions >= 0)
+            self._alignment = (
+                index_array(positions),
+                index_array(other_positions[positions]),
+            )
+        return self._alignment
+
+    def index(self, index):
+        """Gets a single pair of data examples.
+
+        Args:
+            index (int): The index of the pair to retrieve.
+
+        Returns:
+            tuple: A tuple of three items, respectively, the id of the data items, the
+                data of both items, and the targets of both items. The targets are
+                `None` if neither item has a target.
+        """
+        positions, other_positions = self._align()
+        dataset, other = self.datasets
+        id, data, target = dataset.index(int(positions[index]))
+        _, other_data, other_target = other.index(int(other_positions[index]))
+        data = (data, other_data)
+        if target is not None or other_target is not None:
+            target = (target, other_target)
+        data_pipeline, target_pipeline = self._pipelines()
+        if data_pipeline:
+            data = self._apply_transforms(index, data, data_pipeline, "data")
+        if target_pipeline:
+            target = self._apply_transforms(index, target, target_pipeline, "target")
+        return (id, data, target)
+
+    def index_batch(self, indices: Sequence[int]) -> tuple:
+        """Gets a batch of pairs of data examples.
+
+        Retrieves one batch from each dataset, and pairs their data and targets. See
+        :meth:`FunctionalDataset.index_batch`.
+
+        Args:
+            indices (Sequence[int]): The indices of the pairs to retrieve.
+
+        Returns:
+            tuple: A tuple of three columns, respectively, the ids, data and targets of
+                the pairs of data items.
+        """
+        positions, other_positions = self._align()
+        batch_indices = index_array(indices)
+        dataset, other = self.datasets
+        ids, data, targets = dataset.index_batch(positions[batch_indices])
+        _, other_data, other_targets = other.index_batch(other_positions[batch_indices])
+        data = list(zip(data, other_data))
+        if targets is None and other_targets is None:
+            targets = None
+        else:
+            targets = list(
+                zip(
+                    [None] * len(indices) if targets is None else targets,
+                    [None] * len(indices) if other_targets is None else other_targets,
+                )
+            )
+        data_pipeline, target_pipeline = self._pipelines()
+        if data_pipeline:
+            data = self._apply_transforms_batch(indices, data, data_pipeline, "data")
+        if target_pipeline:
+            if targets is None:
+                targets = [None] * len(indices)
+            targets = self._apply_transforms_batch(
+                indices, targets, target_pipeline, "target"
+            )
+        return (ids, data, targets)
+
+    def _id_positions(self, ids: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        """Finds ids in the first dataset, and maps their positions onto the pairs"""
+        positions = self._align()[0]
+        dataset_positions = self.datasets[0]._id_positions(ids, hashes)
+        return np.where(
+            dataset_positions >= 0, search_indices(positions, dataset_positions), -1
+        )
+
+    def _position_hashes(self) -> np.ndarray:
+        """Returns the hash of the id of each pair, that of the first dataset"""
+        return self.datasets[0]._position_hashes()[self._align()[0]]
+
+    def _position_ids(self, positions: np.ndarray) -> Union[np.ndarray, list]:
+        """Returns the ids of the pairs at some positions, those of the first dataset"""
+        return self.datasets[0]._position_ids(self._align()[0][positions])
+
 
 class RootflowDataItem:
     """A single data example for rootflow datasets.
@@ -0,0 +1,404 @@
+"""Downloading utilities for rootflow datasets.
+
+Houses :func:`download_files`, which :meth:`RootflowDataset.download`
+implementations may use to fetch their files, and :class:`DownloadLock`, which
+rootflow datasets hold while downloading so that only one process downloads a
+dataset at a time.
+
+Files are fetched concurrently, in threads, and large files may be split into byte
+ranges which are also fetched concurrently. Each file (or range) is written to a
+partial file next to its destination, and moved into place only once it is complete
+and its checksum (if given) has been verified, so an interrupted download is resumed
+from where it stopped, and a file at its destination is always complete. Both
+`http(s)://` and `file://` URLs are supported, the latter being useful for mirrors
+on shared filesystems and for tests.
+
+Attributes:
+    DOWNLOAD_CHUNK_SIZE: The number of bytes read and written at a time.
+    DOWNLOAD_WORKERS: The default number of concurrent downloads.
+    DOWNLOAD_RETRIES: The default number of times a failed request is retried.
+    DOWNLOAD_TIMEOUT: The default timeout of each request, in seconds.
+    LOCK_SUFFIX: The suffix of the lock file, which is created next to the directory
+        being downloaded to.
+    LOCK_POLL_INTERVAL: How often, in seconds, a held lock is checked on platforms
+        without `flock`.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, Sequence, Tuple, Union
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from urllib.request import Request, url2pathname, urlopen
+import hashlib
+import logging
+import os
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 60.0
+LOCK_SUFFIX = ".lock"
+LOCK_POLL_INTERVAL = 0.1
+
+
+class RemoteFile:
+    """A file to download.
+
+    Attributes:
+        url (str): The location of the file, an `http(s)://` or `file://` URL.
+        name (str): The path of the file within the download directory.
+        checksum (str): The expected checksum of the file, as `"<algorithm>:<hex
+            digest>"` (for example `"sha256:9f86d0..."`), or `None`.
+    """
+
+    def __init__(self, url: str, name: str = None, checksum: str = None) -> None:
+        """Describes a file to download.
+
+        Args:
+            url (str): The location of the file.
+            name (:obj:`str`, optional): The path of the file within the download
+                directory. Defaults to the last component of the URL's path.
+            checksum (:obj:`str`, optional): The expected checksum of the file, as
+                `"<algorithm>:<hex digest>"`, with any algorithm in :mod:`hashlib`.
+        """
+        self.url = url
+        self.name = name or os.path.basename(urlparse(url).path)
+        self.checksum = checksum
+        if checksum is not None:
+            algorithm, _, digest = checksum.partition(":")
+            if not digest or algorithm not in hashlib.algorithms_available:
+                raise ValueError(
+                    f"Checksum {checksum} should be '<algorithm>:<hex digest>', with an algorithm from hashlib"
+                )
+
+    def __repr__(self) -> str:
+        return f"RemoteFile({self.url!r}, name={self.name!r})"
+
+
+def download_files(
+    files: Sequence[Union[str, RemoteFile]],
+    directory: str,
+    num_workers: int = DOWNLOAD_WORKERS,
+    num_connections: int = 1,
+    retries: int = DOWNLOAD_RETRIES,
+    timeout: float = DOWNLOAD_TIMEOUT,
+) -> List[str]:
+    """Downloads files concurrently, resuming partial downloads.
+
+    Files which are already in the directory (and match their checksum, if given)
+    are not downloaded again. Files which were partially downloaded are resumed.
+    If num_connections is more than one, files whose size is known, and whose
+    server supports range requests, are split into that many byte ranges, which are
+    fetched concurrently and joined once they are all complete.
+
+    Args:
+        files (Sequence[Union[str, RemoteFile]]): The files to download, or their
+            URLs.
+        directory (str): The directory to download the files to, created if it does
+            not exist.
+        num_workers (:obj:`int`, optional): The number of files, or byte ranges,
+            fetched at the same time.
+        num_connections (:obj:`int`, optional): The number of byte ranges each file
+            may be split into.
+        retries (:obj:`int`, optional): The number of times a failed request is
+            retried, resuming from where it stopped.
+        timeout (:obj:`float`, optional): The timeout of each request, in seconds.
+
+    Returns:
+        List[str]: The path of each downloaded file.
+
+    Raises:
+        ValueError: If a downloaded file does not match its checksum.
+        OSError: If a file cannot be fetched after every retry.
+    """
+    files = [RemoteFile(file) if isinstance(file, str) else file for file in files]
+    paths = [os.path.join(directory, file.name) for file in files]
+    pending = []
+    for file, path in zip(files, paths):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path):
+            if file.checksum is None or verify_checksum(path, file.checksum):
+                logging.info(f"{file.name} is already downloaded, skipping.")
+                continue
+            logging.warning(f"{file.name} does not match its checksum, downloading.")
+            os.remove(path)
+        pending.append((file, path))
+    if not pending:
+        return paths
+
+    with ThreadPoolExecutor(max(1, num_workers)) as executor:
+        plans = list(
+            executor.map(
+                lambda pending_file: _plan_ranges(
+                    pending_file[0].url, num_connections, timeout
+                ),
+                pending,
+            )
+        )
+        range_jobs = [
+            (file.url, _part_path(path, part_index, len(ranges)), start, stop)
+            for (file, path), ranges in zip(pending, plans)
+            for part_index, (start, stop) in enumerate(ranges)
+        ]
+        # Consuming the results raises the first error, if any range failed
+        list(
+            executor.map(
+                lambda job: _fetch_range(*job, retries=retries, timeout=timeout),
+                range_jobs,
+            )
+        )
+        list(
+            executor.map(
+                lambda job: _assemble(*job[0], num_parts=len(job[1])),
+                zip(pending, plans),
+            )
+        )
+    return paths
+
+
+def verify_checksum(path: str, checksum: str) -> bool:
+    """Returns whether a file matches a checksum, see :class:`RemoteFile`"""
+    algorithm, _, expected_digest = checksum.partition(":")
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest() == expected_digest.lower()
+
+
+def _part_path(path: str, part_index: int, num_parts: int) -> str:
+    """Returns the path of a partial file, for one byte range of a file"""
+    if num_parts == 1:
+        return f"{path}.part"
+    return f"{path}.part{part_index}"
+
+
+def _plan_ranges(
+    url: str, num_connections: int, timeout: float
+) -> List[Tuple[int, Union[int, None]]]:
+    """Splits a file into byte ranges, if its size is known and ranges are supported.
+
+    Returns a list of `(start, stop)` ranges, where a stop of `None` is the end of
+    the file.
+    """
+    if num_connections <= 1:
+        return [(0, None)]
+    size, supports_ranges = _remote_size(url, timeout)
+    if size is None or not supports_ranges or size < num_connections:
+        return [(0, None)]
+    boundaries = [size * part // num_connections for part in range(num_connections)]
+    return list(zip(boundaries, boundaries[1:] + [size]))
+
+
+def _remote_size(url: str, timeout: float) -> Tuple[Union[int, None], bool]:
+    """Returns the size of a remote file, and whether it supports range requests"""
+    parsed_url = urlparse(url)
+    if parsed_url.scheme == "file":
+        return (os.path.getsize(url2pathname(parsed_url.path)), True)
+    try:
+        with urlopen(Request(url, method="HEAD"), timeout=timeout) as response:
+            size = response.headers.get("Content-Length")
+            supports_ranges = response.headers.get("Accept-Ranges") == "bytes"
+    except OSError:
+        return (None, False)
+    return (None if size is None else int(size), supports_ranges)
+
+
+def _open_range(
+    url: str, start: int, stop: Union[int, None], timeout: float
+) -> Tuple[BinaryIO, bool]:
+    """Opens a stream of a file from a byte offset.
+
+    Returns the stream, and whether it starts at the requested offset. (Servers
+    which do not support range requests send the whole file instead)
+    """
+    parsed_url = urlparse(url)
+    if parsed_url.scheme == "file":
+        stream = open(url2pathname(parsed_url.path), "rb")
+        stream.seek(start)
+        return (stream, True)
+    request = Request(url)
+    if start > 0 or stop is not None:
+        end = "" if stop is None else stop - 1
+        request.add_header("Range", f"bytes={start}-{end}")
+    response = urlopen(request, timeout=timeout)
+    return (response, (start == 0 and stop is None) or response.status == 206)
+
+
+def _fetch_range(
+    url: str,
+    part_path: str,
+    start: int,
+    stop: Union[int, None],
+    retries: int,
+    timeout: float,
+) -> None:
+    """Fetches a byte range of a file into a partial file, resuming and retrying"""
+    for attempt in range(retries + 1):
+        fetched = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if stop is not None and fetched >= stop - start:
+            return
+        try:
+            stream, resumed = _open_range(url, start + fetched, stop, timeout)
+            with stream:
+                if not resumed:
+                    if start > 0 or stop is not None:
+                        raise OSError(f"Server ignored the range request for {url}")
+                    fetched = 0
+                remaining = None if stop is None else stop - start - fetched
+                with open(part_path, "ab" if fetched else "wb") as part_file:
+                    while remaining is None or remaining > 0:
+                        size = DOWNLOAD_CHUNK_SIZE
+                        if remaining is not None:
+                            size = min(size, remaining)
+                        chunk = stream.read(size)
+                        if not chunk:
+                            break
+                        part_file.write(chunk)
+                        if remaining is not None:
+                            remaining -= len(chunk)
+            if remaining is not None and remaining > 0:
+                raise OSError(f"Connection closed before the end of {url}")
+            return
+        except OSError as error:
+            # A resumed file which was already complete has nothing left to send
+            if isinstance(error, HTTPError) and error.code == 416 and fetched:
+                return
+            if attempt == retries:
+                raise
+            logging.warning(
+                f"Failed to fetch {url} ({error}), retrying ({attempt + 1}/{retries})."
+            )
+            time.sleep(min(2**attempt, 30) * 0.5)
+
+
+def _assemble(file: RemoteFile, path: str, num_parts: int) -> None:
+    """Joins the partial files of a download, verifies it and moves it into place"""
+    if num_parts == 1:
+        temporary_path = _part_path(path, 0, 1)
+    else:
+        temporary_path = f"{path}.part"
+        with open(temporary_path, "wb") as output_file:
+            for part_index in range(num_parts):
+                with open(_part_path(path, part_index, num_parts), "rb") as part_file:
+                    shutil.copyfileobj(part_file, output_file, DOWNLOAD_CHUNK_SIZE)
+        for part_index in range(num_parts):
+            os.remove(_part_path(path, part_index, num_parts))
+    if file.checksum is not None and not verify_checksum(temporary_path, file.checksum):
+        os.remove(temporary_path)
+        raise ValueError(f"Downloaded file {file.name} does not match {file.checksum}")
+    os.replace(temporary_path, path)
+    logging.info(f"Downloaded {file.name}.")
+
+
+class DownloadLock:
+    """A lock which only one process (across every rank on a node) may hold.
+
+    The lock is a file next to the directory being downloaded to (for example
+    `/data/my_dataset.lock` for `/data/my_dataset`), locked with `flock`, or on
+    platforms without `flock`, created exclusively. Processes which find the lock
+    held wait for it, rather than downloading at the same time. The time of the last
+    completed download is written into the lock file, so once the lock is acquired,
+    :meth:`completed_by_other` tells whether another process finished a download
+    while this one was waiting, in which case it need not download again.
+
+    Processes which only read the data take the lock as shared, which waits for any
+    download in progress to finish, but lets the readers hold the lock together.
+    Checking whether the data is present while holding the shared lock therefore
+    never sees a partial download.
+
+    Example:
+        >>> with DownloadLock(root) as lock:
+        ...     if not lock.completed_by_other():
+        ...         download(root)
+        ...         lock.mark_complete()
+
+    Attributes:
+        path (str): The path of the lock file.
+        shared (bool): Whether the lock is held by readers, rather than a download.
+    """
+
+    def __init__(self, directory: str, shared: bool = False) -> None:
+        """Creates a lock for a download directory.
+
+        Args:
+            directory (str): The directory being downloaded to.
+            shared (:obj:`bool`, optional): Whether to take the lock as shared, to
+                read the directory rather than download to it.
+        """
+        self.path = os.path.normpath(directory) + LOCK_SUFFIX
+        self.shared = shared
+        self._lock_file = None
+        self._requested_at = None
+
+    def __enter__(self) -> "DownloadLock":
+        """Waits for, and acquires, the lock"""
+        self._requested_at = time.time()
+        if self.shared:
+            return self._enter_shared()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if fcntl is not None:
+            self._lock_file = open(self.path, "a+")
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            exclusive_path = f"{self.path}.held"
+            while True:
+                try:
+                    self._lock_file = os.open(
+                        exclusive_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY
+                    )
+                    break
+                except FileExistsError:
+                    time.sleep(LOCK_POLL_INTERVAL)
+        return self
+
+    def _enter_shared(self) -> "DownloadLock":
+        """Waits for any download in progress, and acquires the lock as shared.
+
+        Nothing is created for a shared lock. Downloads create the lock file before
+        writing anything, so where there is no lock file no download has started,
+        and no lock is taken.
+        """
+        if fcntl is None:
+            while os.path.exists(f"{self.path}.held"):
+                time.sleep(LOCK_POLL_INTERVAL)
+            return self
+        try:
+            self._lock_file = open(self.path, "r")
+        except OSError:
+            return self
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exception_info) -> None:
+        """Releases the lock"""
+        if self._lock_file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._lock_file.close()
+        else:
+            os.close(self._lock_file)
+            os.remove(f"{self.path}.held")
+        self._lock_file = None
+
+    def completed_by_other(self) -> bool:
+        """Whether a download was completed since this process asked for the lock"""
+        try:
+            with open(self.path) as lock_file:
+                completed_at = float(lock_file.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return False
+        return completed_at >= self._requested_at
+
+    def mark_complete(self) -> None:
+        """Records that the download is complete, for processes which are waiting"""
+        with open(self.path, "w") as lock_file:
+            lock_file.write(f"{time.time()}\n")
@@ -2,21 +2,97 @@
 
 Implements the basics of rootflow's functional API for rootflow datasets and
 dataset-like objects. (For example RootflowDatasetView)
+
+Attributes:
+    STATISTICS_CHUNK_SIZE: The number of examples summarized at a time by
+        :meth:`FunctionalDataset.stats`, when not using worker processes.
 """
 
-from typing import Callable, Sequence, Tuple, List, Union
+from typing import Any, Callable, Dict, Hashable, Sequence, Tuple, List, Union
+from array import array
+from functools import partial
 import os
 import random
+import numpy as np
+import torch
 from torch.utils.data import Dataset
 
 import setkit.datasets.base.dataset as rootflow_datasets
+from setkit.datasets.base.bitmap import IndexBitmap
 from setkit.datasets.base.utils import get_nested_data_types
+from setkit.datasets.base.pipeline import TransformPipeline
+from setkit.datasets.base.id_index import id_array
+from setkit.datasets.base.sketches import hash_values
+from setkit.datasets.base.statistics import (
+    ColumnSketch,
+    accumulate_sketches,
+    accumulate_statistics,
+    merge_sketches,
+    merge_statistics,
+)
+from setkit.datasets.base.parallel import chunk_slices, run_chunks
+from setkit.datasets.base.storage import (
+    DEFAULT_SHARD_SIZE,
+    ShardedStorage,
+    shard_directory_name,
+    write_shard,
+)
+from setkit.datasets.base.transform_cache import (
+    cached_transform,
+    cached_transform_batch,
+    new_cache_owner,
+)
 from setkit.datasets.base.display_utils import (
     format_docstring,
     format_examples_tabular,
     format_statistics,
 )
 
+STATISTICS_CHUNK_SIZE = 8192
+
+
+class TransformLineage:
+    """Tracks changes to the transforms of a group of related datasets.
+
+    A dataset shares its lineage with the datasets it was created from. (Views with
+    the dataset they view, concatenations and joins with each of their datasets)
+    Each time a transform is added to one of them, or one is mapped, the epoch of
+    their lineage advances. Fused pipelines, cached transform results, statistics
+    and sketches are only valid within the epoch of their dataset's lineage, so
+    changes to unrelated datasets do not invalidate them.
+
+    Lineages joined by a concatenation are merged into one, and the epoch of the
+    merged lineage is greater than any epoch of either of them, so that nothing
+    computed before the merge is mistaken as current.
+
+    Attributes:
+        epoch (int): The current epoch, which only ever increases.
+        merged_into (TransformLineage): The lineage this one was merged into, if any.
+    """
+
+    def __init__(self) -> None:
+        self.epoch = 0
+        self.merged_into = None
+
+    def find(self) -> "TransformLineage":
+        """Returns the lineage this lineage has been merged into, or itself"""
+        lineage = self
+        while lineage.merged_into is not None:
+            lineage = lineage.merged_into
+        return lineage
+
+    def advance(self) -> None:
+        """Advances the epoch, after the transforms of the lineage change"""
+        self.find().epoch += 1
+
+    def merge(self, other: "TransformLineage") -> "TransformLineage":
+        """Merges another lineage into this one, returning the merged lineage"""
+        lineage, other = self.find(), other.find()
+        if lineage is not other:
+            lineage.epoch = max(lineage.epoch, other.epoch) + 1
+            other.merged_into = lineage
+        return lineage
+
 
 class FunctionalDataset(Dataset):
     """Abstract class for rootflow's functional dataset API.
@@ -24,45 +100,93 @@ class FunctionalDataset(Dataset):
     Implements shared behavior for RootflowDataset, RootflowDatasetView, and
     ConcatRootflowDatasetView. This includes things like slicable indexing,
     and formatted display functionality.
+
+    Every dataset belongs to a :class:`TransformLineage`, whose epoch tells views
+    which have fused the transforms of the datasets they were created from when to
+    fuse them again. Cached transform results, statistics and sketches are likewise
+    only valid within an epoch.
     """
 
+    _derived_state = ("_compiled_pipelines", "_statistics", "_sketches")
+    _epoch_state = ("_compiled_epoch", "_statistics_epoch", "_sketches_epoch")
+
     def __init__(self) -> None:
         self.data_transforms = []
         self.target_transforms = []
         self.has_data_transforms = False
         self.has_target_transforms = False
+        self._cache_owner = None
+        self._lineage = TransformLineage()
+        self._compiled_epoch = None
+        self._statistics_epoch = None
+        self._sketches_epoch = None
 
     def __len__(self):
         """Returns the dataset length"""
         raise NotImplementedError
 
-    def __getitem__(self, index: Union[int, slice, tuple, list]):
+    def __getitem__(
+        self, index: Union[int, slice, range, tuple, list, np.ndarray, torch.Tensor]
+    ):
         """Indexes dataset
 
         If the index specified is an integer, the dataset will call its index method,
         pack the result into a dictionary, and return it. However, if the index is
-        instead a slice or a list of integers, the dataset will return a view of itself
-        with the appropriate indices.
+        instead a slice, a range or a list of integers, the dataset will return a view
+        of itself with the appropriate indices.
+
+        Numpy and torch integers and integer arrays (such as those produced by
+        samplers) are accepted as well, along with boolean masks of the same length
+        as the dataset. Arrays are kept as arrays, rather than converted to lists, so
+        views of them are gathered in bulk from columnar storage.
 
         Args:
-            index Union[int, slice, tuple, list]: Specifies the portion of the dataset
-                to select.
+            index Union[int, slice, range, tuple, list, np.ndarray, torch.Tensor]:
+                Specifies the portion of the dataset to select.
 
         Returns:
             Union[dict, RootflowDatasetView]: Either a single data item, containing an
                 `"id"`, `"data"` and a `"target"`, or a :class:`RootflowDatasetView`
                 of the desired indices.
+
+        Raises:
+            IndexError: If an array index is not one dimensional, or a boolean mask
+                does not have the length of the dataset.
+            TypeError: If the index is not of a supported type.
         """
-        if isinstance(index, int):
-            id, data, target = self.index(index)
+        if isinstance(index, torch.Tensor):
+            index = index.detach().cpu().numpy()
+        if isinstance(index, np.ndarray) and index.ndim == 0:
+            index = index.item()
+        if isinstance(index, (int, np.integer)):
+            id, data, target = self.index(int(index))
             return {"id": id, "data": data, "target": target}
         elif isinstance(index, slice):
-            data_indices = list(range(len(self))[index])
             return rootflow_datasets.RootflowDatasetView(
-                self, data_indices, sorted=False
+                self, range(len(self))[index], sorted=False
             )
+        elif isinstance(index, range):
+            return rootflow_datasets.RootflowDatasetView(self, index, sorted=False)
         elif isinstance(index, (tuple, list)):
             return rootflow_datasets.RootflowDatasetView(self, index)
+        elif isinstance(index, np.ndarray):
+            if index.ndim != 1:
+                raise IndexError(
+                    f"Index arrays must be one dimensional, got shape {index.shape}"
+                )
+            if index.dtype == np.bool_:
+                if len(index) != len(self):
+                    raise IndexError(
+                        f"Boolean mask of length {len(index)} does not match the "
+                        f"dataset length {len(self)}"
+                    )
+                return rootflow_datasets.RootflowDatasetView(
+                    self, IndexBitmap.from_mask(index)
+                )
+            if index.dtype.kind not in "iu":
+                raise IndexError(f"Index arrays must be integers, got {index.dtype}")
+            return rootflow_datasets.RootflowDatasetView(self, index)
+        raise TypeError(f"Cannot index a dataset with {type(index).__name__}")
 
     def __iter__(self):
         """Iterates over dataset
@@ -82,6 +206,96 @@ class FunctionalDataset(Dataset):
         """Gets a data item at the index"""
         raise NotImplementedError
 
+    def index_batch(self, indices: Sequence[int]) -> tuple:
+        """Gets a batch of data items at the indices
+
+        Like :meth:`index`, but retrieves multiple data examples at once and returns
+        them as columns, instead of as a tuple for each example. Datasets override this
+        to gather the examples in bulk, by default it calls :meth:`index` for each.
+
+        Args:
+            indices (Sequence[int]): The indices of the items to retrieve.
+
+        Returns:
+            tuple: A tuple of three columns, respectively, the ids, data and targets of
+                the data items. Each column is a list, or a numpy array for numeric
+                columns which could be gathered in bulk. The targets may be `None`
+                if none of the data items have targets.
+        """
+        ids, data, targets = [], [], []
+        for index in indices:
+            id, example_data, target = self.index(index)
+            ids.append(id)
+            data.append(example_data)
+            targets.append(target)
+        return (ids, data, targets)
+
+    def by_id(self, id: Hashable) -> dict:
+        """Gets the data item with the given id.
+
+        Items are found with a hash index of the ids of the underlying dataset, which
+        is built the first time any of its items are looked up by id, after which
+        each lookup takes constant time. See :class:`IdIndex`.
+
+        Args:
+            id (Hashable): The id of the item to retrieve.
+
+        Returns:
+            dict: A dictionary containing an `"id"`, `"data"` and a `"target"`
+
+        Raises:
+            KeyError: If no item in the dataset has the id.
+        """
+        (position,) = self._id_positions(id_array([id]), hash_values([id]))
+        if position < 0:
+            raise KeyError(id)
+        return self[int(position)]
+
+    def ids_to_view(
+        self, ids: Sequence[Hashable]
+    ) -> "rootflow_datasets.RootflowDatasetView":
+        """Creates a view of the items with the given ids, in the order of the ids.
+
+        Like :meth:`by_id`, every id is looked up in the hash index of the dataset's
+        ids, so the cost depends only on the number of ids given.
+
+        Args:
+            ids (Sequence[Hashable]): The ids of the items to include in the view.
+
+        Returns:
+            RootflowDatasetView: A view of the items.
+
+        Raises:
+            KeyError: If any of the ids are not in the dataset.
+        """
+        id_values = id_array(ids)
+        positions = self._id_positions(id_values, hash_values(id_values))
+        missing = np.flatnonzero(positions < 0)
+        if len(missing) > 0:
+            raise KeyError(
+                f"{len(missing)} ids are not in the dataset, such as "
+                f"{ids[missing[0]]!r}"
+            )
+        return rootflow_datasets.RootflowDatasetView(self, positions, sorted=False)
+
+    def join(
+        self, dataset: "FunctionalDataset"
+    ) -> "rootflow_datasets.JoinedRootflowDatasetView":
+        """Pairs the items of the dataset with the items of another by their ids.
+
+        The joined dataset contains each item of `self` whose id is also in
+        `dataset`, in the order of `self`, with the data and targets of both items
+        as pairs. Neither dataset is read to join them, only their ids are indexed.
+        See :class:`JoinedRootflowDatasetView`.
+
+        Args:
+            dataset (FunctionalDataset): The dataset to join with.
+
+        Returns:
+            JoinedRootflowDatasetView: A view of the paired items.
+        """
+        return rootflow_datasets.JoinedRootflowDatasetView(self, dataset)
+
     def split(
         self, validation_proportion: float = 0.1, seed: int = None
     ) -> Tuple[
@@ -102,12 +316,18 @@ class FunctionalDataset(Dataset):
                 respectively, the train set and the validation set.
         """
         dataset_length = len(self)
-        indices = list(range(dataset_length))
+        # Shuffles a compact array in place, in the same order as a list of indices
+        indices = array("i" if dataset_length < 2**31 else "q", range(dataset_length))
         random.Random(seed).shuffle(indices)
+        indices = np.frombuffer(indices, dtype=np.dtype(indices.typecode))
         n_test = int(dataset_length * validation_proportion)
         return (
-            rootflow_datasets.RootflowDatasetView(self, indices[n_test:], sorted=False),
-            rootflow_datasets.RootflowDatasetView(self, indices[:n_test], sorted=False),
+            rootflow_datasets.RootflowDatasetView(
+                self, indices[n_test:], sorted=False, unique=True
+            ),
+            rootflow_datasets.RootflowDatasetView(
+                self, indices[:n_test], sorted=False, unique=True
+            ),
         )
 
     def map(
@@ -125,32 +345,82 @@ class FunctionalDataset(Dataset):
         self,
         filter_function: Callable,
         targets: bool = False,
+        batch_size: int = None,
+        num_workers: int = 0,
     ) -> "rootflow_datasets.RootflowDatasetView":
         """Selects a dataset from a conditional function
 
         Creates a new view from the dataset of every item for which the conditional
         statement is `True`. Does not modify the original dataset.
 
+        If a batch size is given, the filter_function is instead called on batches of
+        data (or targets), as returned by :meth:`index_batch`, and should return a
+        boolean mask for the batch. For numeric columns of datasets with columnar
+        storage the batch is a numpy array, so vectorized conditions may be used.
+
+        If num_workers is given, the filter_function is run over contiguous chunks of
+        the dataset in a pool of worker processes.
+
+        The view stores the items kept as a compressed bitmap, see
+        :class:`IndexBitmap`, so even a filter which keeps most of a large dataset
+        takes little memory.
+
         Args:
             filter_function (Callable): A conditional function which returns `True`
                 for items you would like to have in the resulting, filtered, set.
             targets (:obj:`bool`, optional): A flag indicating whether the
                 filter_function is applied to the dataset targets instead of the data
+            batch_size (:obj:`int`, optional): A batch size, if the filter_function
+                supports batches of inputs.
+            num_workers (:obj:`int`, optional): The number of worker processes to
+                filter with. If 0, the filter is run in the calling process.
 
         Returns:
             RootflowDatasetView: A view of the dataset which contains only dataset
                 items for which the filter_function was `True`
+
+        Raises:
+            AssertionError: If a batched filter_function does not return a mask of the
+                same length as its inputs.
+            RuntimeError: If the filter_function fails in a worker process.
         """
-        if targets:
-            conditional_attr = "target"
-        else:
-            conditional_attr = "data"
+        attribute_index = 2 if targets else 1
+
+        if num_workers > 0:
+            masks = run_chunks(
+                partial(filter_values, filter_function, batch_size=batch_size),
+                chunk_slices(len(self), num_workers, multiple_of=batch_size),
+                lambda chunk: self.index_batch(range(chunk.start, chunk.stop))[
+                    attribute_index
+                ],
+                num_workers,
+                description=f"Filtering {type(self).__name__}",
+            )
+            mask = np.concatenate(masks) if masks else np.empty(0, dtype=bool)
+            return rootflow_datasets.RootflowDatasetView(
+                self, IndexBitmap.from_mask(mask)
+            )
 
-        filtered_indices = []
-        for index, item in enumerate(self):
-            if filter_function(item[conditional_attr]):
-                filtered_indices.append(index)
-        return rootflow_datasets.RootflowDatasetView(self, filtered_indices)
+        length = len(self)
+        if batch_size is None:
+            mask = np.fromiter(
+                (
+                    bool(filter_function(self.index(index)[attribute_index]))
+                    for index in range(length)
+                ),
+                dtype=bool,
+                count=length,
+            )
+            return rootflow_datasets.RootflowDatasetView(
+                self, IndexBitmap.from_mask(mask)
+            )
+
+        mask = np.empty(length, dtype=bool)
+        for start in range(0, length, batch_size):
+            stop = min(start + batch_size, length)
+            batch = self.index_batch(range(start, stop))[attribute_index]
+            mask[start:stop] = filter_values(filter_function, batch, batch_size)
+        return rootflow_datasets.RootflowDatasetView(self, IndexBitmap.from_mask(mask))
 
     # TODO if we wanted transform to be truly functional, we could just return
     # a new view, but that may be a costly abstraction
@@ -186,8 +456,149 @@ class FunctionalDataset(Dataset):
         else:
             self.data_transforms += function
             self.has_data_transforms = True
+        self._lineage.advance()
         return self
 
+    def cache_transforms(self, enabled: bool = True) -> "FunctionalDataset":
+        """Caches the results of the dataset's transforms.
+
+        Once enabled, the transformed data and targets of each item are kept in the
+        process wide transform cache, so that expensive deterministic transforms are
+        only run once for each item. The cache evicts the least recently used results
+        to stay within a single memory limit shared by every dataset, see
+        :mod:`setkit.datasets.base.transform_cache`. Transforms marked with
+        :func:`nondeterministic`, and any after them, are run on every access.
+
+        Args:
+            enabled (:obj:`bool`, optional): Whether to cache the transform results.
+
+        Returns:
+            FunctionalDataset: Returns `self`.
+        """
+        self._cache_owner = new_cache_owner() if enabled else None
+        self._lineage.advance()
+        return self
+
+    def share_memory(self) -> "FunctionalDataset":
+        """Moves the data of the dataset to storage which is pickled as a handle.
+
+        Datasets are pickled into every data loader worker which is not forked, (see
+        :class:`RootflowDataLoader`) along with all of their data, unless the data is
+        held in storage which is pickled as just its location, such as a
+        :class:`SharedStorage`. Views and concatenations share the memory of the
+        datasets they were created from.
+
+        Returns:
+            FunctionalDataset: Returns `self`.
+        """
+        return self
+
+    def __getstate__(self) -> dict:
+        """Returns the state to pickle, without any state which is rebuilt on demand.
+
+        Compiled pipelines, statistics and sketches are only valid within the
+        current epoch of the dataset's lineage, so are rebuilt after unpickling.
+        """
+        state = self.__dict__.copy()
+        for name in self._derived_state:
+            state.pop(name, None)
+        for name in self._epoch_state:
+            state[name] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Restores the pickled state"""
+        self.__dict__.update(state)
+        # Cache owners are only unique within a process
+        if self._cache_owner is not None:
+            self._cache_owner = new_cache_owner()
+
+    def _index_raw(self, index: int) -> tuple:
+        """Gets a data example, before the transforms in :meth:`_transform_path`.
+
+        Together with :meth:`_transform_path`, lets views and concatenations compile
+        the transforms of this dataset into their own pipelines. By default the
+        example is fully transformed, and the path is empty.
+        """
+        return self.index(index)
+
+    def _index_batch_raw(self, indices: Sequence[int]) -> tuple:
+        """Gets a batch of data examples, see :meth:`_index_raw`"""
+        return self.index_batch(indices)
+
+    def _transform_path(self) -> Tuple[List[Callable], List[Callable]]:
+        """Returns the data and target transforms not applied by :meth:`_index_raw`"""
+        return ([], [])
+
+    def _id_positions(self, ids: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        """Finds the positions of ids in the dataset by their hashes.
+
+        Together with :meth:`_position_hashes` and :meth:`_position_ids`, lets views
+        and concatenations find items by id with the index of the dataset they were
+        created from.
+
+        Args:
+            ids (np.ndarray): The ids, see :func:`id_array`, which are compared with
+                the ids of the items whose hashes match.
+            hashes (np.ndarray): The hashes of the ids, see :func:`hash_values`.
+
+        Returns:
+            np.ndarray: The position of each id, or -1 where no item has the id.
+        """
+        raise NotImplementedError
+
+    def _position_hashes(self) -> np.ndarray:
+        """Returns the hash of the id of each item of the dataset, in order"""
+        raise NotImplementedError
+
+    def _position_ids(self, positions: np.ndarray) -> Union[np.ndarray, list]:
+        """Returns the ids of the items at some positions of the dataset"""
+        raise NotImplementedError
+
+    def _transform_epoch(self) -> int:
+        """Returns the epoch of the dataset's lineage, see :class:`TransformLineage`"""
+        lineage = self._lineage
+        if lineage.merged_into is not None:
+            lineage = self._lineage = lineage.find()
+        return lineage.epoch
+
+    def _pipeline_functions(self) -> Tuple[List[Callable], List[Callable]]:
+        """Returns the data and target transforms applied when indexing the dataset"""
+        return (self.data_transforms, self.target_transforms)
+
+    def _pipelines(self) -> Tuple[TransformPipeline, TransformPipeline]:
+        """Returns the compiled data and target pipelines, compiling them if stale"""
+        if self._compiled_epoch != self._transform_epoch():
+            data_functions, target_functions = self._pipeline_functions()
+            self._compiled_pipelines = (
+                TransformPipeline(data_functions),
+                TransformPipeline(target_functions),
+            )
+            self._compiled_epoch = self._transform_epoch()
+        return self._compiled_pipelines
+
+    def _apply_transforms(
+        self, index: int, value: Any, pipeline: TransformPipeline, stage: str
+    ) -> Any:
+        """Applies transforms to the value of an item, using the cache if enabled"""
+        if self._cache_owner is None:
+            return pipeline(value)
+        key = (self._cache_owner, self._transform_epoch(), stage)
+        return cached_transform(key, index, value, pipeline, len(self))
+
+    def _apply_transforms_batch(
+        self,
+        indices: Sequence[int],
+        values: Any,
+        pipeline: TransformPipeline,
+        stage: str,
+    ) -> Union[list, np.ndarray]:
+        """Applies transforms to the values of a batch, using the cache if enabled"""
+        if self._cache_owner is None:
+            return pipeline.batch(values)
+        key = (self._cache_owner, self._transform_epoch(), stage)
+        return cached_transform_batch(key, indices, values, pipeline, len(self))
+
     def __add__(
         self, dataset: "FunctionalDataset"
     ) -> "rootflow_datasets.ConcatRootflowDatasetView":
@@ -210,31 +621,190 @@ class FunctionalDataset(Dataset):
 
         return rootflow_datasets.ConcatRootflowDatasetView(self, dataset)
 
+    def __radd__(self, dataset: Union["FunctionalDataset", int]) -> "FunctionalDataset":
+        """Adds two datasets together, with support for `sum`
+
+        Since `sum` begins with the integer `0`, adding a dataset to `0` returns the
+        dataset itself. Any other :class:`FunctionalDataset` is concatenated.
+
+        Args:
+            dataset (Union[FunctionalDataset, int]): The dataset to add `self` to.
+
+        Returns:
+            FunctionalDataset: Either `self` or a new, concatenated dataset.
+
+        Raises:
+            AttributeError: If `dataset` is not a :class:`FunctionalDataset` or `0`.
+        """
+        if isinstance(dataset, int) and dataset == 0:
+            return self
+        if not isinstance(dataset, FunctionalDataset):
+            raise AttributeError(f"Cannot add a dataset to a {type(dataset)}")
+        return rootflow_datasets.ConcatRootflowDatasetView(dataset, self)
+
     def tasks(self):
         """Returns dataset target tasks"""
         raise NotImplementedError
 
-    def stats(self):
+    def stats(self, num_workers: int = 0, approximate: bool = False) -> dict:
         """Gets common statistics for dataset.
 
-        Calculates a set of common and useful statistics for the dataset. May attempt
-        to decide dynamically which statistics to include, depending on the data and
-        target types.
+        Calculates a set of common and useful statistics for the dataset, in a single
+        chunked pass. Each data column (or each key, for dictionary data) and each
+        target task is summarized with its count and missing value rate, the mean,
+        standard deviation, minimum and maximum of numeric values, and counts of
+        class labels and other categorical values. See
+        :mod:`setkit.datasets.base.statistics`.
+
+        Approximate statistics replace the exact value counts with mergeable sketches,
+        which use a fixed amount of memory however large the dataset is. Each column
+        instead reports its estimated number of distinct values, quantiles of numeric
+        values and the most frequent categorical values, and the number of distinct
+        ids is estimated. See :meth:`sketches`.
+
+        The statistics are cached on the dataset, until the dataset is mapped or a
+        transform is added.
+
+        Args:
+            num_workers (:obj:`int`, optional): The number of worker processes used to
+                accumulate the statistics of each chunk.
+            approximate (:obj:`bool`, optional): Whether to calculate approximate
+                statistics from sketches.
 
         Returns:
             dict: A dictionary of the collected statistics.
         """
+        if self._statistics_epoch != self._transform_epoch():
+            self._statistics = {}
+            self._statistics_epoch = self._transform_epoch()
+        if approximate in self._statistics:
+            return self._statistics[approximate]
         data_example = self[0]["data"]
         target_example = self[0]["target"]
         tasks = self.tasks()
         if tasks is not None and len(tasks) == 1:
             tasks = tasks[0]
-        return {
+        statistics = {
             "length": len(self),
             "data_types": get_nested_data_types(data_example),
             "target_types": get_nested_data_types(target_example),
             "tasks": tasks,
         }
+        if approximate:
+            column_statistics = {
+                name: sketch.result()
+                for name, sketch in self.sketches(num_workers).items()
+            }
+            statistics["distinct_ids"] = column_statistics.pop("id")["distinct"]
+            statistics["data_statistics"] = {
+                name: result
+                for name, result in column_statistics.items()
+                if not name.startswith("target")
+            }
+            statistics["target_statistics"] = {
+                name: result
+                for name, result in column_statistics.items()
+                if name.startswith("target")
+            }
+        else:
+            chunk_statistics = self._run_statistics_chunks(
+                accumulate_statistics,
+                lambda chunk: self.index_batch(range(chunk.start, chunk.stop))[1:],
+                num_workers,
+            )
+            statistics["data_statistics"] = merge_statistics(
+                [data_statistics for data_statistics, _ in chunk_statistics]
+            )
+            statistics["target_statistics"] = merge_statistics(
+                [target_statistics for _, target_statistics in chunk_statistics]
+            )
+        self._statistics[approximate] = statistics
+        return statistics
+
+    def sketches(self, num_workers: int = 0) -> Dict[str, ColumnSketch]:
+        """Gets mergeable sketches of each column of the dataset.
+
+        Sketches the ids (as the column `"id"`), each data column (`"data"`, or
+        `"data.<key>"` for dictionary data) and each target task (`"target"`, or
+        `"target.<key>"`) in a single chunked pass. Sketches of separate datasets can
+        be combined with :func:`setkit.datasets.base.statistics.merge_sketches`,
+        which is how concatenations sketch their datasets without reading them again.
+
+        The sketches are cached on the dataset, until the dataset is mapped or a
+        transform is added, and should not be modified.
+
+        Args:
+            num_workers (:obj:`int`, optional): The number of worker processes used to
+                sketch each chunk.
+
+        Returns:
+            Dict[str, ColumnSketch]: The sketch of each column.
+        """
+        if self._sketches_epoch != self._transform_epoch():
+            self._sketches = merge_sketches(
+                self._run_statistics_chunks(
+                    accumulate_sketches,
+                    lambda chunk: self.index_batch(range(chunk.start, chunk.stop)),
+                    num_workers,
+                )
+            )
+            self._sketches_epoch = self._transform_epoch()
+        return self._sketches
+
+    def _run_statistics_chunks(
+        self, chunk_function: Callable, load_chunk: Callable, num_workers: int
+    ) -> list:
+        """Runs a statistics function over chunks of the dataset, see run_chunks"""
+        return run_chunks(
+            chunk_function,
+            chunk_slices(
+                len(self),
+                num_workers,
+                chunk_size=STATISTICS_CHUNK_SIZE if num_workers <= 0 else None,
+            ),
+            load_chunk,
+            num_workers,
+            description=f"Calculating {type(self).__name__} statistics",
+        )
+
+    def save(
+        self, path: str, shard_size: int = DEFAULT_SHARD_SIZE, num_workers: int = 0
+    ) -> None:
+        """Saves the dataset to disk, split into fixed size shards.
+
+        Writes the ids, data and targets of every example, with all transforms
+        applied, into memory mapped shards of `shard_size` rows, along with a
+        manifest holding the dataset's tasks. Values which cannot be memory mapped
+        (such as dictionaries) are pickled. Since only the values are saved, datasets
+        may be saved after any maps, filters and transforms, including those using
+        lambdas. The saved dataset is opened with :class:`ShardedRootflowDataset`,
+        which only reads the shards which are accessed. See
+        :class:`setkit.datasets.base.storage.ShardedStorage`.
+
+        Args:
+            path (str): The directory to save the dataset in, created if it does not
+                exist.
+            shard_size (:obj:`int`, optional): The number of rows in each shard.
+            num_workers (:obj:`int`, optional): The number of worker processes used to
+                write the shards.
+        """
+        os.makedirs(path, exist_ok=True)
+        shard_results = run_chunks(
+            write_shard,
+            chunk_slices(len(self), 0, chunk_size=shard_size),
+            lambda chunk: (
+                os.path.join(path, shard_directory_name(chunk.start // shard_size)),
+                *self.index_batch(range(chunk.start, chunk.stop)),
+            ),
+            num_workers,
+            description=f"Saving {type(self).__name__}",
+        )
+        ShardedStorage.write_manifest(
+            path,
+            shard_size,
+            shard_results,
+            metadata={"dataset": type(self).__name__, "tasks": self.tasks()},
+        )
 
     def examples(self, num_examples: int = 5) -> List[dict]:
         """Returns multiple examples from the dataset
@@ -251,7 +821,7 @@ class FunctionalDataset(Dataset):
         num_examples = min(len(self), num_examples)
         return [self[i] for i in range(num_examples)]
 
-    def summary(self, output_width: int = None):
+    def summary(self, output_width: int = None, approximate: bool = False):
         """Print a formatted summary of the dataset
 
         Collects the dataset docstring, statistics and some examples, then prints them
@@ -261,6 +831,8 @@ class FunctionalDataset(Dataset):
             output_width (:obj:`int`, optional): Optional control for the width of the
                 formatted output. Defaults to 150 or the console width, whichever is
                 smaller.
+            approximate (:obj:`bool`, optional): Whether to summarize the dataset with
+                approximate statistics, see :meth:`stats`.
         """
         terminal_size = os.get_terminal_size()
         if output_width is None:
@@ -272,7 +844,48 @@ class FunctionalDataset(Dataset):
         print(format_docstring(type(self).__doc__, description_width, indent=True))
 
         print("\nStats:")
-        print(format_statistics(self.stats(), description_width, indent=True))
+        print(
+            format_statistics(
+                self.stats(approximate=approximate), description_width, indent=True
+            )
+        )
 
         print("\nExamples:")
         print(format_examples_tabular(self.examples(), description_width, indent=True))
+
+
+def filter_values(
+    filter_function: Callable, values: Union[list, np.ndarray], batch_size: int = None
+) -> np.ndarray:
+    """Evaluates a conditional function over values, returning a boolean mask.
+
+    Args:
+        filter_function (Callable): A conditional function, called on each value or,
+            if a batch size is given, on batches of values.
+        values (Union[list, np.ndarray]): The values to evaluate.
+        batch_size (:obj:`int`, optional): A batch size, if the filter_function
+            supports batches of inputs.
+
+    Returns:
+        np.ndarray: A boolean mask with one element for each value.
+
+    Raises:
+        AssertionError: If a batched filter_function does not return a mask of the
+            same length as its inputs.
+    """
+    length = len(values)
+    if batch_size is None:
+        if isinstance(values, np.ndarray) and values.ndim == 1:
+            values = values.tolist()
+        return np.fromiter(
+            (bool(filter_function(value)) for value in values), dtype=bool, count=length
+        )
+    mask = np.empty(length, dtype=bool)
+    for start in range(0, length, batch_size):
+        stop = min(start + batch_size, length)
+        batch_mask = filter_function(values[start:stop])
+        assert (
+            len(batch_mask) == stop - start
+        ), f"Filter function {filter_function.__name__} does not return a mask of same length as input"
+        mask[start:stop] = batch_mask
+    return mask
@@ -0,0 +1,179 @@
+"""Hash index from the ids of dataset items to their positions.
+
+Houses :class:`IdIndex`, which :meth:`FunctionalDataset.by_id`,
+:meth:`FunctionalDataset.ids_to_view` and :meth:`FunctionalDataset.join` use to find
+items by their id without scanning the dataset. The index is built the first time it
+is needed, from the ids of the underlying :class:`RootflowDataset`, and views and
+concatenations map positions in it onto their own positions, so a dataset's ids are
+only indexed once however many views are taken of it.
+
+Rather than a dictionary of every id, which holds a python object per item, the
+index holds a 64 bit hash of the id of each item (see :func:`hash_values`) and an
+open addressing table of positions, with linear probing, at most half full. The
+table is built, and searched, for every id of a batch at once, one probe at a time.
+Where the hash of a position matches, its id is read back and compared with the id
+looked up, and probing continues if they differ, so ids which only share a hash are
+told apart. Equal ids (such as `1` and `1.0`) are the same id, and when ids repeat,
+the first item with the id is found.
+
+Attributes:
+    ID_INDEX_CHUNK_SIZE: The number of ids read and hashed at a time when building
+        the index of a dataset.
+"""
+
+from typing import Callable, Hashable, Optional, Sequence, Union
+import numpy as np
+
+from setkit.datasets.base.sketches import hash_values
+
+ID_INDEX_CHUNK_SIZE = 65536
+
+_EMPTY = -1
+
+
+class IdIndex:
+    """An open addressing hash table from id hashes to positions.
+
+    Example:
+        >>> index = IdIndex.from_ids(["a", "b", "c"])
+        >>> index.lookup(hash_values(["c", "z"]), ["c", "z"])
+        array([ 2, -1])
+
+    Attributes:
+        hashes (np.ndarray): The hash of the id at each position, as unsigned 64 bit
+            integers.
+        table (np.ndarray): The position stored in each slot of the table, or -1 for
+            empty slots.
+        read_ids (Callable[[np.ndarray], Sequence[Hashable]]): Reads the ids at some
+            positions, to compare with the ids looked up.
+    """
+
+    def __init__(
+        self,
+        hashes: np.ndarray,
+        read_ids: Callable[[np.ndarray], Sequence[Hashable]],
+    ) -> None:
+        """Builds the index of the hashes of the ids at each position.
+
+        Args:
+            hashes (np.ndarray): The hash of each id, in order of position.
+            read_ids (Callable[[np.ndarray], Sequence[Hashable]]): Reads the ids at
+                an array of positions.
+        """
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self.read_ids = read_ids
+        capacity = 1 << max(3, int(2 * len(self.hashes)).bit_length())
+        dtype = np.int32 if len(self.hashes) < np.iinfo(np.int32).max else np.int64
+        self.table = np.full(capacity, _EMPTY, dtype=dtype)
+        slots = self._slots(self.hashes)
+        pending = np.arange(len(self.hashes), dtype=np.int64)
+        while len(pending) > 0:
+            pending_slots = slots[pending]
+            free = self.table[pending_slots] == _EMPTY
+            # Of the positions probing the same free slot, the first takes it
+            claimed_slots, first = np.unique(pending_slots[free], return_index=True)
+            claimed = np.flatnonzero(free)[first]
+            self.table[claimed_slots] = pending[claimed]
+            unplaced = np.ones(len(pending), dtype=bool)
+            unplaced[claimed] = False
+            pending = pending[unplaced]
+            slots[pending] = (slots[pending] + 1) & (capacity - 1)
+
+    @classmethod
+    def from_ids(cls, ids: Sequence[Hashable]) -> "IdIndex":
+        """Builds the index of a sequence of ids"""
+        ids = id_array(ids)
+        return cls(hash_values(ids), ids.__getitem__)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def lookup(self, hashes: np.ndarray, ids: Sequence[Hashable]) -> np.ndarray:
+        """Finds the positions of ids by their hashes.
+
+        Args:
+            hashes (np.ndarray): The hashes of the ids to find, see
+                :func:`hash_values`.
+            ids (Sequence[Hashable]): The ids to find, compared with the id at each
+                position whose hash matches.
+
+        Returns:
+            np.ndarray: The position of each id, or -1 where the id is not indexed.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        ids = id_array(ids)
+        if len(hashes) == 1:
+            return np.array([self._find(int(hashes[0]), ids[0])], dtype=np.int64)
+        positions = np.full(len(hashes), _EMPTY, dtype=np.int64)
+        slots = self._slots(hashes)
+        pending = np.arange(len(hashes), dtype=np.int64)
+        while len(pending) > 0:
+            candidates = self.table[slots[pending]].astype(np.int64)
+            occupied = candidates != _EMPTY
+            found = occupied.copy()
+            found[found] = self.hashes[candidates[found]] == hashes[pending[found]]
+            matched = np.flatnonzero(found)
+            if len(matched) > 0:
+                found[matched] = equal_ids(
+                    self.read_ids(candidates[matched]), ids[pending[matched]]
+                )
+            positions[pending[found]] = candidates[found]
+            # Probing stops at the id, or at an empty slot
+            pending = pending[~found & occupied]
+            slots[pending] = (slots[pending] + 1) & (len(self.table) - 1)
+        return positions
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes of the arrays of the index"""
+        return self.hashes.nbytes + self.table.nbytes
+
+    def _find(self, hash: int, id: Hashable) -> int:
+        """Finds the position of a single id by its hash, probing in python"""
+        mask = len(self.table) - 1
+        slot = hash & mask
+        while True:
+            candidate = int(self.table[slot])
+            if candidate == _EMPTY:
+                return candidate
+            if int(self.hashes[candidate]) == hash:
+                (stored_id,) = self.read_ids(np.array([candidate], dtype=np.int64))
+                if stored_id == id:
+                    return candidate
+            slot = (slot + 1) & mask
+
+    def _slots(self, hashes: np.ndarray) -> np.ndarray:
+        """Returns the first slot each hash probes"""
+        return (hashes & np.uint64(len(self.table) - 1)).astype(np.int64)
+
+
+def id_array(ids: Union[Sequence[Hashable], np.ndarray]) -> np.ndarray:
+    """Packs ids into an array, which can be indexed by an array of positions.
+
+    Numeric arrays are returned as they are, and anything else is packed into an
+    array of objects one id at a time, so that ids such as tuples stay whole.
+    """
+    if isinstance(ids, np.ndarray):
+        return ids.reshape(-1)
+    array = np.empty(len(ids), dtype=object)
+    for position, id in enumerate(ids):
+        array[position] = id
+    return array
+
+
+def equal_ids(
+    ids: Union[Sequence[Hashable], np.ndarray], other_ids: Union[Sequence, np.ndarray]
+) -> np.ndarray:
+    """Compares two sequences of ids, id by id"""
+    if (
+        isinstance(ids, np.ndarray)
+        and isinstance(other_ids, np.ndarray)
+        and ids.dtype.kind in "biuf"
+        and other_ids.dtype.kind in "biuf"
+    ):
+        return np.asarray(ids == other_ids, dtype=bool)
+    return np.fromiter(
+        (bool(id == other_id) for id, other_id in zip(ids, other_ids)),
+        dtype=bool,
+        count=len(other_ids),
+    )
@@ -0,0 +1,480 @@
+"""Streaming datasets for rootflow
+
+Houses IterableRootflowDataset, a rootflow dataset whose examples are streamed from
+a generator instead of being loaded into memory, and IterableRootflowDatasetView,
+which applies a functional operation (such as `where`, `take` or `shuffle`) to a
+stream. Each operation processes one example (or one bounded buffer of examples) at
+a time, so memory use does not depend on the size of the source.
+
+Attributes:
+    TASK_INFERENCE_SAMPLE_SIZE: The number of examples read from the start of a
+        stream to infer its tasks.
+"""
+
+from functools import partial
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
+import logging
+import os
+import random
+from torch.utils.data import IterableDataset, get_worker_info
+
+from setkit import __location__ as ROOTFLOW_LOCATION
+from setkit.datasets.base.download import DownloadLock
+from setkit.datasets.base.pipeline import TransformPipeline
+from setkit.datasets.base.utils import infer_task_from_targets
+import setkit.datasets.base.dataset as rootflow_datasets
+
+TASK_INFERENCE_SAMPLE_SIZE = 1000
+
+
+class IterableFunctionalDataset(IterableDataset):
+    """Abstract class for rootflow's functional API over streams.
+
+    Implements the shared behavior of IterableRootflowDataset and
+    IterableRootflowDatasetView. Operations which need random access, such as
+    slicing, splitting and concatenation, are not supported. Instead the stream may be
+    transformed, filtered, mapped, batched, truncated and shuffled with a buffer.
+
+    Every operation except :meth:`transform` returns a new stream, and leaves this
+    stream unchanged. After :meth:`batch`, the operations of the new stream apply to
+    whole batches, with each batch given as columns of ids, data and targets. The
+    transforms of a batched stream are still applied to each example, (or once to
+    the batch, for transforms marked with :func:`batched`) as in
+    :meth:`FunctionalDataset.index_batch`.
+    """
+
+    def __init__(self) -> None:
+        self.data_transforms = []
+        self.target_transforms = []
+        self.batched = False
+
+    def __iter__(self) -> Iterator[dict]:
+        """Iterates over the stream
+
+        Yields:
+            dict: A dictionary containing an `"id"`, `"data"` and a `"target"`, which
+                are columns if the stream has been batched.
+        """
+        for id, data, target in self.iterate():
+            yield {"id": id, "data": data, "target": target}
+
+    def iterate(self) -> Iterator[tuple]:
+        """Iterates over the stream's examples as tuples, with transforms applied.
+
+        Yields:
+            tuple: A tuple of three items, respectively, the id of the data item, the
+                data content of the item, and the target of the data item.
+        """
+        data_pipeline = TransformPipeline(self.data_transforms)
+        target_pipeline = TransformPipeline(self.target_transforms)
+        if not (data_pipeline or target_pipeline):
+            yield from self._iterate_untransformed()
+            return
+        if self.batched:
+            data_pipeline, target_pipeline = data_pipeline.batch, target_pipeline.batch
+        for id, data, target in self._iterate_untransformed():
+            yield (id, data_pipeline(data), target_pipeline(target))
+
+    def _iterate_untransformed(self) -> Iterator[tuple]:
+        """Iterates over the stream's examples, before its own transforms"""
+        raise NotImplementedError
+
+    def tasks(self) -> List[dict]:
+        """Returns a list of dataset tasks"""
+        raise NotImplementedError
+
+    def transform(
+        self, function: Union[Callable, List[Callable]], targets: bool = False
+    ) -> "IterableFunctionalDataset":
+        """Adds a transform to the stream.
+
+        Like :meth:`FunctionalDataset.transform`, modifies the stream in place and
+        returns `self`. Transforms are applied to each example as it is streamed.
+
+        Args:
+            function (Union[Callable, List[Callable]]): The transform function or
+                list of functions you would like to add.
+            targets (:obj:`bool`, optional): Wether this transform should apply
+                to the dataset targets.
+
+        Returns:
+            IterableFunctionalDataset: Returns `self`.
+        """
+        if not isinstance(function, (tuple, list)):
+            function = [function]
+        if targets:
+            self.target_transforms += function
+        else:
+            self.data_transforms += function
+        return self
+
+    def map(
+        self,
+        function: Callable,
+        targets: bool = False,
+        batch_size: int = None,
+    ) -> "IterableRootflowDatasetView":
+        """Maps a function over the stream.
+
+        Unlike :meth:`RootflowDataset.map`, which modifies the stored data, the
+        function is applied lazily to each example as it is streamed.
+
+        Args:
+            function (Callable): The function to map.
+            targets (:obj:`bool`, optional): Whether the function should be mapped over
+                the targets, instead of the data.
+            batch_size (:obj:`int`, optional): A batch size, if the function supports
+                or requires batches of inputs. The stream is still yielded one example
+                at a time.
+
+        Returns:
+            IterableRootflowDatasetView: The mapped stream.
+        """
+        return IterableRootflowDatasetView(
+            self, partial(_map_items, function, 2 if targets else 1, batch_size)
+        )
+
+    def where(
+        self, filter_function: Callable, targets: bool = False
+    ) -> "IterableRootflowDatasetView":
+        """Filters the stream with a conditional function
+
+        Args:
+            filter_function (Callable): A conditional function which returns `True`
+                for items you would like to keep.
+            targets (:obj:`bool`, optional): A flag indicating whether the
+                filter_function is applied to the targets instead of the data.
+
+        Returns:
+            IterableRootflowDatasetView: The filtered stream.
+        """
+        return IterableRootflowDatasetView(
+            self, partial(_filter_items, filter_function, 2 if targets else 1)
+        )
+
+    def take(self, num_examples: int) -> "IterableRootflowDatasetView":
+        """Truncates the stream.
+
+        When loading with multiple workers, each worker takes up to `num_examples`
+        from its own shard of the stream.
+
+        Args:
+            num_examples (int): The number of examples to keep.
+
+        Returns:
+            IterableRootflowDatasetView: The truncated stream.
+        """
+        return IterableRootflowDatasetView(self, partial(_take_items, num_examples))
+
+    def shuffle(
+        self, buffer_size: int, seed: int = None
+    ) -> "IterableRootflowDatasetView":
+        """Shuffles the stream with a fixed size buffer.
+
+        The buffer is filled with the first `buffer_size` examples. Each following
+        example replaces a random example of the buffer, which is yielded. Larger
+        buffers give a more thorough shuffle, at the cost of memory.
+
+        Args:
+            buffer_size (int): The number of examples to hold in the buffer.
+            seed (:obj:`int`, optional): A seed for the shuffle. If given, each worker
+                offsets it by its worker id. If not, each iteration is shuffled
+                differently.
+
+        Returns:
+            IterableRootflowDatasetView: The shuffled stream.
+
+        Raises:
+            ValueError: If the buffer size is not positive.
+        """
+        if buffer_size < 1:
+            raise ValueError(f"Shuffle buffer size must be positive, not {buffer_size}")
+        return IterableRootflowDatasetView(
+            self, partial(_shuffle_items, buffer_size, seed)
+        )
+
+    def batch(
+        self, batch_size: int, drop_last: bool = False
+    ) -> "IterableRootflowDatasetView":
+        """Groups the stream into batches.
+
+        Each batch is yielded as columns of ids, data and targets, like
+        :meth:`FunctionalDataset.index_batch`, and may be loaded directly with
+        :class:`RootflowDataLoader`.
+
+        Args:
+            batch_size (int): The number of examples in each batch.
+            drop_last (:obj:`bool`, optional): Whether to drop the last batch if it
+                is smaller than `batch_size`.
+
+        Returns:
+            IterableRootflowDatasetView: The batched stream.
+        """
+        return IterableRootflowDatasetView(
+            self, partial(_batch_items, batch_size, drop_last), batched=True
+        )
+
+    def examples(self, num_examples: int = 5) -> List[dict]:
+        """Returns the first examples of the stream"""
+        return list(islice(iter(self), num_examples))
+
+
+class IterableRootflowDataset(IterableFunctionalDataset):
+    """Abstract class for a streaming rootflow dataset.
+
+    Like :class:`RootflowDataset`, but :meth:`prepare_data` returns an iterable (such
+    as a generator) of :class:`RootflowDataItem`, which is read again each time the
+    dataset is iterated over. Only :meth:`prepare_data` needs to be implemented, along
+    with :meth:`download` to download the dataset dynamically.
+
+    When loaded with multiple :class:`RootflowDataLoader` workers, the stream is
+    sharded automatically, see :meth:`iterate_shard`.
+    """
+
+    def __init__(
+        self,
+        root: str = None,
+        download: bool = None,
+        tasks: List[dict] = [],
+    ) -> None:
+        """Creates an instance of a streaming rootflow dataset.
+
+        Nothing is read from the source until the dataset is iterated over, except
+        when the tasks are inferred, which reads the first examples of the stream.
+
+        Args:
+            root (:obj:`str`, optional): The path to the dataset root.
+            download (:obj:`bool`, optional): Whether to download the dataset. If
+                `None`, the dataset is downloaded when the root does not exist.
+            tasks (:obj:`List[dict]`, optional): Dataset task names, types and shapes.
+                If empty, they are inferred from the start of the stream when first
+                requested.
+        """
+        super().__init__()
+        if root is None:
+            root = os.path.join(
+                ROOTFLOW_LOCATION, "datasets/data", type(self).__name__, "data"
+            )
+            logging.info(
+                f"{type(self).__name__} root is not set, using the default data root of {root}"
+            )
+        self.root = root
+        if download is None:
+            # Waits for any download in progress, so a partial download is not read
+            with DownloadLock(root, shared=True):
+                download = not os.path.exists(root)
+        if download is True:
+            # Only one process downloads, any others wait for it to finish
+            with DownloadLock(root) as lock:
+                if lock.completed_by_other():
+                    logging.info(
+                        f"{type(self).__name__} data was downloaded to '{root}' by another process."
+                    )
+                else:
+                    logging.info(
+                        f"Downloading {type(self).__name__} data to location '{root}'."
+                    )
+                    os.makedirs(root, exist_ok=True)
+                    self.download(root)
+                    lock.mark_complete()
+        self._tasks = tasks
+
+    def prepare_data(
+        self, directory: str
+    ) -> Iterable["rootflow_datasets.RootflowDataItem"]:
+        """Streams the data for the dataset.
+
+        Args:
+            directory (str): The directory where we should look for our data.
+
+        Returns:
+            Iterable[RootflowDataItem]: The data items, typically from a generator.
+        """
+        raise NotImplementedError
+
+    def download(self, directory: str) -> None:
+        """Downloads the data for the dataset to a specified directory.
+
+        Args:
+            directory (str): Directory to download the data to.
+        """
+        raise NotImplementedError
+
+    def iterate_shard(
+        self, directory: str, shard_index: int, num_shards: int
+    ) -> Iterable["rootflow_datasets.RootflowDataItem"]:
+        """Streams one shard of the data, for one of several loader workers.
+
+        By default every worker reads the whole stream and keeps every
+        `num_shards`-th item. Datasets whose sources are split into files may override
+        this to have each worker read only its own files.
+
+        Args:
+            directory (str): The directory where we should look for our data.
+            shard_index (int): The index of the shard to stream.
+            num_shards (int): The total number of shards.
+
+        Returns:
+            Iterable[RootflowDataItem]: The data items of the shard.
+        """
+        return islice(self.prepare_data(directory), shard_index, None, num_shards)
+
+    def _iterate_untransformed(self) -> Iterator[tuple]:
+        """Streams the examples of this worker's shard"""
+        worker_info = get_worker_info()
+        if worker_info is None or worker_info.num_workers == 1:
+            shard_index, num_shards = 0, 1
+            data_items = self.prepare_data(self.root)
+        else:
+            shard_index, num_shards = worker_info.id, worker_info.num_workers
+            data_items = self.iterate_shard(self.root, shard_index, num_shards)
+        for position, data_item in enumerate(data_items):
+            id = data_item.id
+            if id is None:
+                # Matches the position in the whole stream, with the default sharding
+                id = f"{type(self).__name__}-{position * num_shards + shard_index}"
+            yield (id, data_item.data, data_item.target)
+
+    def tasks(self) -> List[dict]:
+        """Returns a list of dataset tasks
+
+        If no tasks were given, they are inferred from the targets of the first
+        :data:`TASK_INFERENCE_SAMPLE_SIZE` examples of the stream.
+
+        Returns:
+            List[dict]: The list of tasks associated with the dataset.
+        """
+        if self._tasks is not None and len(self._tasks) == 0:
+            self._tasks = self._infer_tasks()
+        return self._tasks
+
+    def _infer_tasks(self) -> Union[List[dict], None]:
+        """Infers the tasks from the start of the stream"""
+        targets = [
+            target
+            for _, _, target in islice(self.iterate(), TASK_INFERENCE_SAMPLE_SIZE)
+        ]
+        if not targets or targets[0] is None:
+            return None
+        if isinstance(targets[0], dict):
+            tasks = []
+            for task_name in targets[0].keys():
+                task_type, task_shape = infer_task_from_targets(
+                    iter([target[task_name] for target in targets])
+                )
+                tasks.append(
+                    {"name": task_name, "type": task_type, "shape": task_shape}
+                )
+            return tasks
+        task_type, task_shape = infer_task_from_targets(iter(targets))
+        return [{"name": "task", "type": task_type, "shape": task_shape}]
+
+
+class IterableRootflowDatasetView(IterableFunctionalDataset):
+    """A functional operation applied to a stream.
+
+    Attributes:
+        dataset (IterableFunctionalDataset): The stream the operation is applied to.
+        operation (Callable[[Iterator[tuple]], Iterator[tuple]]): A generator function
+            which is given the examples of `dataset` and yields the examples of the
+            view.
+    """
+
+    def __init__(
+        self,
+        dataset: IterableFunctionalDataset,
+        operation: Callable[[Iterator[tuple]], Iterator[tuple]],
+        batched: bool = False,
+    ) -> None:
+        """Creates a view of a stream.
+
+        Args:
+            dataset (IterableFunctionalDataset): The stream to apply the operation to.
+            operation (Callable[[Iterator[tuple]], Iterator[tuple]]): The operation.
+            batched (:obj:`bool`, optional): Whether the operation groups the examples
+                into batches.
+        """
+        super().__init__()
+        self.dataset = dataset
+        self.operation = operation
+        self.batched = batched or dataset.batched
+
+    def _iterate_untransformed(self) -> Iterator[tuple]:
+        """Applies the operation to the examples of the underlying stream"""
+        return self.operation(self.dataset.iterate())
+
+    def tasks(self) -> List[dict]:
+        """Returns the tasks of the underlying stream"""
+        return self.dataset.tasks()
+
+
+def _map_items(
+    function: Callable, attribute_index: int, batch_size: int, items: Iterator[tuple]
+) -> Iterator[tuple]:
+    """Maps a function over the data or targets of a stream"""
+    if batch_size is None:
+        for item in items:
+            item = list(item)
+            item[attribute_index] = function(item[attribute_index])
+            yield tuple(item)
+        return
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        mapped_values = function([item[attribute_index] for item in batch])
+        assert len(mapped_values) == len(
+            batch
+        ), f"Map function {function.__name__} does not return batch of same length as input"
+        for item, value in zip(batch, mapped_values):
+            item = list(item)
+            item[attribute_index] = value
+            yield tuple(item)
+
+
+def _filter_items(
+    filter_function: Callable, attribute_index: int, items: Iterator[tuple]
+) -> Iterator[tuple]:
+    """Keeps the items of a stream for which a conditional function is `True`"""
+    for item in items:
+        if filter_function(item[attribute_index]):
+            yield item
+
+
+def _take_items(num_examples: int, items: Iterator[tuple]) -> Iterator[tuple]:
+    """Yields the first items of a stream"""
+    return islice(items, num_examples)
+
+
+def _shuffle_items(
+    buffer_size: int, seed: Union[int, None], items: Iterator[tuple]
+) -> Iterator[tuple]:
+    """Shuffles a stream with a fixed size buffer"""
+    if seed is not None:
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            seed += worker_info.id
+    generator = random.Random(seed)
+    buffer = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        position = generator.randrange(buffer_size)
+        yield buffer[position]
+        buffer[position] = item
+    generator.shuffle(buffer)
+    yield from buffer
+
+
+def _batch_items(
+    batch_size: int, drop_last: bool, items: Iterator[tuple]
+) -> Iterator[Tuple[list, list, list]]:
+    """Groups a stream into batches of columns"""
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch or (drop_last and len(batch) < batch_size):
+            return
+        ids, data, targets = zip(*batch)
+        yield (list(ids), list(data), list(targets))
@@ -1,10 +1,46 @@
-from typing import Callable, Optional, Sequence
+from numbers import Integral
+from typing import Any, Callable, Iterator, Mapping, Optional, Sequence, Union
+import multiprocessing
 
-from torch.utils.data import Dataset, DataLoader, Sampler
-from setkit.datasets.base.utils import default_collate_without_key
+from torch.utils.data import (
+    BatchSampler,
+    Dataset,
+    DataLoader,
+    RandomSampler,
+    Sampler,
+    SequentialSampler,
+)
+from setkit.datasets.base.functional import FunctionalDataset
+from setkit.datasets.base.iterable import IterableFunctionalDataset
+from setkit.datasets.base.collate import SchemaCollate
 
 
 class RootflowDataLoader(DataLoader):
+    """A data loader for rootflow datasets.
+
+    Extends :class:`torch.utils.data.DataLoader`. When loading a
+    :class:`FunctionalDataset` without a custom `collate_fn`, whole batches are
+    fetched at once with :meth:`FunctionalDataset.index_batch`, which gathers the ids,
+    data and targets of the batch as columns, instead of indexing and collating each
+    example separately. Batches are collated by a :class:`SchemaCollate`, specialized
+    to the structure of the dataset's examples, which leaves out absent fields (such
+    as the targets of an unlabeled dataset). The dataset of the loader is then an
+    :class:`IndexBatchDataset`, which forwards everything but batch indexing to the
+    original dataset, which is also kept as its `dataset` attribute.
+
+    Worker processes which are not forked (such as with the `"spawn"` start method,
+    the default on macOS and Windows) are sent a pickled copy of the dataset. With
+    `share_memory=True`, the data of the dataset is first moved to shared memory with
+    :meth:`FunctionalDataset.share_memory`, so that each worker is only sent its
+    location, along with the indices of any views. This changes the storage of the
+    dataset itself (columns of python objects are then unpickled on every read), so
+    it is only done when asked for, and only for workers which are not forked.
+
+    Streams (:class:`IterableRootflowDataset`) are sharded across the workers by the
+    stream itself. Streams which have been batched with
+    :meth:`IterableFunctionalDataset.batch` are loaded a batch at a time.
+    """
+
     def __init__(
         self,
         dataset: Dataset,
@@ -21,16 +57,65 @@ class RootflowDataLoader(DataLoader):
         multiprocessing_context=None,
         generator=None,
         *,
-        prefetch_factor: int = 2,
+        prefetch_factor: Optional[int] = None,
         persistent_workers: bool = False,
+        share_memory: bool = False,
     ):
-        # TODO Potentially change this to support ids which are none, and use the tasks
-        # instead of checking for None?
-        if collate_fn is None:
-            if dataset[0]["target"] is None:
-                collate_fn = lambda collate_inputs: default_collate_without_key(
-                    collate_inputs, "target"
+        # Workers which are not forked are sent a pickled copy of the dataset
+        if (
+            share_memory
+            and num_workers > 0
+            and isinstance(dataset, FunctionalDataset)
+            and _start_method(multiprocessing_context) != "fork"
+        ):
+            dataset.share_memory()
+        if collate_fn is None and isinstance(dataset, IterableFunctionalDataset):
+            # Batched streams already yield columns, other streams yield examples
+            # The schema is inferred from the first batch of each worker
+            if dataset.batched:
+                batch_size, drop_last = None, False
+                collate_fn = SchemaCollate()
+            else:
+                collate_fn = SchemaCollate().collate_rows
+        elif (
+            collate_fn is None
+            and isinstance(dataset, FunctionalDataset)
+            and (batch_size is not None or batch_sampler is not None)
+        ):
+            # Torch rejects these arguments together, rather than ignore one of them
+            if batch_sampler is not None and (
+                batch_size != 1 or shuffle or sampler is not None or drop_last
+            ):
+                raise ValueError(
+                    "batch_sampler option is mutually exclusive with batch_size, "
+                    "shuffle, sampler, and drop_last"
                 )
+            if sampler is not None and shuffle:
+                raise ValueError("sampler option is mutually exclusive with shuffle")
+            if batch_sampler is None:
+                if sampler is None:
+                    if shuffle:
+                        sampler = RandomSampler(dataset, generator=generator)
+                    else:
+                        sampler = SequentialSampler(dataset)
+                batch_sampler = BatchSampler(sampler, batch_size, drop_last)
+            # Each index given to the dataset is now a whole batch of indices
+            dataset = IndexBatchDataset(dataset)
+            sampler, batch_sampler = batch_sampler, None
+            batch_size, shuffle, drop_last = None, False, False
+            collate_fn = SchemaCollate(
+                dataset.dataset[0] if len(dataset.dataset) > 0 else None
+            )
+
+        # Other datasets without targets are collated without the target key
+        if collate_fn is None and batch_size is not None:
+            example = dataset[0]
+            if isinstance(example, Mapping) and example.get("target", 0) is None:
+                collate_fn = SchemaCollate(example).collate_rows
+        # Torch only accepts a prefetch factor when loading with worker processes
+        worker_options = {}
+        if num_workers > 0:
+            worker_options["prefetch_factor"] = prefetch_factor or 2
         super().__init__(
             dataset,
             batch_size,
@@ -45,6 +130,64 @@ class RootflowDataLoader(DataLoader):
             worker_init_fn,
             multiprocessing_context,
             generator,
-            prefetch_factor=prefetch_factor,
             persistent_workers=persistent_workers,
+            **worker_options,
         )
+
+
+def _start_method(multiprocessing_context) -> str:
+    """Returns the start method of the workers of a data loader"""
+    if multiprocessing_context is None:
+        # Without allow_none, getting the start method would also fix it globally
+        start_method = multiprocessing.get_start_method(allow_none=True)
+        if start_method is None:
+            # The first of the start methods is the default of the platform
+            start_method = multiprocessing.get_all_start_methods()[0]
+        return start_method
+    if isinstance(multiprocessing_context, str):
+        return multiprocessing_context
+    return multiprocessing_context.get_start_method()
+
+
+class IndexBatchDataset(Dataset):
+    """Adapts a rootflow dataset to be indexed with whole batches.
+
+    Used by :class:`RootflowDataLoader`, which samples batches of indices and passes
+    each batch to this dataset. Indexing with a batch returns it as a dictionary of
+    columns, as given by :meth:`FunctionalDataset.index_batch`. Indexing with a
+    single index, iterating, and any other attribute are forwarded to the wrapped
+    dataset, so that the dataset of a loader can still be used as the original.
+
+    Attributes:
+        dataset (FunctionalDataset): The wrapped dataset.
+    """
+
+    def __init__(self, dataset: FunctionalDataset) -> None:
+        """Wraps a dataset.
+
+        Args:
+            dataset (FunctionalDataset): The dataset to index in batches.
+        """
+        self.dataset = dataset
+
+    def __len__(self) -> int:
+        """Returns the length of the wrapped dataset"""
+        return len(self.dataset)
+
+    def __getitem__(self, indices: Union[int, Sequence[int]]) -> dict:
+        """Gets a batch of examples as a dictionary of columns, or a single example"""
+        if isinstance(indices, Integral):
+            return self.dataset[indices]
+        ids, data, targets = self.dataset.index_batch(indices)
+        return {"id": ids, "data": data, "target": targets}
+
+    def __iter__(self) -> Iterator[dict]:
+        """Iterates over the examples of the wrapped dataset"""
+        return iter(self.dataset)
+
+    def __getattr__(self, name: str) -> Any:
+        """Forwards attributes which are not found to the wrapped dataset"""
+        # The wrapped dataset is not yet set while unpickling
+        if name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
@@ -0,0 +1,141 @@
+"""Parallel execution utilities for rootflow datasets.
+
+Houses a small chunked process pool engine, used to run dataset operations such as
+:meth:`RootflowDataset.map` and :meth:`FunctionalDataset.where` over contiguous
+chunks of a dataset in multiple processes.
+
+Worker processes are forked where the platform supports it, in which case the
+function being run is inherited by the workers and only the chunks themselves are
+pickled. (So lambdas and other unpicklable functions may be used) On platforms
+without fork, the function must be picklable.
+"""
+
+from typing import Any, Callable, Iterable, List, Sequence, Tuple
+import logging
+import multiprocessing
+import traceback
+
+_worker_function = None
+
+
+def chunk_slices(
+    length: int, num_workers: int, chunk_size: int = None, multiple_of: int = None
+) -> List[slice]:
+    """Splits a length into contiguous chunks.
+
+    If no chunk size is given, the length is split into four chunks per worker, so
+    that faster workers may pick up more of the work.
+
+    Args:
+        length (int): The total length to split.
+        num_workers (int): The number of workers which will process the chunks.
+        chunk_size (:obj:`int`, optional): The size of each chunk, except the last.
+        multiple_of (:obj:`int`, optional): Rounds the chunk size up to a multiple of
+            this value, so that chunks contain whole batches.
+
+    Returns:
+        List[slice]: The slice of each chunk, in order.
+    """
+    if chunk_size is None:
+        chunk_size = -(-length // max(1, 4 * num_workers))
+    if multiple_of is not None:
+        chunk_size = -(-chunk_size // multiple_of) * multiple_of
+    chunk_size = max(1, chunk_size)
+    return [
+        slice(start, min(start + chunk_size, length))
+        for start in range(0, length, chunk_size)
+    ]
+
+
+def run_chunks(
+    chunk_function: Callable[[Any], Any],
+    slices: Sequence[slice],
+    load_chunk: Callable[[slice], Any],
+    num_workers: int = 0,
+    description: str = "Processing",
+    progress: Callable[[int, int], None] = None,
+) -> List[Any]:
+    """Runs a function over chunks of a dataset in a process pool.
+
+    Loads the payload of each chunk (such as a slice of a column) in the calling
+    process, calls chunk_function on it in a worker process, and returns the results
+    in the order of the chunks. Completed chunks are logged, and passed to the
+    optional progress callback. If the function fails on any chunk, the remaining
+    work is cancelled and the error is raised along with the rows of the chunk which
+    failed.
+
+    Args:
+        chunk_function (Callable[[Any], Any]): The function to run on each payload.
+        slices (Sequence[slice]): The slice of the dataset each chunk covers, see
+            :func:`chunk_slices`.
+        load_chunk (Callable[[slice], Any]): Loads the payload for a chunk's slice,
+            which is sent to the worker.
+        num_workers (:obj:`int`, optional): The number of worker processes. If 0 the
+            chunks are run in the calling process.
+        description (:obj:`str`, optional): A description of the work, for logging
+            and errors.
+        progress (:obj:`Callable[[int, int], None]`, optional): Called with the
+            number of completed chunks and the total number of chunks, each time a
+            chunk completes.
+
+    Returns:
+        List[Any]: The result for each chunk, in order.
+
+    Raises:
+        RuntimeError: If the function raises an exception for any chunk.
+    """
+    payloads = (load_chunk(chunk_slice) for chunk_slice in slices)
+    num_chunks = len(slices)
+    results = []
+
+    def collect(outcomes: Iterable[Tuple[bool, Any]]) -> None:
+        for chunk_index, (succeeded, result) in enumerate(outcomes):
+            chunk_slice = slices[chunk_index]
+            if not succeeded:
+                raise RuntimeError(
+                    f"{description} failed on chunk {chunk_index} (rows {chunk_slice.start} to {chunk_slice.stop}):\n{result}"
+                )
+            results.append(result)
+            logging.info(
+                f"{description}: completed chunk {chunk_index + 1}/{num_chunks} (rows {chunk_slice.start} to {chunk_slice.stop})"
+            )
+            if progress is not None:
+                progress(chunk_index + 1, num_chunks)
+
+    if num_workers is None or num_workers <= 0:
+        previous_function = _worker_function
+        _initialize_worker(chunk_function)
+        try:
+            collect(_run_chunk(payload) for payload in payloads)
+        finally:
+            _initialize_worker(previous_function)
+        return results
+
+    with _worker_context().Pool(
+        min(num_workers, max(1, num_chunks)),
+        initializer=_initialize_worker,
+        initargs=(chunk_function,),
+    ) as pool:
+        collect(pool.imap(_run_chunk, payloads))
+    return results
+
+
+def _worker_context() -> multiprocessing.context.BaseContext:
+    """Returns the fork context where available, otherwise the default context"""
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def _initialize_worker(chunk_function: Callable[[Any], Any]) -> None:
+    """Sets the function which the worker runs on each chunk"""
+    global _worker_function
+    _worker_function = chunk_function
+
+
+def _run_chunk(payload: Any) -> Tuple[bool, Any]:
+    """Runs the worker function on a chunk, capturing any error as a traceback"""
+    try:
+        return (True, _worker_function(payload))
+    except Exception:
+        return (False, traceback.format_exc())
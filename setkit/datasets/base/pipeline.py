@@ -0,0 +1,178 @@
+"""Compiled transform pipelines for rootflow datasets.
+
+Houses :class:`TransformPipeline`, which compiles the transforms applied along the
+path from an item's storage to the dataset it was indexed from (the dataset's own
+transforms, those of every view above it and those of any concatenations) into a
+single callable for individual items, and a single callable for batches of items.
+Datasets compile their pipelines once, when they are first indexed after a transform
+is added, so that indexing pays for one call rather than a loop over the transforms
+of each layer.
+
+Transforms which operate on whole batches may be marked with :func:`batched`. When
+indexing batches, a batched transform is called once on the whole batch, while runs
+of ordinary transforms are composed and called on each item.
+"""
+
+from itertools import groupby
+from typing import Any, Callable, Sequence, Tuple, Union
+import numpy as np
+
+from setkit.datasets.base.utils import map_functions_over_batch
+
+
+def batched(function: Callable) -> Callable:
+    """Marks a transform as operating on batches of values.
+
+    May be used as a decorator. A batched transform is given a batch of values, as
+    a list or (for numeric columns of columnar datasets) a numpy array, and should
+    return a sequence of the same length. When a single item is indexed it is called
+    on a list containing only that item. Sets the `batched` attribute of the function.
+
+    Args:
+        function (Callable): The transform to mark.
+
+    Returns:
+        Callable: The same transform.
+    """
+    function.batched = True
+    return function
+
+
+def is_batched(function: Callable) -> bool:
+    """Returns whether a transform operates on batches of values"""
+    return getattr(function, "batched", False)
+
+
+def compose(functions: Sequence[Callable]) -> Union[Callable, None]:
+    """Composes a sequence of functions into a single function.
+
+    The composed function applies each function in turn, looping over a tuple of
+    the functions, so that any number of functions may be composed.
+
+    Args:
+        functions (Sequence[Callable]): The functions to compose, in order.
+
+    Returns:
+        Union[Callable, None]: The composed function, or `None` if there are no
+            functions.
+    """
+    if not functions:
+        return None
+    if len(functions) == 1:
+        return functions[0]
+    functions = tuple(functions)
+
+    def composed(value: Any) -> Any:
+        for function in functions:
+            value = function(value)
+        return value
+
+    return composed
+
+
+def _single_item(function: Callable) -> Callable:
+    """Adapts a batched transform to be called on a single value"""
+
+    def apply(value: Any) -> Any:
+        return function([value])[0]
+
+    return apply
+
+
+def _over_batch(function: Callable) -> Callable:
+    """Adapts a transform to be called on each value of a batch"""
+
+    def apply(batch: Union[list, np.ndarray]) -> list:
+        return map_functions_over_batch(batch, [function])
+
+    return apply
+
+
+def _checked_batch(function: Callable) -> Callable:
+    """Adapts a batched transform to check the length of its output"""
+
+    def apply(batch: Union[list, np.ndarray]) -> Union[list, np.ndarray]:
+        transformed_batch = function(batch)
+        assert len(transformed_batch) == len(
+            batch
+        ), f"Transform {getattr(function, '__name__', function)} does not return a batch of same length as input"
+        return transformed_batch
+
+    return apply
+
+
+class TransformPipeline:
+    """A sequence of transforms compiled for items and for batches.
+
+    Attributes:
+        functions (Tuple[Callable]): The transforms, in the order they are applied.
+        apply (Callable[[Any], Any]): Applies every transform to a single value.
+        apply_batch (Callable[[Union[list, np.ndarray]], Union[list, np.ndarray]]):
+            Applies every transform to a batch of values.
+    """
+
+    def __init__(self, functions: Sequence[Callable] = ()) -> None:
+        """Compiles a pipeline of transforms.
+
+        Args:
+            functions (:obj:`Sequence[Callable]`, optional): The transforms, in the
+                order they should be applied.
+        """
+        self.functions = tuple(functions)
+        self.apply = compose(
+            [
+                _single_item(function) if is_batched(function) else function
+                for function in self.functions
+            ]
+        )
+        batch_stages = []
+        for batched_group, group in groupby(self.functions, is_batched):
+            if batched_group:
+                batch_stages.extend(_checked_batch(function) for function in group)
+            else:
+                batch_stages.append(_over_batch(compose(list(group))))
+        self.apply_batch = compose(batch_stages)
+        self._split = None
+
+    def __reduce__(self) -> tuple:
+        """Pickles only the transforms, the pipeline is compiled again on load"""
+        return (TransformPipeline, (self.functions,))
+
+    def __bool__(self) -> bool:
+        """Whether the pipeline contains any transforms"""
+        return bool(self.functions)
+
+    def __len__(self) -> int:
+        """Returns the number of transforms in the pipeline"""
+        return len(self.functions)
+
+    def __call__(self, value: Any) -> Any:
+        """Applies the pipeline to a single value"""
+        if not self.functions:
+            return value
+        return self.apply(value)
+
+    def batch(self, values: Union[list, np.ndarray]) -> Union[list, np.ndarray]:
+        """Applies the pipeline to a batch of values"""
+        if not self.functions:
+            return values
+        return self.apply_batch(values)
+
+    def split(self, length: int) -> Tuple["TransformPipeline", "TransformPipeline"]:
+        """Splits the pipeline into its first transforms and the rest.
+
+        The split is compiled once and reused, see
+        :mod:`setkit.datasets.base.transform_cache`.
+
+        Args:
+            length (int): The number of transforms in the first pipeline.
+
+        Returns:
+            Tuple[TransformPipeline, TransformPipeline]: The two pipelines.
+        """
+        if self._split is None or len(self._split[0]) != length:
+            self._split = (
+                TransformPipeline(self.functions[:length]),
+                TransformPipeline(self.functions[length:]),
+            )
+        return self._split
@@ -0,0 +1,418 @@
+"""Mergeable sketches for approximate dataset statistics.
+
+Houses the sketches used by :meth:`FunctionalDataset.stats` when approximate
+statistics are requested. Each sketch summarizes a column in a fixed amount of memory,
+regardless of the number of values, and may be merged with a sketch of the same
+parameters built from other values, so that chunks, shards or whole datasets can be
+summarized separately and combined without reading the values again.
+
+    * :class:`HyperLogLog` estimates the number of distinct values.
+    * :class:`KLLSketch` estimates quantiles of numeric values.
+    * :class:`CountMinSketch` estimates the frequency of values, and tracks the most
+      frequent values (the heavy hitters).
+
+Values are hashed with :func:`hash_values`, which gives the same hash in every
+process, so sketches built in worker processes may be merged in the main process.
+
+Attributes:
+    HYPERLOGLOG_PRECISION: The default number of index bits of a :class:`HyperLogLog`.
+    KLL_CAPACITY: The default capacity of the top level of a :class:`KLLSketch`.
+    COUNT_MIN_WIDTH: The default number of counters in each row of a
+        :class:`CountMinSketch`.
+    COUNT_MIN_DEPTH: The default number of rows of a :class:`CountMinSketch`.
+    NUM_HEAVY_HITTERS: The default number of heavy hitters reported by a
+        :class:`CountMinSketch`.
+"""
+
+from hashlib import blake2b
+from numbers import Integral, Real
+from typing import Any, Dict, Hashable, Sequence, Union
+import math
+import numpy as np
+
+HYPERLOGLOG_PRECISION = 12
+KLL_CAPACITY = 200
+COUNT_MIN_WIDTH = 2048
+COUNT_MIN_DEPTH = 4
+NUM_HEAVY_HITTERS = 10
+
+_ROW_SEEDS = np.array(
+    [
+        0x243F6A8885A308D3,
+        0x13198A2E03707344,
+        0xA4093822299F31D0,
+        0x082EFA98EC4E6C89,
+        0x452821E638D01377,
+        0xBE5466CF34E90C6C,
+        0xC0AC29B7C97C50DD,
+        0x3F84D5B5B5470917,
+    ],
+    dtype=np.uint64,
+)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """Scrambles 64 bit integers with the splitmix64 finalizer"""
+    values = values + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def hash_values(values: Union[Sequence[Hashable], np.ndarray]) -> np.ndarray:
+    """Hashes a chunk of scalar values to 64 bit integers.
+
+    Integers are hashed exactly, by the bits of their 64 bit two's complement, so
+    distinct 64 bit integers never share a hash, however close together. Floats with
+    an integral value are hashed like the integer, so that `1`, `1.0` and `True`
+    share a hash, and other floats by the bits of their value. Anything else (and
+    integers which do not fit in 64 bits) is hashed by its `repr`. Unlike the builtin
+    `hash`, the hashes are the same in every process.
+
+    Args:
+        values (Union[Sequence[Hashable], np.ndarray]): The values to hash.
+
+    Returns:
+        np.ndarray: The hash of each value, as unsigned 64 bit integers.
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind in "biu":
+        return _mix(values.reshape(-1).astype(np.uint64))
+    if isinstance(values, np.ndarray) and values.dtype.kind == "f":
+        return _hash_floats(values.reshape(-1).astype(np.float64))
+    hashes = np.empty(len(values), dtype=np.uint64)
+    for position, value in enumerate(values):
+        if isinstance(value, Integral) and -(1 << 63) <= value < (1 << 64):
+            hashes[position] = _mix(
+                np.array([int(value) & 0xFFFFFFFFFFFFFFFF], dtype=np.uint64)
+            )[0]
+        elif isinstance(value, Real) and not isinstance(value, Integral):
+            hashes[position] = _hash_floats(np.array([float(value)]))[0]
+        else:
+            hashes[position] = int.from_bytes(
+                blake2b(repr(value).encode(), digest_size=8).digest(), "little"
+            )
+    return hashes
+
+
+def _hash_floats(floats: np.ndarray) -> np.ndarray:
+    """Hashes floats, hashing those with an integral value like the integer"""
+    # Adding zero turns -0.0 into 0.0, so that they share a hash
+    floats = floats + 0.0
+    bits = floats.view(np.uint64).copy()
+    with np.errstate(invalid="ignore"):
+        integral = floats == np.floor(floats)
+        signed = integral & (floats >= -(2.0**63)) & (floats < 2.0**63)
+        unsigned = integral & (floats >= 2.0**63) & (floats < 2.0**64)
+    bits[signed] = floats[signed].astype(np.int64).view(np.uint64)
+    bits[unsigned] = floats[unsigned].astype(np.uint64)
+    return _mix(bits)
+
+
+class HyperLogLog:
+    """Estimates the number of distinct values.
+
+    Each hash is assigned to one of `2 ** precision` registers by its leading bits,
+    and the register keeps the largest position of the first set bit among the
+    remaining bits. The relative error of the estimate is about
+    `1.04 / sqrt(2 ** precision)`.
+
+    Attributes:
+        precision (int): The number of bits used to choose a register.
+        registers (np.ndarray): The registers.
+    """
+
+    def __init__(self, precision: int = HYPERLOGLOG_PRECISION) -> None:
+        """Creates an empty sketch.
+
+        Args:
+            precision (:obj:`int`, optional): The number of bits used to choose a
+                register, between 4 and 16.
+        """
+        if not 4 <= precision <= 16:
+            raise ValueError(
+                f"HyperLogLog precision must be in [4, 16], not {precision}"
+            )
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray) -> "HyperLogLog":
+        """Adds a chunk of hashed values, see :func:`hash_values`.
+
+        Returns:
+            HyperLogLog: Returns `self`.
+        """
+        precision = np.uint64(self.precision)
+        registers = (hashes >> (np.uint64(64) - precision)).astype(np.intp)
+        # The 32 bits after the register bits are exact as floats, which is plenty
+        remainder = (hashes << precision) >> np.uint64(32)
+        leading_bits = remainder.astype(np.float64)
+        ranks = np.full(len(hashes), 33, dtype=np.uint8)
+        nonzero = leading_bits > 0
+        ranks[nonzero] = 32 - np.floor(np.log2(leading_bits[nonzero]))
+        np.maximum.at(self.registers, registers, ranks)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Combines another sketch of the same precision into this one.
+
+        Returns:
+            HyperLogLog: Returns `self`.
+        """
+        if other.precision != self.precision:
+            raise ValueError(
+                f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}"
+            )
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self) -> int:
+        """Returns the estimated number of distinct values"""
+        num_registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / num_registers)
+        estimate = (
+            alpha
+            * num_registers**2
+            / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        )
+        empty_registers = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * num_registers and empty_registers:
+            estimate = num_registers * math.log(num_registers / empty_registers)
+        return int(round(estimate))
+
+
+class KLLSketch:
+    """Estimates quantiles of numeric values.
+
+    A KLL sketch keeps a hierarchy of compactors. Each value enters the lowest level,
+    and when a level is full it is sorted and every other value is promoted to the
+    next level, where each value stands for twice as many of the original values. The
+    capacity of each level shrinks geometrically with its distance from the top, so
+    the sketch holds `O(capacity)` values, and the rank error of a quantile is about
+    `1.7 / capacity`.
+
+    Compactions alternate between keeping the odd and the even values, rather than
+    choosing at random, so that the same values always give the same sketch.
+
+    Attributes:
+        capacity (int): The capacity of the top level.
+        count (int): The number of values added.
+        levels (List[np.ndarray]): The values kept at each level.
+    """
+
+    def __init__(self, capacity: int = KLL_CAPACITY) -> None:
+        """Creates an empty sketch.
+
+        Args:
+            capacity (:obj:`int`, optional): The capacity of the top level.
+        """
+        self.capacity = capacity
+        self.count = 0
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self._keep_odd = False
+
+    def _level_capacity(self, level: int) -> int:
+        """Returns the capacity of a level, given the current number of levels"""
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.capacity * (2 / 3) ** depth)))
+
+    def update(self, values: np.ndarray) -> "KLLSketch":
+        """Adds a chunk of numeric values.
+
+        Returns:
+            KLLSketch: Returns `self`.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        self.count += len(values)
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._compress()
+        return self
+
+    def _compress(self) -> None:
+        """Compacts the lowest full level, until no level is over capacity"""
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) < self._level_capacity(level):
+                level += 1
+                continue
+            values = np.sort(self.levels[level])
+            # An odd value out stays behind, so that the total weight is unchanged
+            remainder, values = values[: len(values) % 2], values[len(values) % 2 :]
+            promoted = values[int(self._keep_odd) :: 2]
+            self._keep_odd = not self._keep_odd
+            self.levels[level] = remainder
+            if level + 1 == len(self.levels):
+                self.levels.append(promoted)
+            else:
+                self.levels[level + 1] = np.concatenate(
+                    (self.levels[level + 1], promoted)
+                )
+            # Adding a level lowers the capacity of the levels below
+            level = 0
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Combines another sketch into this one.
+
+        Returns:
+            KLLSketch: Returns `self`.
+        """
+        for level, values in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(values.copy())
+            else:
+                self.levels[level] = np.concatenate((self.levels[level], values))
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantiles(self, fractions: Sequence[float]) -> Union[list, None]:
+        """Estimates quantiles of the values.
+
+        Args:
+            fractions (Sequence[float]): The fraction of values below each quantile,
+                between 0 and 1.
+
+        Returns:
+            Union[list, None]: The estimate of each quantile, or `None` if no values
+                have been added.
+        """
+        if self.count == 0:
+            return None
+        values = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [
+                np.full(len(level_values), 1 << level)
+                for level, level_values in enumerate(self.levels)
+            ]
+        )
+        order = np.argsort(values, kind="stable")
+        values, cumulative_weights = values[order], np.cumsum(weights[order])
+        positions = np.searchsorted(
+            cumulative_weights,
+            np.asarray(fractions) * cumulative_weights[-1],
+            side="left",
+        )
+        return values[np.minimum(positions, len(values) - 1)].tolist()
+
+
+class CountMinSketch:
+    """Estimates the frequency of values, and tracks the most frequent values.
+
+    Each row of counters counts the values with its own hash function. A value's
+    frequency is estimated by the smallest of its counters, which may overestimate,
+    but never underestimates, the true frequency. Candidates for the most frequent
+    values are kept alongside the counters, and pruned to the most frequent few after
+    each update.
+
+    Attributes:
+        width (int): The number of counters in each row.
+        depth (int): The number of rows.
+        num_heavy_hitters (int): The number of most frequent values reported.
+        counters (np.ndarray): The counters, with a row for each hash function.
+    """
+
+    def __init__(
+        self,
+        width: int = COUNT_MIN_WIDTH,
+        depth: int = COUNT_MIN_DEPTH,
+        num_heavy_hitters: int = NUM_HEAVY_HITTERS,
+    ) -> None:
+        """Creates an empty sketch.
+
+        Args:
+            width (:obj:`int`, optional): The number of counters in each row.
+            depth (:obj:`int`, optional): The number of rows, at most 8.
+            num_heavy_hitters (:obj:`int`, optional): The number of most frequent
+                values reported.
+        """
+        if not 1 <= depth <= len(_ROW_SEEDS):
+            raise ValueError(
+                f"Count-min depth must be in [1, {len(_ROW_SEEDS)}], not {depth}"
+            )
+        self.width = width
+        self.depth = depth
+        self.num_heavy_hitters = num_heavy_hitters
+        self.counters = np.zeros((depth, width), dtype=np.int64)
+        self._candidates = {}
+
+    def _columns(self, hashes: np.ndarray) -> np.ndarray:
+        """Returns the counter of each hash in each row"""
+        return (
+            _mix(hashes[None, :] ^ _ROW_SEEDS[: self.depth, None])
+            % np.uint64(self.width)
+        ).astype(np.intp)
+
+    def update(
+        self, values: Union[Sequence[Hashable], np.ndarray], hashes: np.ndarray
+    ) -> "CountMinSketch":
+        """Adds a chunk of values.
+
+        Args:
+            values (Union[Sequence[Hashable], np.ndarray]): The values.
+            hashes (np.ndarray): The hash of each value, see :func:`hash_values`.
+
+        Returns:
+            CountMinSketch: Returns `self`.
+        """
+        if not len(hashes):
+            return self
+        for row, columns in enumerate(self._columns(hashes)):
+            self.counters[row] += np.bincount(columns, minlength=self.width)
+        if isinstance(values, np.ndarray):
+            unique_values, positions = np.unique(values, return_index=True)
+            self._candidates.update(zip(unique_values.tolist(), hashes[positions]))
+        else:
+            self._candidates.update(zip(values, hashes))
+        self._prune()
+        return self
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        """Combines another sketch of the same shape into this one.
+
+        Returns:
+            CountMinSketch: Returns `self`.
+        """
+        if other.counters.shape != self.counters.shape:
+            raise ValueError(
+                f"Cannot merge count-min sketches of shape {self.counters.shape} and {other.counters.shape}"
+            )
+        self.counters += other.counters
+        self._candidates.update(other._candidates)
+        self._prune()
+        return self
+
+    def _estimates(self, hashes: np.ndarray) -> np.ndarray:
+        """Returns the estimated frequency of each hash"""
+        columns = self._columns(hashes)
+        return self.counters[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def _prune(self) -> None:
+        """Keeps only the candidates which may be among the most frequent values"""
+        # Extra candidates are kept, as frequencies change as more values are added
+        num_candidates = 4 * self.num_heavy_hitters
+        if len(self._candidates) <= num_candidates:
+            return
+        values = list(self._candidates)
+        hashes = np.fromiter(self._candidates.values(), dtype=np.uint64)
+        estimates = self._estimates(hashes)
+        keep = np.argsort(-estimates, kind="stable")[:num_candidates]
+        self._candidates = {values[position]: hashes[position] for position in keep}
+
+    def estimate(self, value: Hashable) -> int:
+        """Returns the estimated frequency of a value"""
+        return int(self._estimates(hash_values([value]))[0])
+
+    def heavy_hitters(self) -> Dict[Any, int]:
+        """Returns the most frequent values, with their estimated frequencies.
+
+        Returns:
+            Dict[Any, int]: The estimated frequency of each value, from most to least
+                frequent.
+        """
+        if not self._candidates:
+            return {}
+        values = list(self._candidates)
+        estimates = self._estimates(
+            np.fromiter(self._candidates.values(), dtype=np.uint64)
+        )
+        order = np.argsort(-estimates, kind="stable")[: self.num_heavy_hitters]
+        return {values[position]: int(estimates[position]) for position in order}
@@ -0,0 +1,522 @@
+"""Streaming statistics for rootflow datasets.
+
+Houses the accumulators used by :meth:`FunctionalDataset.stats`. Each column of a
+dataset (the data, each key of dictionary data, and each task of the targets) is
+summarized by a :class:`ColumnStatistics`, which is updated with one chunk of values
+at a time and can be merged with the statistics of other chunks. Means and variances
+are combined with the parallel form of Welford's algorithm, (Chan et al.) so that
+chunks may be processed in any order, or in separate processes, without losing
+precision.
+
+Approximate statistics, for datasets too large to count exactly, are accumulated by
+:class:`ColumnSketch` with the mergeable sketches of
+:mod:`setkit.datasets.base.sketches`.
+
+Attributes:
+    MAX_TRACKED_VALUES: The largest number of distinct values counted for a column.
+        Columns with more distinct values do not report value counts.
+    QUANTILES: The quantiles reported by approximate statistics.
+"""
+
+from collections import Counter
+from copy import deepcopy
+from numbers import Number
+from typing import Any, Dict, Mapping, Sequence, Tuple, Union
+import math
+import numpy as np
+import torch
+
+from setkit.datasets.base.sketches import (
+    CountMinSketch,
+    HyperLogLog,
+    KLLSketch,
+    hash_values,
+)
+
+MAX_TRACKED_VALUES = 1000
+QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+
+
+class ColumnStatistics:
+    """Accumulates the statistics of a column, one chunk at a time.
+
+    Numeric values (numbers, and arrays, tensors or lists of numbers with a
+    consistent shape) are summarized per feature with a count, mean, sum of squared
+    deviations, minimum and maximum. Values which are `None` or contain NaN are
+    counted as missing. Hashable values, such as class labels and strings, may also
+    be counted, up to :data:`MAX_TRACKED_VALUES` distinct values.
+
+    Attributes:
+        count (int): The number of values accumulated, including missing values.
+        missing (int): The number of missing values.
+        numeric_count (int): The number of numeric values in the moments.
+        mean (np.ndarray): The mean of each feature.
+        m2 (np.ndarray): The sum of squared deviations from the mean of each feature.
+        minimum (np.ndarray): The minimum of each feature.
+        maximum (np.ndarray): The maximum of each feature.
+        value_counts (Counter): The number of times each value occurs, or `None` if
+            values are not counted, or there are too many distinct values.
+    """
+
+    def __init__(self, count_values: bool = False) -> None:
+        """Creates an empty accumulator.
+
+        Args:
+            count_values (:obj:`bool`, optional): Whether to count hashable values.
+        """
+        self.count = 0
+        self.missing = 0
+        self.numeric_count = 0
+        self.numeric = True
+        self.feature_shape = None
+        self.mean = None
+        self.m2 = None
+        self.minimum = None
+        self.maximum = None
+        self.value_counts = Counter() if count_values else None
+
+    def update(self, values: Union[list, np.ndarray]) -> "ColumnStatistics":
+        """Adds a chunk of values.
+
+        Args:
+            values (Union[list, np.ndarray]): The values.
+
+        Returns:
+            ColumnStatistics: Returns `self`.
+        """
+        self.count += len(values)
+        if self.value_counts is not None:
+            self._count_values(values)
+        if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+            present_values, num_none = values, 0
+        else:
+            present_values = [value for value in values if value is not None]
+            num_none = len(values) - len(present_values)
+        array = _numeric_array(present_values) if self.numeric else None
+        if array is None:
+            self._drop_moments()
+            self.missing += num_none + sum(
+                _is_missing(value) for value in present_values
+            )
+            return self
+        array = array.reshape(len(array), -1).astype(np.float64, copy=False)
+        present = ~np.isnan(array).any(axis=1)
+        self.missing += num_none + int(len(array) - present.sum())
+        if present.any():
+            self._update_moments(array[present])
+        return self
+
+    def _drop_moments(self) -> None:
+        """Stops tracking moments, once the column is found not to be numeric"""
+        self.numeric = False
+        self.numeric_count = 0
+        self.mean = self.m2 = self.minimum = self.maximum = None
+
+    def _update_moments(self, array: np.ndarray) -> None:
+        """Combines the moments of a chunk of numeric rows with the current moments"""
+        if self.feature_shape is not None and array.shape[1:] != self.feature_shape:
+            self._drop_moments()
+            return
+        chunk_count = len(array)
+        chunk_mean = array.mean(axis=0)
+        chunk_m2 = ((array - chunk_mean) ** 2).sum(axis=0)
+        self._combine_moments(
+            chunk_count, chunk_mean, chunk_m2, array.min(axis=0), array.max(axis=0)
+        )
+        self.feature_shape = array.shape[1:]
+
+    def _combine_moments(
+        self,
+        count: int,
+        mean: np.ndarray,
+        m2: np.ndarray,
+        minimum: np.ndarray,
+        maximum: np.ndarray,
+    ) -> None:
+        """Combines moments with the current moments, with Chan's parallel formula"""
+        if self.numeric_count == 0:
+            self.numeric_count, self.mean, self.m2 = count, mean, m2
+            self.minimum, self.maximum = minimum, maximum
+            return
+        total = self.numeric_count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta**2 * (self.numeric_count * count / total)
+        self.minimum = np.minimum(self.minimum, minimum)
+        self.maximum = np.maximum(self.maximum, maximum)
+        self.numeric_count = total
+
+    def _count_values(self, values: Union[list, np.ndarray]) -> None:
+        """Counts hashable values, giving up once there are too many"""
+        if isinstance(values, np.ndarray) and values.ndim == 1:
+            unique_values, counts = np.unique(values, return_counts=True)
+            self.value_counts.update(dict(zip(unique_values.tolist(), counts.tolist())))
+        else:
+            for value in values:
+                if isinstance(value, (torch.Tensor, np.ndarray, np.generic)):
+                    if value.ndim != 0:
+                        self.value_counts = None
+                        return
+                    value = value.item()
+                if value is None or _is_missing(value):
+                    continue
+                try:
+                    self.value_counts[value] += 1
+                except TypeError:
+                    self.value_counts = None
+                    return
+        if len(self.value_counts) > MAX_TRACKED_VALUES:
+            self.value_counts = None
+
+    def merge(self, other: "ColumnStatistics") -> "ColumnStatistics":
+        """Combines the statistics of another accumulator into this one.
+
+        Args:
+            other (ColumnStatistics): The accumulator to merge.
+
+        Returns:
+            ColumnStatistics: Returns `self`.
+        """
+        self.count += other.count
+        self.missing += other.missing
+        if self.value_counts is not None:
+            if other.value_counts is None:
+                self.value_counts = None
+            else:
+                self.value_counts.update(other.value_counts)
+                if len(self.value_counts) > MAX_TRACKED_VALUES:
+                    self.value_counts = None
+        if not (self.numeric and other.numeric):
+            self._drop_moments()
+        elif other.numeric_count:
+            if self.feature_shape not in (None, other.feature_shape):
+                self._drop_moments()
+            else:
+                self._combine_moments(
+                    other.numeric_count,
+                    other.mean,
+                    other.m2,
+                    other.minimum,
+                    other.maximum,
+                )
+                self.feature_shape = other.feature_shape
+        return self
+
+    def result(self) -> dict:
+        """Returns the statistics of the column.
+
+        Returns:
+            dict: The count and missing rate of the values, the mean, standard
+                deviation, minimum and maximum of numeric values (as floats, or numpy
+                arrays with one element for each feature) and the value counts, if
+                counted.
+        """
+        statistics = {
+            "count": self.count,
+            "missing": self.missing,
+            "missing_rate": self.missing / self.count if self.count else 0.0,
+        }
+        if self.numeric and self.numeric_count:
+            variance = self.m2 / self.numeric_count
+            statistics.update(
+                {
+                    "mean": _squeeze(self.mean),
+                    "std": _squeeze(np.sqrt(variance)),
+                    "min": _squeeze(self.minimum),
+                    "max": _squeeze(self.maximum),
+                }
+            )
+        if self.value_counts is not None:
+            statistics["value_counts"] = dict(self.value_counts.most_common())
+        return statistics
+
+
+def _squeeze(values: np.ndarray) -> Union[float, np.ndarray]:
+    """Returns a single feature as a float, and multiple features as an array"""
+    if values.size == 1:
+        return float(values.reshape(-1)[0])
+    return values
+
+
+def _is_missing(value: Any) -> bool:
+    """Whether a value is None or a floating point NaN"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _numeric_array(values: Union[list, np.ndarray]) -> Union[np.ndarray, None]:
+    """Converts a chunk of values to a numeric array, with one row for each value.
+
+    Returns `None` if the values are not numeric, or do not share a shape.
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+        return values
+    rows = []
+    for value in values:
+        if isinstance(value, torch.Tensor):
+            value = value.detach().cpu().numpy()
+        if isinstance(value, (str, bytes, Mapping)):
+            return None
+        try:
+            row = np.asarray(value)
+        except ValueError:
+            return None
+        if row.dtype.kind not in "biuf" or (rows and row.shape != rows[0].shape):
+            return None
+        rows.append(row)
+    if not rows:
+        return np.empty((0, 1))
+    return np.stack(rows)
+
+
+def split_columns(
+    values: Union[list, np.ndarray], prefix: str
+) -> Dict[str, Union[list, np.ndarray]]:
+    """Splits a chunk of values into named columns.
+
+    Dictionary values are split into a column for each key, named `prefix.key`.
+    Anything else is a single column, named after the prefix.
+
+    Args:
+        values (Union[list, np.ndarray]): The values.
+        prefix (str): The name of the column.
+
+    Returns:
+        Dict[str, Union[list, np.ndarray]]: The values of each column.
+    """
+    if len(values) and isinstance(values[0], Mapping):
+        return {
+            f"{prefix}.{key}": [value[key] for value in values] for key in values[0]
+        }
+    return {prefix: values}
+
+
+def accumulate_statistics(
+    columns: Tuple[Union[list, np.ndarray], Union[list, np.ndarray]],
+) -> Tuple[Dict[str, ColumnStatistics], Dict[str, ColumnStatistics]]:
+    """Accumulates the statistics of a chunk of data and targets.
+
+    Args:
+        columns (Tuple[Union[list, np.ndarray], Union[list, np.ndarray]]): The data
+            and targets of the chunk, as returned by
+            :meth:`FunctionalDataset.index_batch`.
+
+    Returns:
+        Tuple[Dict[str, ColumnStatistics], Dict[str, ColumnStatistics]]: The
+            statistics of each data column and each target column.
+    """
+    data, targets = columns
+    data_statistics = {
+        name: ColumnStatistics(count_values=_is_categorical(values)).update(values)
+        for name, values in split_columns(data, "data").items()
+    }
+    target_statistics = {}
+    if targets is not None:
+        target_statistics = {
+            name: ColumnStatistics(count_values=True).update(values)
+            for name, values in split_columns(targets, "target").items()
+        }
+    return (data_statistics, target_statistics)
+
+
+def _is_categorical(values: Union[list, np.ndarray]) -> bool:
+    """Whether the values of a data column should be counted"""
+    if isinstance(values, np.ndarray):
+        return values.dtype.kind in "bOUS"
+    for value in values:
+        if value is not None:
+            return isinstance(value, (str, bool))
+    return False
+
+
+def merge_statistics(
+    chunk_statistics: Sequence[Dict[str, ColumnStatistics]],
+) -> Dict[str, dict]:
+    """Merges the statistics of every chunk, and returns the result of each column"""
+    merged_statistics = {}
+    for statistics in chunk_statistics:
+        for name, column_statistics in statistics.items():
+            if name in merged_statistics:
+                merged_statistics[name].merge(column_statistics)
+            else:
+                merged_statistics[name] = column_statistics
+    return {name: statistics.result() for name, statistics in merged_statistics.items()}
+
+
+class ColumnSketch:
+    """Accumulates the approximate statistics of a column, in bounded memory.
+
+    Alongside the moments and missing values of a :class:`ColumnStatistics`, scalar
+    values are summarized with a :class:`HyperLogLog` for the number of distinct
+    values, numeric values with a :class:`KLLSketch` for quantiles, and categorical
+    values with a :class:`CountMinSketch` for the most frequent values. Sketches are
+    dropped for columns whose values are not scalars (such as arrays or lists).
+
+    Attributes:
+        moments (ColumnStatistics): The count, missing values and moments.
+        distinct (HyperLogLog): The distinct value sketch, or `None`.
+        quantiles (KLLSketch): The quantile sketch, or `None`.
+        frequent (CountMinSketch): The frequency sketch, or `None`.
+    """
+
+    def __init__(self, count_values: bool = False) -> None:
+        """Creates an empty accumulator.
+
+        Args:
+            count_values (:obj:`bool`, optional): Whether to track the most frequent
+                values.
+        """
+        self.moments = ColumnStatistics()
+        self.distinct = HyperLogLog()
+        self.quantiles = KLLSketch()
+        self.frequent = CountMinSketch() if count_values else None
+
+    def update(self, values: Union[list, np.ndarray]) -> "ColumnSketch":
+        """Adds a chunk of values.
+
+        Args:
+            values (Union[list, np.ndarray]): The values.
+
+        Returns:
+            ColumnSketch: Returns `self`.
+        """
+        self.moments.update(values)
+        if self.distinct is None:
+            return self
+        scalars = _scalar_values(values)
+        if scalars is None:
+            self.distinct = self.quantiles = self.frequent = None
+            return self
+        hashes = hash_values(scalars)
+        self.distinct.update(hashes)
+        if self.quantiles is not None:
+            if isinstance(scalars, np.ndarray):
+                self.quantiles.update(scalars)
+            elif all(_is_number(value) for value in scalars):
+                self.quantiles.update(np.asarray(scalars, dtype=np.float64))
+            else:
+                self.quantiles = None
+        if self.frequent is not None:
+            self.frequent.update(scalars, hashes)
+        return self
+
+    def merge(self, other: "ColumnSketch") -> "ColumnSketch":
+        """Combines the sketches of another accumulator into this one.
+
+        Args:
+            other (ColumnSketch): The accumulator to merge.
+
+        Returns:
+            ColumnSketch: Returns `self`.
+        """
+        self.moments.merge(other.moments)
+        for name in ("distinct", "quantiles", "frequent"):
+            sketch, other_sketch = getattr(self, name), getattr(other, name)
+            if sketch is None or other_sketch is None:
+                setattr(self, name, None)
+            else:
+                sketch.merge(other_sketch)
+        return self
+
+    def result(self) -> dict:
+        """Returns the approximate statistics of the column.
+
+        Returns:
+            dict: The statistics of :meth:`ColumnStatistics.result`, without value
+                counts, along with the estimated number of distinct values, the
+                estimated :data:`QUANTILES` of numeric values, and the estimated
+                frequency of the most frequent values, where they are sketched.
+        """
+        statistics = self.moments.result()
+        if self.distinct is not None:
+            statistics["distinct"] = self.distinct.estimate()
+        if self.quantiles is not None and self.quantiles.count:
+            statistics["quantiles"] = dict(
+                zip(QUANTILES, self.quantiles.quantiles(QUANTILES))
+            )
+        if self.frequent is not None:
+            statistics["heavy_hitters"] = self.frequent.heavy_hitters()
+        return statistics
+
+
+def _scalar_values(values: Union[list, np.ndarray]) -> Union[list, np.ndarray, None]:
+    """Returns the present values of a chunk, if they are all hashable scalars.
+
+    Numeric numpy arrays are returned as arrays, anything else as a list of python
+    scalars. Returns `None` if any value is not a hashable scalar.
+    """
+    if isinstance(values, np.ndarray) and values.ndim == 1:
+        if values.dtype.kind in "biuf":
+            return values[~np.isnan(values)] if values.dtype.kind == "f" else values
+        values = values.tolist()
+    scalars = []
+    for value in values:
+        if isinstance(value, (torch.Tensor, np.ndarray, np.generic)):
+            if value.ndim != 0:
+                return None
+            value = value.item()
+        if _is_missing(value):
+            continue
+        if isinstance(value, (list, tuple, set, dict, Mapping)):
+            return None
+        try:
+            hash(value)
+        except TypeError:
+            return None
+        scalars.append(value)
+    return scalars
+
+
+def _is_number(value: Any) -> bool:
+    """Whether a value is a real number (including booleans)"""
+    return isinstance(value, Number) and not isinstance(value, complex)
+
+
+def accumulate_sketches(
+    columns: Tuple[
+        Union[list, np.ndarray], Union[list, np.ndarray], Union[list, np.ndarray]
+    ],
+) -> Dict[str, ColumnSketch]:
+    """Sketches a chunk of ids, data and targets.
+
+    The ids are sketched as the column `"id"`, and the data and targets are split
+    into columns with :func:`split_columns`.
+
+    Args:
+        columns (Tuple[Union[list, np.ndarray], Union[list, np.ndarray],
+            Union[list, np.ndarray]]): The ids, data and targets of the chunk, as
+            returned by :meth:`FunctionalDataset.index_batch`.
+
+    Returns:
+        Dict[str, ColumnSketch]: The sketches of each column.
+    """
+    ids, data, targets = columns
+    sketches = {"id": ColumnSketch().update(ids)}
+    for name, values in split_columns(data, "data").items():
+        sketches[name] = ColumnSketch(count_values=_is_categorical(values))
+        sketches[name].update(values)
+    if targets is not None:
+        for name, values in split_columns(targets, "target").items():
+            sketches[name] = ColumnSketch(count_values=True).update(values)
+    return sketches
+
+
+def merge_sketches(
+    chunk_sketches: Sequence[Dict[str, ColumnSketch]],
+) -> Dict[str, ColumnSketch]:
+    """Merges the sketches of every chunk, leaving the given sketches unchanged.
+
+    Args:
+        chunk_sketches (Sequence[Dict[str, ColumnSketch]]): The sketches of each
+            chunk, or each dataset, by column name.
+
+    Returns:
+        Dict[str, ColumnSketch]: The merged sketch of each column.
+    """
+    merged_sketches = {}
+    for sketches in chunk_sketches:
+        for name, sketch in sketches.items():
+            if name in merged_sketches:
+                merged_sketches[name].merge(sketch)
+            else:
+                merged_sketches[name] = deepcopy(sketch)
+    return merged_sketches
@@ -0,0 +1,1054 @@
+"""Storage backends for rootflow datasets.
+
+Houses :class:`ColumnarStorage`, which may be used in place of the default list of
+:class:`RootflowDataItem`s to hold the ids, data and targets of a
+:class:`RootflowDataset` as separate contiguous columns, :class:`MemmapStorage`,
+which memory maps those columns from disk so that datasets larger than memory may be
+used, and :class:`ShardedStorage`, which splits memory mapped columns across fixed
+size shards, as written by :meth:`FunctionalDataset.save`, and :class:`SharedStorage`,
+which places the columns in shared memory for loading with worker processes.
+
+Attributes:
+    NUMERIC_KINDS: The numpy dtype kinds which are stored as native arrays. Values
+        of any other kind are stored in object arrays.
+    DEFAULT_SHARD_SIZE: The default number of rows in each shard of a
+        :class:`ShardedStorage`.
+    SHARD_FORMAT_VERSION: Version of the sharded storage layout. Storages written
+        with a different version cannot be opened.
+    PICKLE_ENCODING: The encoding of :class:`RaggedColumn` records which are
+        pickled objects.
+    SHARED_MEMORY_DIRECTORY: Where :class:`SharedStorage` places its columns, a
+        shared memory filesystem where available, or the temporary directory.
+"""
+
+from typing import Any, Callable, Iterator, List, Mapping, Sequence, Tuple, Union
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import weakref
+import numpy as np
+
+import setkit.datasets.base.dataset as rootflow_datasets
+from setkit.datasets.base.utils import (
+    batch_enumerate,
+    map_functions_over_batch,
+    merge_batches,
+)
+
+NUMERIC_KINDS = "biuf"
+COLUMN_NAMES = ("id", "data", "target")
+MEMMAP_METADATA_FILE = "storage.json"
+SHARD_MANIFEST_FILE = "manifest.json"
+SHARD_FORMAT_VERSION = 1
+DEFAULT_SHARD_SIZE = 65536
+PICKLE_ENCODING = "pickle"
+SHARED_MEMORY_DIRECTORY = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def pack_column(values: Sequence) -> Union[np.ndarray, None]:
+    """Packs a sequence of values into a contiguous column.
+
+    Values which numpy can represent with a numeric (or boolean) dtype are packed
+    into a native array, with any nested sequences becoming additional dimensions.
+    All other values are placed, unchanged, into a one dimensional object array. If
+    every value is `None`, no column is needed and `None` is returned instead.
+
+    Args:
+        values (Sequence): The values to pack, one for each dataset example.
+
+    Returns:
+        Union[np.ndarray, None]: The packed column, or `None` if all values are None.
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind in NUMERIC_KINDS:
+        return values
+    first_value = next((value for value in values if value is not None), None)
+    if first_value is None:
+        return None
+    if not isinstance(first_value, (str, bytes, Mapping)):
+        try:
+            column = np.asarray(values)
+            if column.dtype.kind in NUMERIC_KINDS and len(column) == len(values):
+                return column
+        except (ValueError, TypeError):
+            pass
+    return object_column(values)
+
+
+def object_column(values: Sequence) -> np.ndarray:
+    """Places values, unchanged, into a one dimensional object array.
+
+    Args:
+        values (Sequence): The values to place in the column.
+
+    Returns:
+        np.ndarray: An object array containing each value.
+    """
+    column = np.empty(len(values), dtype=object)
+    for idx, value in enumerate(values):
+        column[idx] = value
+    return column
+
+
+def column_reader(column: Any) -> Callable[[int], Any]:
+    """Returns a function which reads single elements from a column.
+
+    One dimensional numeric columns are read as python scalars, so that columnar
+    storage returns the same types as a list of :class:`RootflowDataItem`s. Rows of
+    multidimensional columns are returned as views, without copying.
+
+    Args:
+        column (Any): The column to read from, or `None` for an empty column.
+
+    Returns:
+        Callable[[int], Any]: A function taking an index and returning the element.
+    """
+    if column is None:
+        return lambda index: None
+    if isinstance(column, np.ndarray) and column.dtype.kind in NUMERIC_KINDS:
+        if column.ndim == 1:
+            return lambda index: column[index].item()
+    return column.__getitem__
+
+
+def _integer_array(indices: Sequence[int]) -> np.ndarray:
+    """Converts indices to an integer array, without copying integer arrays"""
+    if isinstance(indices, np.ndarray) and indices.dtype.kind in "iu":
+        return indices
+    return np.asarray(indices, dtype=np.int64)
+
+
+class ColumnarStorage:
+    """Columnar storage for rootflow dataset examples.
+
+    Stores the ids, data and targets of a dataset as three separate columns, instead
+    of as a list of :class:`RootflowDataItem` objects. Numeric data and targets are
+    held in contiguous numpy arrays, while everything else is held in object arrays.
+    Columns which are entirely `None` (such as missing ids) are not stored at all.
+
+    The storage can be used anywhere a list of data items is expected. Indexing it
+    with an integer returns a :class:`RootflowDataItem`, and items may be assigned
+    back by index. Internally, :class:`RootflowDataset` reads rows directly with
+    :meth:`row` and operates on whole columns with :meth:`column` and
+    :meth:`set_column`.
+    """
+
+    def __init__(self, ids: Any = None, data: Any = None, targets: Any = None) -> None:
+        """Creates a new columnar storage.
+
+        Args:
+            ids (:obj:`Any`, optional): The id column, or a sequence of ids.
+            data (Any): The data column, or a sequence of data.
+            targets (:obj:`Any`, optional): The target column, or a sequence of
+                targets.
+
+        Raises:
+            ValueError: If the given columns do not have the same length.
+        """
+        self._columns = {}
+        self._readers = {}
+        self._length = None
+        for name, values in zip(COLUMN_NAMES, (ids, data, targets)):
+            self.set_column(name, values)
+
+    @classmethod
+    def from_items(
+        cls, items: Sequence["rootflow_datasets.RootflowDataItem"]
+    ) -> "ColumnarStorage":
+        """Creates a columnar storage from a list of data items.
+
+        Args:
+            items (Sequence[RootflowDataItem]): The data items to store.
+
+        Returns:
+            ColumnarStorage: The storage containing the given items.
+        """
+        ids, data, targets = [], [], []
+        for item in items:
+            ids.append(item.id)
+            data.append(item.data)
+            targets.append(item.target)
+        storage = cls(ids, data, targets)
+        storage._length = len(items)
+        return storage
+
+    def column(self, name: str) -> Any:
+        """Returns a column.
+
+        Args:
+            name (str): One of `"id"`, `"data"` or `"target"`.
+
+        Returns:
+            Any: The column, or `None` if the column is not stored.
+        """
+        return self._columns[name]
+
+    def set_column(self, name: str, values: Any) -> None:
+        """Replaces a column.
+
+        Sequences are packed with :func:`pack_column`. Numpy arrays, and other
+        storage specific column types, are stored as given.
+
+        Args:
+            name (str): One of `"id"`, `"data"` or `"target"`.
+            values (Any): The new column, or a sequence of values to pack.
+
+        Raises:
+            ValueError: If the column does not match the length of the storage.
+        """
+        if name not in COLUMN_NAMES:
+            raise ValueError(f"Unknown column {name}, expected one of {COLUMN_NAMES}")
+        if values is not None and not hasattr(values, "__getitem__"):
+            values = list(values)
+        if values is not None and not isinstance(values, np.ndarray):
+            if isinstance(values, (list, tuple)):
+                values = pack_column(values)
+        if values is not None:
+            if self._length is None:
+                self._length = len(values)
+            elif len(values) != self._length:
+                raise ValueError(
+                    f"Column {name} has length {len(values)}, but the storage has length {self._length}"
+                )
+        self._columns[name] = values
+        self._readers[name] = column_reader(values)
+
+    def map_column(self, name: str, function: Callable, batch_size: int = None) -> None:
+        """Maps a function over a column, writing the results back in bulk.
+
+        Without a batch size the function is called on each element. With a batch
+        size, it is instead called on contiguous slices of the column. Numeric
+        columns are passed as numpy arrays, so that vectorized functions may be
+        used, while all other columns are passed as lists.
+
+        Args:
+            name (str): One of `"id"`, `"data"` or `"target"`.
+            function (Callable): The function to map.
+            batch_size (:obj:`int`, optional): The size of the slices to map over.
+
+        Raises:
+            AssertionError: If a batched function does not return a sequence of the
+                same length as its inputs.
+        """
+        if batch_size is None:
+            read = self._readers[name]
+            self.set_column(name, [function(read(idx)) for idx in range(len(self))])
+            return
+
+        column = self._columns[name]
+        if column is None:
+            column = np.empty(len(self), dtype=object)
+        self.set_column(name, map_values(function, column, batch_size))
+
+    def gather(
+        self, name: str, indices: Sequence[int]
+    ) -> Union[np.ndarray, list, None]:
+        """Reads multiple elements of a column at once.
+
+        Numeric columns are gathered with a single vectorized numpy indexing
+        operation, and returned as a numpy array. Other columns are returned as a
+        list of elements.
+
+        Args:
+            name (str): One of `"id"`, `"data"` or `"target"`.
+            indices (Sequence[int]): The indices of the elements to read.
+
+        Returns:
+            Union[np.ndarray, list, None]: The gathered elements, or `None` if the
+                column is not stored.
+        """
+        column = self._columns[name]
+        if column is None:
+            return None
+        if isinstance(column, ShardedColumn):
+            return column.gather(indices)
+        if isinstance(column, np.ndarray):
+            if isinstance(indices, range) and indices.step == 1:
+                # Contiguous ranges can be read as a slice, without copying
+                gathered = column[indices.start : indices.stop]
+            else:
+                gathered = column[_integer_array(indices)]
+            if column.dtype.kind in NUMERIC_KINDS:
+                return np.asarray(gathered)
+            return gathered.tolist()
+        return [column[index] for index in indices]
+
+    def row(self, index: int) -> Tuple[Any, Any, Any]:
+        """Reads a single row.
+
+        Args:
+            index (int): The index of the row.
+
+        Returns:
+            tuple: A tuple of three items, respectively, the id, the data and the
+                target of the row.
+        """
+        readers = self._readers
+        return (readers["id"](index), readers["data"](index), readers["target"](index))
+
+    def __len__(self) -> int:
+        """Returns the number of rows in the storage."""
+        return 0 if self._length is None else self._length
+
+    def __getitem__(self, index: int) -> "rootflow_datasets.RootflowDataItem":
+        """Returns the row at the index as a :class:`RootflowDataItem`."""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(
+                f"Index {index} out of range for storage of length {len(self)}"
+            )
+        id, data, target = self.row(index)
+        return rootflow_datasets.RootflowDataItem(data, id=id, target=target)
+
+    def __setitem__(
+        self, index: int, item: "rootflow_datasets.RootflowDataItem"
+    ) -> None:
+        """Writes a :class:`RootflowDataItem` into the row at the index.
+
+        If a value cannot be stored in the existing column, (for example a string
+        being written into a numeric column) the column is converted to an object
+        column first.
+        """
+        for name, value in zip(COLUMN_NAMES, item):
+            column = self._columns[name]
+            if column is None:
+                if value is None:
+                    continue
+                column = np.empty(len(self), dtype=object)
+            elif column.dtype.kind in NUMERIC_KINDS:
+                column = self._promote_column(name, value)
+            column[index] = value
+            self._columns[name] = column
+            self._readers[name] = column_reader(column)
+
+    def _promote_column(self, name: str, value: Any) -> np.ndarray:
+        """Returns a numeric column which is able to hold the value without loss"""
+        column = self._columns[name]
+        try:
+            value_array = np.asarray(value)
+        except (ValueError, TypeError):
+            value_array = None
+        if (
+            value_array is None
+            or value_array.dtype.kind not in NUMERIC_KINDS
+            or value_array.shape != column.shape[1:]
+        ):
+            read = self._readers[name]
+            return object_column([read(idx) for idx in range(len(self))])
+        result_type = np.result_type(column.dtype, value_array.dtype)
+        if result_type != column.dtype or not column.flags.writeable:
+            return column.astype(result_type)
+        return column
+
+    def __getstate__(self) -> dict:
+        """Returns the columns for pickling, since the readers cannot be pickled"""
+        return {"columns": self._columns, "length": self._length}
+
+    def __setstate__(self, state: dict) -> None:
+        """Restores the columns and rebuilds their readers"""
+        self._columns = state["columns"]
+        self._length = state["length"]
+        self._readers = {
+            name: column_reader(column) for name, column in self._columns.items()
+        }
+
+    def __iter__(self) -> Iterator["rootflow_datasets.RootflowDataItem"]:
+        """Iterates over the rows as :class:`RootflowDataItem`s."""
+        for index in range(len(self)):
+            yield self[index]
+
+
+def map_values(
+    function: Callable, values: Union[Sequence, np.ndarray], batch_size: int = None
+) -> Union[np.ndarray, list]:
+    """Maps a function over a column of values.
+
+    Without a batch size the function is called on each value. With a batch size, it
+    is instead called on contiguous slices of the values. Numeric numpy values are
+    passed as numpy arrays, so that vectorized functions may be used, while all
+    other values are passed as lists.
+
+    Args:
+        function (Callable): The function to map.
+        values (Union[Sequence, np.ndarray]): The values to map over.
+        batch_size (:obj:`int`, optional): The size of the slices to map over.
+
+    Returns:
+        Union[np.ndarray, list]: The mapped values.
+
+    Raises:
+        AssertionError: If a batched function does not return a sequence of the
+            same length as its inputs.
+    """
+    if batch_size is None:
+        return map_functions_over_batch(values, [function])
+
+    numeric = isinstance(values, np.ndarray) and values.dtype.kind in NUMERIC_KINDS
+    mapped_batches = []
+    for _, batch in batch_enumerate(values, batch_size):
+        if not numeric:
+            batch = list(batch)
+        mapped_batch = function(batch)
+        assert isinstance(mapped_batch, (Sequence, np.ndarray)) and not isinstance(
+            mapped_batch, str
+        ), f"Map function {function.__name__} does not return a sequence over batch"
+        assert len(mapped_batch) == len(
+            batch
+        ), f"Map function {function.__name__} does not return batch of same length as input"
+        mapped_batches.append(mapped_batch)
+    return concatenate_batches(mapped_batches)
+
+
+def apply_map_plan(
+    map_plan: List[Tuple[Callable, int]], values: Union[Sequence, np.ndarray]
+) -> Union[np.ndarray, list]:
+    """Applies a sequence of maps to a column of values in a single pass.
+
+    Args:
+        map_plan (List[Tuple[Callable, int]]): The function and batch size of each
+            map, in the order they should be applied. See :func:`map_values`.
+        values (Union[Sequence, np.ndarray]): The values to map over.
+
+    Returns:
+        Union[np.ndarray, list]: The mapped values.
+    """
+    for function, batch_size in map_plan:
+        values = map_values(function, values, batch_size)
+    return values
+
+
+def concatenate_batches(batches: List[Sequence]) -> Union[np.ndarray, list]:
+    """Concatenates mapped batches into a single column.
+
+    Numeric numpy batches are concatenated directly. Anything else is flattened into
+    a list, to be packed by :func:`pack_column`.
+
+    Args:
+        batches (List[Sequence]): The batches to concatenate, in order.
+
+    Returns:
+        Union[np.ndarray, list]: The concatenated column.
+    """
+    if batches and all(
+        isinstance(batch, np.ndarray) and batch.dtype.kind in NUMERIC_KINDS
+        for batch in batches
+    ):
+        return np.concatenate(batches)
+    return [element for batch in batches for element in batch]
+
+
+class RaggedColumn:
+    """A column of variable length records.
+
+    Stores every record back to back in a single flat array of values, along with an
+    array of offsets marking where each record starts and ends. Records are returned
+    as views of the values, without copying, unless the column has an encoding, in
+    which case the records are bytes which are decoded into strings.
+    """
+
+    def __init__(self, values: np.ndarray, offsets: np.ndarray, encoding: str = None):
+        """Creates a new ragged column.
+
+        Args:
+            values (np.ndarray): The flat array of all record values.
+            offsets (np.ndarray): An array of `len(column) + 1` offsets, where record
+                `i` is `values[offsets[i]:offsets[i + 1]]`.
+            encoding (:obj:`str`, optional): The encoding of string records, or
+                :data:`PICKLE_ENCODING` for records which are pickled objects.
+        """
+        self.values = values
+        self.offsets = offsets
+        self.encoding = encoding
+        self.dtype = np.dtype(object)
+
+    @classmethod
+    def from_records(cls, records: Sequence, encoding: str = None) -> "RaggedColumn":
+        """Creates a ragged column from a sequence of records.
+
+        Args:
+            records (Sequence): The records, either strings or numeric sequences, or
+                any picklable objects when pickled.
+            encoding (:obj:`str`, optional): :data:`PICKLE_ENCODING` to pickle each
+                record. Otherwise strings are encoded as UTF-8.
+
+        Returns:
+            RaggedColumn: The column containing the records.
+        """
+        if encoding == PICKLE_ENCODING:
+            records = [
+                np.frombuffer(
+                    pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL), np.uint8
+                )
+                for record in records
+            ]
+        elif records and isinstance(records[0], str):
+            encoding = "utf-8"
+            records = [
+                np.frombuffer(record.encode(encoding), np.uint8) for record in records
+            ]
+        else:
+            records = [np.asarray(record) for record in records]
+        lengths = np.fromiter(
+            (len(record) for record in records), np.int64, len(records)
+        )
+        offsets = np.zeros(len(records) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if records:
+            values = np.concatenate(records)
+        else:
+            values = np.empty(0, dtype=np.uint8)
+        return cls(values, offsets, encoding)
+
+    def __len__(self) -> int:
+        """Returns the number of records in the column"""
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[np.ndarray, str, list]:
+        """Returns the record at the index, or a list of records for a slice"""
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        record = self.values[self.offsets[index] : self.offsets[index + 1]]
+        if self.encoding == PICKLE_ENCODING:
+            return pickle.loads(record)
+        if self.encoding is not None:
+            return record.tobytes().decode(self.encoding)
+        return record
+
+
+class MemmapStorage(ColumnarStorage):
+    """Columnar storage which is memory mapped from disk.
+
+    Each column is stored in a directory as `.npy` files, and memory mapped when the
+    storage is opened, so that only the pages which are accessed are ever read into
+    memory. Fixed shape numeric columns are stored as a single array, whose rows are
+    returned as views. Variable length columns (such as string ids or sequences of
+    differing lengths) are stored as a :class:`RaggedColumn`, with one flat array of
+    values and one array of offsets.
+
+    Storage directories are created either with :meth:`write`, from columns which are
+    already in memory, or with :meth:`create`, which allocates empty columns on disk
+    which may be filled in a chunk at a time. Since the columns are opened read only
+    by default, mapping over a memory mapped dataset will load the mapped column into
+    memory.
+    """
+
+    def __init__(self, directory: str, mode: str = "r") -> None:
+        """Opens a memory mapped storage directory.
+
+        Args:
+            directory (str): The directory containing the storage.
+            mode (:obj:`str`, optional): The memory map mode, `"r"` for read only or
+                `"r+"` to allow writing to the columns in place.
+
+        Raises:
+            FileNotFoundError: If the directory does not contain a storage.
+        """
+        self.directory = directory
+        self.mode = mode
+        with open(os.path.join(directory, MEMMAP_METADATA_FILE)) as metadata_file:
+            metadata = json.load(metadata_file)
+        columns = [
+            self._open_column(name, metadata["columns"].get(name))
+            for name in COLUMN_NAMES
+        ]
+        super().__init__(*columns)
+        self._length = metadata["length"]
+
+    def _open_column(self, name: str, column_metadata: dict) -> Any:
+        """Memory maps a single column described by its metadata"""
+        if column_metadata is None:
+            return None
+        path = os.path.join(self.directory, name)
+        if column_metadata["kind"] == "ragged":
+            return RaggedColumn(
+                np.load(f"{path}.values.npy", mmap_mode=self.mode),
+                np.load(f"{path}.offsets.npy", mmap_mode=self.mode),
+                column_metadata.get("encoding"),
+            )
+        if column_metadata["kind"] == "object":
+            return np.load(f"{path}.npy", allow_pickle=True)
+        return np.load(f"{path}.npy", mmap_mode=self.mode)
+
+    @classmethod
+    def write(
+        cls,
+        directory: str,
+        ids: Any = None,
+        data: Any = None,
+        targets: Any = None,
+        allow_objects: bool = False,
+    ) -> "MemmapStorage":
+        """Writes columns to a storage directory and opens it.
+
+        Numeric columns of a fixed shape are written as single arrays, while strings
+        and sequences of differing lengths are written as ragged columns. Any other
+        values (such as dictionaries) cannot be memory mapped, but may be pickled
+        into an object array instead, which is loaded whole when the storage is
+        opened.
+
+        Args:
+            directory (str): The directory to write to, created if it does not exist.
+            ids (:obj:`Any`, optional): The id column, or a sequence of ids.
+            data (Any): The data column, or a sequence of data.
+            targets (:obj:`Any`, optional): The target column, or a sequence of
+                targets.
+            allow_objects (:obj:`bool`, optional): Whether to pickle columns which
+                cannot be memory mapped, rather than raising an error.
+
+        Returns:
+            MemmapStorage: The opened storage.
+
+        Raises:
+            ValueError: If a column cannot be memory mapped, and objects are not
+                allowed.
+        """
+        os.makedirs(directory, exist_ok=True)
+        columns_metadata = {}
+        length = None
+        for name, values in zip(COLUMN_NAMES, (ids, data, targets)):
+            if values is None:
+                continue
+            if isinstance(values, ColumnarStorage):
+                values = values.column(name)
+            column = (
+                pack_column(values) if isinstance(values, (list, tuple)) else values
+            )
+            if column is None:
+                continue
+            path = os.path.join(directory, name)
+            if isinstance(column, np.ndarray) and column.dtype.kind in NUMERIC_KINDS:
+                np.save(f"{path}.npy", column)
+                columns_metadata[name] = {"kind": "array"}
+            else:
+                if not isinstance(column, RaggedColumn):
+                    records = list(column)
+                    if all(
+                        isinstance(record, (str, Sequence, np.ndarray))
+                        for record in records
+                    ):
+                        column = RaggedColumn.from_records(records)
+                    elif allow_objects:
+                        column = object_column(records)
+                    else:
+                        raise ValueError(
+                            f"Column {name} contains values which cannot be memory mapped"
+                        )
+                if isinstance(column, RaggedColumn):
+                    np.save(f"{path}.values.npy", np.asarray(column.values))
+                    np.save(f"{path}.offsets.npy", np.asarray(column.offsets))
+                    columns_metadata[name] = {
+                        "kind": "ragged",
+                        "encoding": column.encoding,
+                    }
+                else:
+                    np.save(f"{path}.npy", column, allow_pickle=True)
+                    columns_metadata[name] = {"kind": "object"}
+            length = len(column)
+        cls._write_metadata(directory, columns_metadata, length or 0)
+        return cls(directory)
+
+    @classmethod
+    def create(
+        cls,
+        directory: str,
+        length: int,
+        data_shape: tuple = (),
+        data_dtype: str = "float32",
+        target_shape: tuple = None,
+        target_dtype: str = "int64",
+    ) -> "MemmapStorage":
+        """Allocates an empty storage on disk, opened for writing.
+
+        The columns are created without being held in memory, so the storage may be
+        filled in a chunk at a time, by assigning to the arrays returned by
+        :meth:`column`. For example:
+
+            >>> storage = MemmapStorage.create(directory, length, data_shape=(128,))
+            >>> storage.column("data")[start:stop] = features
+
+        Args:
+            directory (str): The directory to create the storage in.
+            length (int): The number of rows in the storage.
+            data_shape (:obj:`tuple`, optional): The shape of each data row.
+            data_dtype (:obj:`str`, optional): The dtype of the data.
+            target_shape (:obj:`tuple`, optional): The shape of each target row, or
+                `None` if the dataset has no targets.
+            target_dtype (:obj:`str`, optional): The dtype of the targets.
+
+        Returns:
+            MemmapStorage: The new storage, opened in `"r+"` mode.
+        """
+        os.makedirs(directory, exist_ok=True)
+        columns_metadata = {}
+        for name, shape, dtype in (
+            ("data", data_shape, data_dtype),
+            ("target", target_shape, target_dtype),
+        ):
+            if shape is None:
+                continue
+            np.lib.format.open_memmap(
+                os.path.join(directory, f"{name}.npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=(length, *shape),
+            ).flush()
+            columns_metadata[name] = {"kind": "array"}
+        cls._write_metadata(directory, columns_metadata, length)
+        return cls(directory, mode="r+")
+
+    @staticmethod
+    def _write_metadata(directory: str, columns_metadata: dict, length: int) -> None:
+        """Writes the storage metadata file"""
+        with open(os.path.join(directory, MEMMAP_METADATA_FILE), "w") as metadata_file:
+            json.dump({"columns": columns_metadata, "length": length}, metadata_file)
+
+    def flush(self) -> None:
+        """Flushes any writes to the memory mapped columns to disk"""
+        for column in self._columns.values():
+            if isinstance(column, np.memmap):
+                column.flush()
+
+    def __getstate__(self) -> dict:
+        """Pickles only the location of the storage, unless columns were replaced"""
+        if any(
+            isinstance(column, np.ndarray) and not isinstance(column, np.memmap)
+            for column in self._columns.values()
+        ):
+            return super().__getstate__()
+        return {"directory": self.directory, "mode": self.mode}
+
+    def __setstate__(self, state: dict) -> None:
+        """Reopens the storage, or restores the columns"""
+        if "directory" in state:
+            self.__init__(state["directory"], state["mode"])
+        else:
+            super().__setstate__(state)
+
+
+class SharedStorage(MemmapStorage):
+    """Columnar storage held in shared memory, for loading with worker processes.
+
+    Data loader workers which are forked from a process holding a list of
+    :class:`RootflowDataItem`s (or object arrays) gradually copy every page of it,
+    since merely reading an item writes to its reference count. With several workers
+    the dataset then ends up in memory once per worker. Instead, every column of a
+    shared storage is a compact buffer without any python objects, memory mapped from
+    a shared memory filesystem (`/dev/shm`):
+        * numeric columns are stored as single arrays.
+        * string columns are stored as UTF-8 :class:`RaggedColumn`s.
+        * columns of numeric numpy arrays are stored as numeric ragged columns.
+        * any other values (such as dictionaries) are pickled into a ragged column of
+          bytes, and unpickled each time they are read.
+
+    Workers read the same pages without copying them, whether they are forked, or
+    started some other way, in which case the storage is pickled as just the location
+    of its columns. The columns are removed once the process which created the
+    storage no longer uses it.
+    """
+
+    @classmethod
+    def from_storage(
+        cls, storage: Union[ColumnarStorage, Sequence] = None
+    ) -> "SharedStorage":
+        """Copies the columns of a storage, or a list of data items, to shared memory.
+
+        Args:
+            storage (Union[ColumnarStorage, Sequence[RootflowDataItem]]): The storage
+                or data items to copy.
+
+        Returns:
+            SharedStorage: The shared storage.
+        """
+        if not isinstance(storage, ColumnarStorage):
+            storage = ColumnarStorage.from_items(storage)
+        directory = tempfile.mkdtemp(
+            prefix="rootflow-shared-", dir=SHARED_MEMORY_DIRECTORY
+        )
+        try:
+            shared_storage = cls.write(
+                directory,
+                *[shareable_column(storage.column(name)) for name in COLUMN_NAMES],
+            )
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        # Only the creating process removes the columns, not forked workers
+        weakref.finalize(
+            shared_storage, _remove_shared_directory, directory, os.getpid()
+        )
+        return shared_storage
+
+
+def shareable_column(column: Any) -> Union[np.ndarray, RaggedColumn, None]:
+    """Converts a column into one which holds no python objects.
+
+    Args:
+        column (Any): A storage column, or `None`.
+
+    Returns:
+        Union[np.ndarray, RaggedColumn, None]: A numeric array or a ragged column,
+            see :class:`SharedStorage`.
+    """
+    if column is None or isinstance(column, RaggedColumn):
+        return column
+    if isinstance(column, np.ndarray) and column.dtype.kind in NUMERIC_KINDS:
+        return column
+    records = list(column)
+    if all(isinstance(record, str) for record in records):
+        return RaggedColumn.from_records(records)
+    if records and all(
+        isinstance(record, np.ndarray)
+        and record.ndim == 1
+        and record.dtype == records[0].dtype
+        for record in records
+    ):
+        if records[0].dtype.kind in NUMERIC_KINDS:
+            return RaggedColumn.from_records(records)
+    return RaggedColumn.from_records(records, encoding=PICKLE_ENCODING)
+
+
+def _remove_shared_directory(directory: str, owner: int) -> None:
+    """Removes the columns of a shared storage, from the process which created them"""
+    if os.getpid() == owner:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class ShardedColumn:
+    """A column which spans the shards of a :class:`ShardedStorage`.
+
+    Elements are read from the shard which holds them, opening the shard the first
+    time it is accessed.
+    """
+
+    def __init__(self, storage: "ShardedStorage", name: str) -> None:
+        """Creates a column over the shards of a storage.
+
+        Args:
+            storage (ShardedStorage): The storage whose shards hold the column.
+            name (str): One of `"id"`, `"data"` or `"target"`.
+        """
+        self.storage = storage
+        self.name = name
+        self.dtype = np.dtype(object)
+
+    def __len__(self) -> int:
+        """Returns the number of elements in the column"""
+        return len(self.storage)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        """Returns the element at the index, or a list of elements for a slice"""
+        if isinstance(index, slice):
+            return self.gather(range(len(self))[index])
+        if index < 0:
+            index += len(self)
+        shard_index, local_index = divmod(index, self.storage.shard_size)
+        shard = self.storage.shard(shard_index)
+        return shard._readers[self.name](local_index)
+
+    def gather(self, indices: Sequence[int]) -> Union[np.ndarray, list]:
+        """Reads multiple elements, gathering from each shard at once.
+
+        The elements are returned as a numpy array if every shard holds the column
+        as a numeric array of the same shape, and as a list otherwise.
+
+        Args:
+            indices (Sequence[int]): The indices of the elements to read.
+
+        Returns:
+            Union[np.ndarray, list]: The gathered elements.
+        """
+        shard_size = self.storage.shard_size
+        if isinstance(indices, range) and indices.step == 1:
+            first_shard = indices.start // shard_size
+            if indices.stop <= (first_shard + 1) * shard_size:
+                # Contiguous ranges within a shard are read as a slice
+                return self._gather_shard(
+                    first_shard,
+                    range(
+                        indices.start - first_shard * shard_size,
+                        indices.stop - first_shard * shard_size,
+                    ),
+                )
+        indices = np.asarray(indices, dtype=np.int64)
+        shard_indices, local_indices = np.divmod(indices, shard_size)
+        order = np.argsort(shard_indices, kind="stable")
+        boundaries = np.flatnonzero(np.diff(shard_indices[order])) + 1
+        positions, batches = [], []
+        for group in np.split(order, boundaries) if len(order) else []:
+            positions.append(group)
+            batches.append(
+                self._gather_shard(shard_indices[group[0]], local_indices[group])
+            )
+        return merge_batches(positions, batches, len(indices))
+
+    def _gather_shard(
+        self, shard_index: int, local_indices: Sequence[int]
+    ) -> Union[np.ndarray, list]:
+        """Gathers elements from a single shard"""
+        values = self.storage.shard(shard_index).gather(self.name, local_indices)
+        if values is None:
+            return [None] * len(local_indices)
+        return values
+
+
+class ShardedStorage(ColumnarStorage):
+    """Columnar storage which is split across fixed size shards on disk.
+
+    A sharded storage directory holds a manifest, listing the length of the storage,
+    the size of each shard and any metadata of the dataset it was saved from, and a
+    subdirectory for each shard, holding a :class:`MemmapStorage`. Shards are only
+    opened (and memory mapped) when they are first accessed, and any element may be
+    read without reading the shards before it, so that large saved datasets are quick
+    to open and only use memory for the rows which are read.
+
+    Storage directories are written a shard at a time, with :func:`write_shard` and
+    :meth:`write_manifest`, usually by :meth:`FunctionalDataset.save`. The manifest is
+    written last, so a directory without one does not hold a complete storage.
+
+    Attributes:
+        directory (str): The directory containing the storage.
+        shard_size (int): The number of rows in each shard, except the last.
+        metadata (dict): The metadata stored in the manifest.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """Opens a sharded storage directory, without opening any of its shards.
+
+        Args:
+            directory (str): The directory containing the storage.
+
+        Raises:
+            FileNotFoundError: If the directory does not contain a storage.
+            ValueError: If the storage was written with an unsupported format.
+        """
+        self.directory = directory
+        manifest = self.read_manifest(directory)
+        self.shard_size = manifest["shard_size"]
+        self.metadata = manifest["metadata"]
+        self._shard_directories = [shard["directory"] for shard in manifest["shards"]]
+        self._shards = [None] * len(self._shard_directories)
+        self._columns = {}
+        self._readers = {}
+        self._length = manifest["length"]
+        for name in COLUMN_NAMES:
+            self.set_column(
+                name, ShardedColumn(self, name) if name in manifest["columns"] else None
+            )
+
+    @staticmethod
+    def read_manifest(directory: str) -> dict:
+        """Reads the manifest of a sharded storage directory.
+
+        Args:
+            directory (str): The directory containing the storage.
+
+        Returns:
+            dict: The manifest.
+
+        Raises:
+            FileNotFoundError: If the directory does not contain a storage.
+            ValueError: If the storage was written with an unsupported format.
+        """
+        with open(os.path.join(directory, SHARD_MANIFEST_FILE)) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("version") != SHARD_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported sharded storage version {manifest.get('version')} in '{directory}', expected {SHARD_FORMAT_VERSION}"
+            )
+        return manifest
+
+    @staticmethod
+    def write_manifest(
+        directory: str,
+        shard_size: int,
+        shard_results: Sequence[Tuple[str, int, List[str]]],
+        metadata: dict = None,
+    ) -> None:
+        """Writes the manifest of a sharded storage, once every shard is written.
+
+        Args:
+            directory (str): The directory containing the shards.
+            shard_size (int): The number of rows in each shard, except the last.
+            shard_results (Sequence[Tuple[str, int, List[str]]]): The result of
+                :func:`write_shard` for each shard, in order.
+            metadata (:obj:`dict`, optional): JSON serializable metadata to store
+                alongside the shards.
+        """
+        columns = sorted({name for _, _, names in shard_results for name in names})
+        manifest = {
+            "version": SHARD_FORMAT_VERSION,
+            "length": sum(length for _, length, _ in shard_results),
+            "shard_size": shard_size,
+            "columns": columns,
+            "shards": [
+                {"directory": shard_directory, "length": length}
+                for shard_directory, length, _ in shard_results
+            ],
+            "metadata": metadata or {},
+        }
+        path = os.path.join(directory, SHARD_MANIFEST_FILE)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary_path, path)
+
+    @property
+    def num_shards(self) -> int:
+        """The number of shards in the storage"""
+        return len(self._shards)
+
+    def shard(self, shard_index: int) -> MemmapStorage:
+        """Returns a shard, opening it if it has not been opened yet"""
+        shard = self._shards[shard_index]
+        if shard is None:
+            shard = MemmapStorage(
+                os.path.join(self.directory, self._shard_directories[shard_index])
+            )
+            self._shards[shard_index] = shard
+        return shard
+
+    def __getstate__(self) -> dict:
+        """Pickles only the location of the storage, unless columns were replaced"""
+        if any(
+            column is not None and not isinstance(column, ShardedColumn)
+            for column in self._columns.values()
+        ):
+            return super().__getstate__()
+        return {"directory": self.directory}
+
+    def __setstate__(self, state: dict) -> None:
+        """Reopens the storage, or restores the columns"""
+        if "directory" in state:
+            self.__init__(state["directory"])
+        else:
+            super().__setstate__(state)
+
+
+def shard_directory_name(shard_index: int) -> str:
+    """Returns the name of a shard's directory within a sharded storage"""
+    return f"shard-{shard_index:05d}"
+
+
+def write_shard(shard: Tuple[str, Any, Any, Any]) -> Tuple[str, int, List[str]]:
+    """Writes the columns of a single shard of a sharded storage.
+
+    Columns are written with :meth:`MemmapStorage.write`, pickling any columns which
+    cannot be memory mapped.
+
+    Args:
+        shard (Tuple[str, Any, Any, Any]): The shard's directory, and its ids, data
+            and targets.
+
+    Returns:
+        Tuple[str, int, List[str]]: The name of the shard's directory, the number of
+            rows in the shard and the names of the columns which were written, see
+            :meth:`ShardedStorage.write_manifest`.
+    """
+    directory, ids, data, targets = shard
+    storage = MemmapStorage.write(directory, ids, data, targets, allow_objects=True)
+    columns = [name for name in COLUMN_NAMES if storage.column(name) is not None]
+    return (os.path.basename(directory), len(ids), columns)
@@ -0,0 +1,338 @@
+"""Chunked CSV loading for rootflow datasets.
+
+Houses :func:`read_csv`, which parses a CSV file straight into a
+:class:`ColumnarStorage`, for use in :meth:`RootflowDataset.prepare_data`. Rather
+than reading every row of the file into memory as strings and building data items
+one at a time, the file is parsed a chunk of rows at a time, and each column of the
+chunk is converted to its type at once. (For example, a chunk of a float column is
+converted with a single numpy call) Only the typed columns are kept, so the raw string
+rows of at most one chunk (per worker) are held in memory at any time.
+
+Large files may be parsed in worker processes, each of which reads and converts its
+own range of bytes of the file, and returns only the typed columns. See
+:mod:`setkit.datasets.base.parallel`.
+
+Attributes:
+    CSV_CHUNK_ROWS: The number of rows parsed at a time, when not using worker
+        processes.
+    CSV_CHUNK_BYTES: The number of bytes of the file parsed by each chunk, when using
+        worker processes.
+    TRUE_STRINGS: The (lowercase) strings which are parsed as `True` by the `"bool"`
+        type. Anything else is `False`.
+"""
+
+from functools import partial
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Iterator,
+    List,
+    Mapping,
+    Sequence,
+    Tuple,
+    Union,
+)
+import csv
+import io
+import os
+import numpy as np
+
+from setkit.datasets.base.parallel import chunk_slices, run_chunks
+from setkit.datasets.base.storage import (
+    ColumnarStorage,
+    NUMERIC_KINDS,
+    concatenate_batches,
+)
+
+CSV_CHUNK_ROWS = 65536
+CSV_CHUNK_BYTES = 1 << 24
+TRUE_STRINGS = ("1", "true", "t", "yes", "y")
+
+ColumnSpec = Union[str, Sequence[str], Mapping[str, str], None]
+ColumnType = Union[str, Callable[[str], Any]]
+
+
+def read_csv(
+    path: str,
+    data: ColumnSpec,
+    id: str = None,
+    target: ColumnSpec = None,
+    types: Mapping[str, ColumnType] = None,
+    num_workers: int = 0,
+    chunk_size: int = None,
+    encoding: str = "utf-8",
+    **reader_options,
+) -> ColumnarStorage:
+    """Reads a CSV file with a header row into columnar storage.
+
+    The data and targets may each be given as a single column name, in which case
+    each value is that column's value, a list of column names, in which case each
+    value is a numpy array of those columns (when they are all numeric) or a list, or
+    a mapping from names to column names, in which case each value is a dictionary.
+    For example, a dataset with four float features and two binary tasks:
+
+        >>> read_csv(
+        ...     path,
+        ...     data=["width", "height", "depth", "weight"],
+        ...     id="id",
+        ...     target={"is_large": "large", "is_heavy": "heavy"},
+        ...     types={"width": "float32", ..., "large": "bool", "heavy": "bool"},
+        ... )
+
+    Each column is converted with its type, either a numpy dtype name (such as
+    `"float32"` or `"int64"`), `"bool"`, `"str"` (the default), or a function which
+    is called on each string (such as a label encoding). Empty values of float
+    columns are parsed as NaN.
+
+    Without worker processes, the file is parsed `chunk_size` rows at a time with
+    :mod:`csv`. With worker processes, each worker parses `chunk_size` bytes of the
+    file, so records must not contain quoted newlines.
+
+    Args:
+        path (str): The path of the CSV file.
+        data (Union[str, Sequence[str], Mapping[str, str]]): The data column or
+            columns.
+        id (:obj:`str`, optional): The id column.
+        target (:obj:`Union[str, Sequence[str], Mapping[str, str]]`, optional): The
+            target column or columns.
+        types (:obj:`Mapping[str, Union[str, Callable[[str], Any]]]`, optional): The
+            type of each column, by column name.
+        num_workers (:obj:`int`, optional): The number of worker processes used to
+            parse the file. If 0, the file is parsed in the calling process.
+        chunk_size (:obj:`int`, optional): The number of rows parsed in each chunk,
+            or with worker processes the number of bytes. Defaults to
+            :data:`CSV_CHUNK_ROWS` or :data:`CSV_CHUNK_BYTES`.
+        encoding (:obj:`str`, optional): The encoding of the file.
+        **reader_options: Passed to :func:`csv.reader`, such as `delimiter`.
+
+    Returns:
+        ColumnarStorage: The ids, data and targets of every row.
+
+    Raises:
+        ValueError: If a column is not in the header, or a value cannot be
+            converted to the type of its column.
+        RuntimeError: If parsing fails in a worker process.
+    """
+    with open(path, newline="", encoding=encoding) as csv_file:
+        header = next(csv.reader(csv_file, **reader_options), [])
+    schema = CsvSchema(header, id, data, target, types or {})
+    if num_workers <= 0:
+        chunks = _parse_rows(
+            path, schema, chunk_size or CSV_CHUNK_ROWS, encoding, reader_options
+        )
+    else:
+        with open(path, "rb") as csv_file:
+            csv_file.readline()
+            data_start = csv_file.tell()
+            file_size = os.fstat(csv_file.fileno()).st_size
+        byte_slices = [
+            slice(data_start + chunk.start, data_start + chunk.stop)
+            for chunk in chunk_slices(
+                file_size - data_start,
+                num_workers,
+                chunk_size=chunk_size or CSV_CHUNK_BYTES,
+            )
+        ]
+        chunks = run_chunks(
+            partial(_parse_byte_range, path, schema, encoding, reader_options),
+            byte_slices,
+            lambda byte_slice: byte_slice,
+            num_workers,
+            description=f"Reading {os.path.basename(path)}",
+        )
+    ids, data_values, targets = [], [], []
+    for chunk_ids, chunk_data, chunk_targets in chunks:
+        ids.append(chunk_ids)
+        data_values.append(chunk_data)
+        targets.append(chunk_targets)
+    return ColumnarStorage(
+        *[
+            None if not batches or batches[0] is None else concatenate_batches(batches)
+            for batches in (ids, data_values, targets)
+        ]
+    )
+
+
+class CsvSchema:
+    """Converts chunks of CSV rows into typed id, data and target columns.
+
+    Attributes:
+        positions (Dict[str, int]): The position of each column in a row, by name.
+        id (str): The id column.
+        data (Union[str, Sequence[str], Mapping[str, str]]): The data columns.
+        target (Union[str, Sequence[str], Mapping[str, str]]): The target columns.
+        types (Mapping[str, Union[str, Callable[[str], Any]]]): The type of each
+            column, see :func:`read_csv`.
+    """
+
+    def __init__(
+        self,
+        header: Sequence[str],
+        id: str,
+        data: ColumnSpec,
+        target: ColumnSpec,
+        types: Mapping[str, ColumnType],
+    ) -> None:
+        """Creates a schema for a CSV file.
+
+        Args:
+            header (Sequence[str]): The column names of the file.
+            id (str): The id column, or `None`.
+            data (Union[str, Sequence[str], Mapping[str, str]]): The data columns.
+            target (Union[str, Sequence[str], Mapping[str, str]]): The target
+                columns, or `None`.
+            types (Mapping[str, Union[str, Callable[[str], Any]]]): The type of each
+                column.
+
+        Raises:
+            ValueError: If a column is not in the header.
+        """
+        self.positions = {name: position for position, name in enumerate(header)}
+        self.id = id
+        self.data = data
+        self.target = target
+        self.types = types
+        for spec in (id, data, target):
+            for name in _column_names(spec):
+                if name not in self.positions:
+                    raise ValueError(
+                        f"Column {name} is not in the CSV header, expected one of {list(header)}"
+                    )
+
+    def convert(self, rows: List[List[str]]) -> Tuple[Any, Any, Any]:
+        """Converts a chunk of rows into its ids, data and targets.
+
+        Args:
+            rows (List[List[str]]): The rows of the chunk, as parsed by
+                :func:`csv.reader`.
+
+        Returns:
+            Tuple[Any, Any, Any]: The ids, data and targets of the chunk, as numpy
+                arrays where they are numeric, and lists otherwise.
+        """
+        return (
+            self._assemble(rows, self.id),
+            self._assemble(rows, self.data),
+            self._assemble(rows, self.target),
+        )
+
+    def _assemble(
+        self, rows: List[List[str]], spec: ColumnSpec
+    ) -> Union[np.ndarray, list, None]:
+        """Converts the columns of a spec, and combines them into one value per row"""
+        if spec is None:
+            return None
+        if isinstance(spec, str):
+            return self._column(rows, spec)
+        if isinstance(spec, Mapping):
+            keys = list(spec)
+            columns = [_as_list(self._column(rows, spec[key])) for key in keys]
+            return [dict(zip(keys, values)) for values in zip(*columns)]
+        columns = [self._column(rows, name) for name in spec]
+        if all(
+            isinstance(column, np.ndarray) and column.dtype.kind in NUMERIC_KINDS
+            for column in columns
+        ):
+            return np.stack(columns, axis=1) if columns else None
+        return [list(values) for values in zip(*map(_as_list, columns))]
+
+    def _column(self, rows: List[List[str]], name: str) -> Union[np.ndarray, list]:
+        """Converts a single column of a chunk to its type"""
+        position = self.positions[name]
+        try:
+            return convert_column(
+                [row[position] for row in rows], self.types.get(name, "str")
+            )
+        except ValueError as error:
+            raise ValueError(f"Could not convert column {name}: {error}") from error
+
+
+def convert_column(
+    values: List[str], column_type: ColumnType
+) -> Union[np.ndarray, list]:
+    """Converts a column of strings to a type.
+
+    Args:
+        values (List[str]): The values of the column.
+        column_type (Union[str, Callable[[str], Any]]): A numpy dtype name, `"bool"`,
+            `"str"` or a function which converts a single value.
+
+    Returns:
+        Union[np.ndarray, list]: A numpy array for numpy dtypes and `"bool"`, or a
+            list of values otherwise.
+
+    Raises:
+        ValueError: If a value cannot be converted.
+    """
+    if callable(column_type):
+        return [column_type(value) for value in values]
+    if column_type == "str":
+        return values
+    if column_type == "bool":
+        strings = np.asarray(values, dtype=str)
+        return np.isin(np.char.lower(np.char.strip(strings)), TRUE_STRINGS)
+    dtype = np.dtype(column_type)
+    if dtype.kind == "f" and "" in values:
+        values = ["nan" if value == "" else value for value in values]
+    # Numpy parses the strings directly, which is faster than through a string array
+    return np.array(values, dtype=dtype)
+
+
+def _column_names(spec: ColumnSpec) -> List[str]:
+    """Returns the names of the columns in a spec"""
+    if spec is None:
+        return []
+    if isinstance(spec, str):
+        return [spec]
+    if isinstance(spec, Mapping):
+        return list(spec.values())
+    return list(spec)
+
+
+def _as_list(column: Union[np.ndarray, list]) -> list:
+    """Converts a column to a list of python values"""
+    return column.tolist() if isinstance(column, np.ndarray) else column
+
+
+def _parse_rows(
+    path: str,
+    schema: CsvSchema,
+    chunk_rows: int,
+    encoding: str,
+    reader_options: dict,
+) -> Iterator[Tuple[Any, Any, Any]]:
+    """Parses a CSV file a chunk of rows at a time, yielding the converted chunks"""
+    with open(path, newline="", encoding=encoding) as csv_file:
+        reader = csv.reader(csv_file, **reader_options)
+        next(reader, None)
+        while True:
+            chunk = list(islice(reader, chunk_rows))
+            if not chunk:
+                return
+            # Blank lines are skipped, and a chunk of only blank lines is not the end
+            rows = [row for row in chunk if row]
+            if rows:
+                yield schema.convert(rows)
+
+
+def _parse_byte_range(
+    path: str,
+    schema: CsvSchema,
+    encoding: str,
+    reader_options: dict,
+    byte_slice: slice,
+) -> Tuple[Any, Any, Any]:
+    """Parses the rows which start within a range of bytes of a CSV file"""
+    with open(path, "rb") as csv_file:
+        # Skip the end of the row which started before the range
+        csv_file.seek(byte_slice.start - 1)
+        csv_file.readline()
+        lines = []
+        while csv_file.tell() < byte_slice.stop:
+            line = csv_file.readline()
+            if not line:
+                break
+            lines.append(line)
+    text = io.StringIO(b"".join(lines).decode(encoding), newline="")
+    return schema.convert([row for row in csv.reader(text, **reader_options) if row])
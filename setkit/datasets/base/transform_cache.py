@@ -0,0 +1,274 @@
+"""Caching of transform results for rootflow datasets.
+
+Houses a process wide, memory budgeted, least recently used cache for the results of
+dataset transforms. Datasets opt in with :meth:`FunctionalDataset.cache_transforms`,
+after which the transformed data and targets of each item are kept in the cache, keyed
+by the dataset, the index of the item and the transform stage (`"data"` or
+`"target"`). Every dataset shares the one cache, so a single memory limit applies to
+all of them, which may be changed with :func:`set_transform_cache_limit`.
+
+Transforms which should produce a different result each time they are called, such as
+random augmentations, should be marked with :func:`nondeterministic`. Only the
+transforms before the first nondeterministic transform are cached, the rest are run
+on every access.
+
+Cached values are returned as is, not copied, so transforms which come after the
+cached stage should not modify their inputs in place.
+
+Attributes:
+    DEFAULT_TRANSFORM_CACHE_BYTES: The default memory limit of the cache.
+"""
+
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Callable, Hashable, Sequence, Tuple, Union
+import sys
+import threading
+import numpy as np
+import torch
+
+from setkit.datasets.base.pipeline import TransformPipeline
+
+DEFAULT_TRANSFORM_CACHE_BYTES = 1 << 29
+
+_cache_owners = count()
+
+
+class TransformCache:
+    """A least recently used cache, bounded by the memory used by its values.
+
+    Attributes:
+        max_bytes (int): The memory limit of the cache, in bytes.
+        used_bytes (int): The estimated memory used by the cached values, in bytes.
+        hits (int): The number of lookups which found a cached value.
+        misses (int): The number of lookups which did not.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_TRANSFORM_CACHE_BYTES) -> None:
+        """Creates an empty cache.
+
+        Args:
+            max_bytes (:obj:`int`, optional): The memory limit of the cache, in bytes.
+        """
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Returns the number of cached values"""
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Looks up a value, marking it as most recently used.
+
+        Args:
+            key (Hashable): The key of the value.
+
+        Returns:
+            Tuple[bool, Any]: Whether the value was found, and the value if it was.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return (False, None)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return (True, entry[0])
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Caches a value, evicting the least recently used values to make room.
+
+        Values which are larger than the whole memory limit are not cached.
+
+        Args:
+            key (Hashable): The key of the value.
+            value (Any): The value to cache.
+        """
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous_entry = self._entries.pop(key, None)
+            if previous_entry is not None:
+                self.used_bytes -= previous_entry[1]
+            self._entries[key] = (value, size)
+            self.used_bytes += size
+            self._evict()
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        """Changes the memory limit, evicting values if it is now exceeded"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        """Removes every cached value"""
+        with self._lock:
+            self._entries.clear()
+            self.used_bytes = 0
+
+    def _evict(self) -> None:
+        """Removes the least recently used values until within the memory limit"""
+        while self.used_bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.used_bytes -= size
+
+
+_transform_cache = TransformCache()
+
+
+def get_transform_cache() -> TransformCache:
+    """Returns the transform cache shared by every dataset in the process"""
+    return _transform_cache
+
+
+def set_transform_cache_limit(max_bytes: int) -> None:
+    """Sets the memory limit of the shared transform cache, in bytes"""
+    _transform_cache.set_max_bytes(max_bytes)
+
+
+def new_cache_owner() -> int:
+    """Returns a unique identifier for a dataset's entries in the cache"""
+    return next(_cache_owners)
+
+
+def nondeterministic(function: Callable) -> Callable:
+    """Marks a transform as nondeterministic, so that its results are never cached.
+
+    May be used as a decorator. Sets the `deterministic` attribute of the function.
+
+    Args:
+        function (Callable): The transform to mark.
+
+    Returns:
+        Callable: The same transform.
+    """
+    function.deterministic = False
+    return function
+
+
+def cacheable_length(functions: Sequence[Callable]) -> int:
+    """Returns the number of transforms before the first nondeterministic transform"""
+    for position, function in enumerate(functions):
+        if not getattr(function, "deterministic", True):
+            return position
+    return len(functions)
+
+
+def estimate_size(value: Any) -> int:
+    """Estimates the memory used by a value, in bytes.
+
+    Numpy arrays and torch tensors are measured by their buffers, and containers by
+    their contents.
+
+    Args:
+        value (Any): The value to measure.
+
+    Returns:
+        int: The estimated size of the value.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes + sys.getsizeof(value) * (value.base is None)
+    if isinstance(value, torch.Tensor):
+        return value.element_size() * value.nelement() + sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(element) for element in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(key) + estimate_size(element)
+            for key, element in value.items()
+        )
+    return sys.getsizeof(value)
+
+
+def cached_transform(
+    key: Tuple, index: int, value: Any, pipeline: TransformPipeline, length: int
+) -> Any:
+    """Applies a transform pipeline to a value, using the shared cache where possible.
+
+    Args:
+        key (Tuple): Identifies the dataset and transform stage.
+        index (int): The index of the item in the dataset.
+        value (Any): The untransformed value.
+        pipeline (TransformPipeline): The transforms to apply.
+        length (int): The length of the dataset, which negative indices count back
+            from, so that each item is cached under a single index.
+
+    Returns:
+        Any: The transformed value.
+    """
+    cached_pipeline, uncached_pipeline = pipeline.split(
+        cacheable_length(pipeline.functions)
+    )
+    if cached_pipeline:
+        item_key = key + (_position(index, length),)
+        found, cached_value = _transform_cache.get(item_key)
+        if found:
+            value = cached_value
+        else:
+            value = cached_pipeline(value)
+            _transform_cache.put(item_key, value)
+    return uncached_pipeline(value)
+
+
+def cached_transform_batch(
+    key: Tuple,
+    indices: Sequence[int],
+    values: Any,
+    pipeline: TransformPipeline,
+    length: int,
+) -> Union[list, np.ndarray]:
+    """Applies a transform pipeline to a batch, using the shared cache where possible.
+
+    Only the values which are not already cached are transformed, as a single batch.
+
+    Args:
+        key (Tuple): Identifies the dataset and transform stage.
+        indices (Sequence[int]): The index of each item in the dataset.
+        values (Any): The untransformed values, see :meth:`TransformPipeline.batch`.
+        pipeline (TransformPipeline): The transforms to apply.
+        length (int): The length of the dataset, which negative indices count back
+            from.
+
+    Returns:
+        Union[list, np.ndarray]: The transformed values.
+    """
+    cached_pipeline, uncached_pipeline = pipeline.split(
+        cacheable_length(pipeline.functions)
+    )
+    if not cached_pipeline:
+        return pipeline.batch(values)
+    if isinstance(values, np.ndarray) and values.ndim == 1:
+        values = values.tolist()
+    transformed = [None] * len(indices)
+    # The positions in the batch of each item which is not cached
+    missing = {}
+    for position, index in enumerate(indices):
+        index = _position(index, length)
+        if index in missing:
+            missing[index].append(position)
+            continue
+        found, cached_value = _transform_cache.get(key + (index,))
+        if found:
+            transformed[position] = cached_value
+        else:
+            missing[index] = [position]
+    if missing:
+        missing_values = cached_pipeline.batch(
+            [values[positions[0]] for positions in missing.values()]
+        )
+        for (index, positions), value in zip(missing.items(), missing_values):
+            for position in positions:
+                transformed[position] = value
+            _transform_cache.put(key + (index,), value)
+    return uncached_pipeline.batch(transformed)
+
+
+def _position(index: int, length: int) -> int:
+    """Returns the non-negative position of an index into a dataset"""
+    index = int(index)
+    return index + length if index < 0 else index
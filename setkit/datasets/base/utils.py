@@ -4,9 +4,12 @@ Houses simple utility functions key to the behavior of rootflow datasets.
 """
 
 from typing import Any, Callable, Iterable, Mapping, Sequence, Union, Tuple, List
+import numpy as np
 import torch
 from torch.utils.data.dataloader import default_collate
 
+from setkit.datasets.base.bitmap import IndexBitmap
+
 
 def default_collate_without_key(
     unprocessed_batch: List[dict],
@@ -30,6 +33,51 @@ def default_collate_without_key(
     return default_collate(unprocessed_batch)
 
 
+def collate_columns(
+    column_batch: dict,
+) -> dict:
+    """Collates a batch of columns.
+
+    Converts each column of a batch, as returned by
+    :meth:`FunctionalDataset.index_batch`, into a batched tensor where possible.
+    Numeric numpy columns are converted directly, without inspecting each element,
+    while other columns are collated with torch's `default_collate`. Columns which are
+    `None`, or only contain `None`, are removed from the batch.
+
+    Args:
+        column_batch (dict): A dictionary mapping each key to a column of values.
+
+    Returns:
+        dict: The collated batch.
+    """
+    collated_batch = {}
+    for key, column in column_batch.items():
+        if isinstance(column, np.ndarray) and column.dtype.kind in "biuf":
+            if not column.flags.writeable:
+                column = column.copy()
+            collated_batch[key] = torch.from_numpy(column)
+        elif column is None or all(element is None for element in column):
+            continue
+        else:
+            collated_batch[key] = default_collate(column)
+    return collated_batch
+
+
+def collate_rows(rows: List[dict]) -> dict:
+    """Collates a batch of examples.
+
+    Gathers the examples into columns and collates them with
+    :func:`collate_columns`.
+
+    Args:
+        rows (List[dict]): The examples, each a dictionary with the same keys.
+
+    Returns:
+        dict: The collated batch.
+    """
+    return collate_columns({key: [row[key] for row in rows] for key in rows[0]})
+
+
 def batch(iterable: Iterable, batch_size: int = 1) -> list:
     """Batches an iterable.
 
@@ -90,6 +138,64 @@ def map_functions(obj: object, function_list: Iterable[Callable]) -> Any:
     return value
 
 
+def map_functions_over_batch(
+    batch: Union[list, np.ndarray], function_list: Iterable[Callable]
+) -> list:
+    """Maps multiple functions over each element of a batch.
+
+    One dimensional numpy batches are converted to python scalars first, so that the
+    functions receive the same values they would when indexing a single example.
+
+    Args:
+        batch (Union[list, np.ndarray]): The batch of elements.
+        function_list (Iterable[Callable]): An ordered collection of functions to map.
+
+    Returns:
+        list: The result of the function_list mapped on each element of the batch.
+    """
+    if isinstance(batch, np.ndarray) and batch.ndim == 1:
+        batch = batch.tolist()
+    return [map_functions(element, function_list) for element in batch]
+
+
+def merge_batches(
+    positions: List[np.ndarray], batches: List[Union[list, np.ndarray]], length: int
+) -> Union[list, np.ndarray]:
+    """Merges partial batches into a single batch.
+
+    Places the elements of each partial batch at the given positions of the output.
+    If every partial batch is a numeric numpy array of the same element shape, the
+    output is a numpy array, otherwise it is a list.
+
+    Args:
+        positions (List[np.ndarray]): The output positions of each partial batch.
+        batches (List[Union[list, np.ndarray]]): The partial batches.
+        length (int): The length of the output batch.
+
+    Returns:
+        Union[list, np.ndarray]: The merged batch.
+    """
+    if batches and all(
+        isinstance(batch, np.ndarray)
+        and batch.dtype.kind in "biuf"
+        and batch.shape[1:] == batches[0].shape[1:]
+        for batch in batches
+    ):
+        merged = np.empty(
+            (length, *batches[0].shape[1:]), dtype=np.result_type(*batches)
+        )
+        for batch_positions, batch in zip(positions, batches):
+            merged[batch_positions] = batch
+        return merged
+    merged = [None] * length
+    for batch_positions, batch in zip(positions, batches):
+        if isinstance(batch, np.ndarray) and batch.ndim == 1:
+            batch = batch.tolist()
+        for position, element in zip(batch_positions.tolist(), batch):
+            merged[position] = element
+    return merged
+
+
 def get_unique(input_iterator: Iterable, ordered: bool = True) -> list:
     """Returns unique elements.
 
@@ -118,6 +224,152 @@ def get_unique(input_iterator: Iterable, ordered: bool = True) -> list:
         return [item for item in input_iterator if not (item in seen or seen_add(item))]
 
 
+def get_unique_array(indices: np.ndarray, ordered: bool = True) -> np.ndarray:
+    """Returns unique elements of an integer array.
+
+    A vectorized version of :func:`get_unique` for numpy arrays of indices. Arrays
+    which are already strictly increasing, (such as those produced by a boolean
+    mask) are returned without being sorted again.
+
+    Args:
+        indices (np.ndarray): The array which you would like to reduce to only its
+            unique elements.
+        ordered (bool): A flag indicating wether the elements should be sorted. If
+            not, elements will appear in the order of their first appearance.
+
+    Returns:
+        np.ndarray: The unique elements of indices, as an integer array.
+    """
+    indices = np.asarray(indices)
+    if indices.dtype.kind not in "iu":
+        indices = indices.astype(np.int64)
+    if len(indices) < 2 or np.all(indices[1:] > indices[:-1]):
+        return indices
+    if ordered:
+        return np.unique(indices)
+    _, first_occurrences = np.unique(indices, return_index=True)
+    return indices[np.sort(first_occurrences)]
+
+
+def index_array(indices: Sequence[int]) -> np.ndarray:
+    """Packs indices into a compact integer array.
+
+    Indices are stored as 32 bit integers where they all fit, and as 64 bit integers
+    otherwise, rather than as a list of python integers.
+
+    Args:
+        indices (Sequence[int]): The indices, as a list, range or integer array.
+
+    Returns:
+        np.ndarray: The indices, as an int32 or int64 array.
+    """
+    if isinstance(indices, np.ndarray) and indices.dtype == np.int32:
+        return indices
+    if isinstance(indices, range):
+        dtype = np.int32
+        if len(indices) > 0 and not _fits_int32(indices[0], indices[-1]):
+            dtype = np.int64
+        return np.arange(indices.start, indices.stop, indices.step, dtype=dtype)
+    if isinstance(indices, IndexBitmap):
+        return indices.to_array()
+    if not isinstance(indices, np.ndarray):
+        indices = np.fromiter(indices, np.int64, len(indices))
+    elif indices.dtype.kind not in "iu":
+        indices = indices.astype(np.int64)
+    if len(indices) == 0 or _fits_int32(indices.min(), indices.max()):
+        return indices.astype(np.int32)
+    return indices.astype(np.int64, copy=False)
+
+
+def _fits_int32(minimum: int, maximum: int) -> bool:
+    """Whether a range of integers can be held in 32 bits"""
+    int32 = np.iinfo(np.int32)
+    return int32.min <= minimum and maximum <= int32.max
+
+
+def compose_indices(
+    indices: Union[range, np.ndarray, IndexBitmap],
+    positions: Union[Sequence[int], range, IndexBitmap],
+) -> Union[range, np.ndarray, IndexBitmap]:
+    """Selects positions from indices, such as the indices of a view of a view.
+
+    Either may be a range, an array, or a bitmap. A range of a range is composed
+    arithmetically, into another range, and a range of an array or bitmap is a
+    slice of it, so neither is ever expanded into every index. A bitmap of
+    increasing indices is composed a container at a time into another bitmap.
+    Negative positions count from the end of the indices.
+
+    Args:
+        indices (Union[range, np.ndarray, IndexBitmap]): The indices to select from.
+        positions (Union[Sequence[int], range, IndexBitmap]): The positions to
+            select.
+
+    Returns:
+        Union[range, np.ndarray, IndexBitmap]: The selected indices.
+
+    Raises:
+        IndexError: If a position is out of range.
+    """
+    length = len(indices)
+    if isinstance(positions, IndexBitmap):
+        if len(positions) > 0 and positions[-1] >= length:
+            raise IndexError(f"Index out of range for {length} indices")
+        if _is_increasing(indices):
+            return IndexBitmap.from_sorted_chunks(
+                compose_indices(indices, chunk) for chunk in positions.chunks()
+            )
+        positions = positions.to_array()
+    if isinstance(positions, range) and len(positions) > 0:
+        first, last = positions[0], positions[-1]
+        if min(first, last) < 0 or max(first, last) >= length:
+            positions = index_array(positions)
+    if isinstance(positions, range):
+        if isinstance(indices, range):
+            return range(
+                indices.start + indices.step * positions.start,
+                indices.start + indices.step * positions.stop,
+                indices.step * positions.step,
+            )
+        # A negative stop of a normalized range is before the first position
+        stop = positions.stop if positions.stop >= 0 else None
+        return indices[positions.start : stop : positions.step]
+    positions = index_array(positions)
+    if len(positions) > 0 and (positions.min() < -length or positions.max() >= length):
+        raise IndexError(f"Index out of range for {length} indices")
+    if isinstance(indices, range):
+        positions = np.where(positions < 0, positions + length, positions)
+        return index_array(indices.start + indices.step * positions.astype(np.int64))
+    return indices[positions]
+
+
+def search_indices(sorted_indices: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Finds the positions of values in an array of strictly increasing indices.
+
+    Args:
+        sorted_indices (np.ndarray): The strictly increasing indices to search.
+        values (np.ndarray): The values to find.
+
+    Returns:
+        np.ndarray: The position of each value, or -1 where the value is not one of
+            the indices.
+    """
+    values = np.asarray(values)
+    if len(sorted_indices) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+    positions = np.searchsorted(sorted_indices, values)
+    positions = np.minimum(positions, len(sorted_indices) - 1)
+    return np.where(sorted_indices[positions] == values, positions, -1)
+
+
+def _is_increasing(indices: Union[range, np.ndarray, IndexBitmap]) -> bool:
+    """Whether indices are non-negative and strictly increasing, as in a bitmap"""
+    if isinstance(indices, IndexBitmap) or len(indices) == 0:
+        return True
+    if isinstance(indices, range):
+        return indices.start >= 0 and (indices.step > 0 or len(indices) == 1)
+    return indices[0] >= 0 and bool(np.all(indices[1:] > indices[:-1]))
+
+
 def get_nested_data_types(object: Any) -> Union[dict, list, type]:
     """Returns the types of potentially nested structures.
 
@@ -142,7 +394,7 @@ def get_nested_data_types(object: Any) -> Union[dict, list, type]:
         return type(object)
 
 
-def infer_task_from_targets(target_list: list) -> Tuple[str, tuple]:
+def infer_task_from_targets(target_list: Iterable) -> Tuple[str, tuple]:
     """Infers the type and shape of a task.
 
     Infers the supervised task type and shape given a list of task targets.
@@ -150,48 +402,245 @@ def infer_task_from_targets(target_list: list) -> Tuple[str, tuple]:
     and `"regression"`. (`"multitarget"` is a multitarget binary classification task).
     If the targets are not of the types and shapes expected for any of the above
     mentioned task types, then the function will instead return None for the type.
+    See :class:`TaskAccumulator`.
 
     Args:
-        target_list (list): A list of targets for a particular supervised task.
+        target_list (Iterable): The targets for a particular supervised task.
 
     Returns:
         Tuple[str, tuple]: A tuple containing, respectively, the string corresponding
             to the type of task and a tuple which describes the shape of the target,
             given the infered task.
     """
-    if not target_list:
+    accumulator = TaskAccumulator()
+    accumulator.update(
+        target_list if isinstance(target_list, np.ndarray) else list(target_list)
+    )
+    if accumulator.count == 0:
         return None
+    return accumulator.result()
+
+
+class TaskAccumulator:
+    """Accumulates the information needed to infer a task, in a single pass.
+
+    Targets are added in chunks with :meth:`update`, and accumulators for separate
+    chunks may be combined with :meth:`merge`, so that a task can be inferred from a
+    chunked (or parallel) pass over the targets, or from a sample of them. Chunks
+    given as numeric numpy arrays are summarized with vectorized operations.
+
+    Only the kind of the targets, (e.g. integers, or sequences of floats) their
+    length and their largest values are kept:
+        * integers are a `"classification"` task, or `"binary"` if none exceed 1,
+          with the largest class as the shape.
+        * booleans are a `"binary"` task with shape 2.
+        * floats are a `"regression"` task with shape 1.
+        * sequences of floats are a `"regression"` task, sequences of booleans are a
+          `"multitarget"` task, and sequences of integers are a `"classification"`
+          task when they are one-hot, or `"binary"` otherwise, with the length of
+          the sequences as the shape.
+
+    Attributes:
+        count (int): The number of targets accumulated.
+        kind (str): The kind of the targets, `"mixed"` if they disagree.
+        shape (tuple): The shape of the elements of sequence targets.
+        max_value: The largest integer target, or sequence element.
+        max_sum: The largest sum of an integer sequence target.
+    """
 
-    first_target = next(target_list)
-    if isinstance(first_target, Sequence) and not isinstance(first_target, str):
-        first_target_element = next(first_target_element)
-        if isinstance(first_target_element, (int, torch.LongTensor)):
-            # This needs to be adjusted to work with >1D tensors
-            max_element = max([max(target) for target in target_list])
-            if max_element > 1:
-                return ("binary", max_element)
-            max_list_sum = max([sum(target) for target in target_list])
-            if max_list_sum > 1:
-                return ("binary", len(first_target))
-            else:
-                return ("classification", len(first_target))
-        elif isinstance(first_target_element, (bool, torch.BoolTensor)):
-            raise NotImplementedError
-        elif isinstance(first_target_element, float):
-            return ("regression", len(first_target))
-        elif isinstance(first_target_element, torch.FloatTensor):
-            return ("regression", (len(first_target), *first_target_element.shape))
-    elif isinstance(first_target, (int, torch.LongTensor)):
-        max_class_val = max(target_list)
-        if max_class_val > 1:
-            return ("classification", max_class_val)
+    def __init__(self) -> None:
+        self.count = 0
+        self.kind = None
+        self.shape = None
+        self.max_value = None
+        self.max_sum = None
+
+    def update(self, targets: Union[list, np.ndarray]) -> "TaskAccumulator":
+        """Adds a chunk of targets.
+
+        Args:
+            targets (Union[list, np.ndarray]): The targets.
+
+        Returns:
+            TaskAccumulator: Returns `self`.
+        """
+        if len(targets) == 0:
+            return self
+        if isinstance(targets, np.ndarray) and targets.dtype.kind in "biuf":
+            self._update_array(targets)
         else:
-            return ("binary", max_class_val)
-    elif isinstance(first_target, (bool, torch.BoolTensor)):
-        return ("binary", 2)
-    elif isinstance(first_target, float):
-        return ("regression", 1)
-    elif isinstance(first_target, torch.FloatTensor):
-        return ("regression", first_target.shape)
-    else:
+            self._update_values(targets)
+        return self
+
+    def _update_array(self, targets: np.ndarray) -> None:
+        """Summarizes a numeric array of targets with vectorized operations"""
+        dtype_kind = targets.dtype.kind
+        element_kind = {"b": "bool", "i": "int", "u": "int", "f": "float"}[dtype_kind]
+        if targets.ndim == 1:
+            self._observe(element_kind, None, len(targets))
+        else:
+            self._observe(f"{element_kind}s", targets.shape[1:], len(targets))
+        if element_kind == "int":
+            flat_targets = targets.reshape(len(targets), -1)
+            self._observe_values(
+                int(flat_targets.max()),
+                int(flat_targets.sum(axis=1).max()) if targets.ndim > 1 else None,
+            )
+
+    def _update_values(self, targets: Sequence) -> None:
+        """Summarizes a list of targets"""
+        for target in targets:
+            if isinstance(target, (torch.Tensor, np.ndarray, np.generic)):
+                if target.ndim == 0:
+                    target = target.item()
+                else:
+                    target = target.tolist()
+            if isinstance(target, bool):
+                self._observe("bool", None, 1)
+            elif isinstance(target, int):
+                self._observe("int", None, 1)
+                self._observe_values(target, None)
+            elif isinstance(target, float):
+                self._observe("float", None, 1)
+            elif isinstance(target, Sequence) and not isinstance(target, str):
+                element_kind = _scalar_kind(target[0]) if len(target) else None
+                self._observe(f"{element_kind}s", (len(target),), 1)
+                if element_kind == "int":
+                    self._observe_values(max(target), sum(target))
+            else:
+                self._observe("other", None, 1)
+
+    def _observe(self, kind: str, shape: Union[tuple, None], count: int) -> None:
+        """Records the kind and shape of some targets"""
+        if self.kind is None:
+            self.kind, self.shape = kind, shape
+        elif self.kind != kind or self.shape != shape:
+            self.kind = "mixed"
+        self.count += count
+
+    def _observe_values(self, max_value: int, max_sum: Union[int, None]) -> None:
+        """Records the largest values of some integer targets"""
+        if self.max_value is None or max_value > self.max_value:
+            self.max_value = max_value
+        if max_sum is not None and (self.max_sum is None or max_sum > self.max_sum):
+            self.max_sum = max_sum
+
+    def merge(self, other: "TaskAccumulator") -> "TaskAccumulator":
+        """Combines the targets accumulated by another accumulator into this one.
+
+        Args:
+            other (TaskAccumulator): The accumulator to merge.
+
+        Returns:
+            TaskAccumulator: Returns `self`.
+        """
+        if other.count == 0:
+            return self
+        self._observe(other.kind, other.shape, other.count)
+        if other.max_value is not None:
+            self._observe_values(other.max_value, other.max_sum)
+        return self
+
+    def result(self) -> Tuple[str, Any]:
+        """Infers the type and shape of the task from the accumulated targets.
+
+        Returns:
+            Tuple[str, Any]: The type and shape of the task, or `(None, None)` if the
+                targets are not of a supported kind.
+        """
+        if self.kind == "int":
+            if self.max_value > 1:
+                return ("classification", self.max_value)
+            return ("binary", self.max_value)
+        if self.kind == "bool":
+            return ("binary", 2)
+        if self.kind == "float":
+            return ("regression", 1)
+        shape = self.shape[0] if self.shape and len(self.shape) == 1 else self.shape
+        if self.kind == "ints":
+            if self.max_value > 1 or self.max_sum > 1:
+                return ("binary", shape)
+            return ("classification", shape)
+        if self.kind == "bools":
+            return ("multitarget", shape)
+        if self.kind == "floats":
+            return ("regression", shape)
         return (None, None)
+
+
+def _scalar_kind(value: Any) -> Union[str, None]:
+    """Returns the kind of a scalar target element"""
+    if isinstance(value, (torch.Tensor, np.ndarray, np.generic)):
+        value = value.item() if value.ndim == 0 else None
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    return None
+
+
+def accumulate_tasks(
+    task_names: Union[List[str], None], targets: Union[list, np.ndarray]
+) -> List[TaskAccumulator]:
+    """Accumulates a chunk of targets for each task.
+
+    Args:
+        task_names (Union[List[str], None]): The names of each task, for targets which
+            are mappings, or `None` for single task targets.
+        targets (Union[list, np.ndarray]): A chunk of targets.
+
+    Returns:
+        List[TaskAccumulator]: An accumulator for each task.
+    """
+    if task_names is None:
+        return [TaskAccumulator().update(targets)]
+    return [
+        TaskAccumulator().update([target[task_name] for target in targets])
+        for task_name in task_names
+    ]
+
+
+def combine_tasks(
+    task_lists: Iterable[Union[List[dict], None]],
+) -> Union[List[dict], None]:
+    """Returns the unique tasks from multiple lists of tasks.
+
+    Merges lists of tasks, (as returned by :meth:`FunctionalDataset.tasks`) keeping
+    the first occurence of each task name. Task lists which are `None`, for datasets
+    without targets, are skipped.
+
+    Args:
+        task_lists (Iterable[Union[List[dict], None]]): The task lists to combine.
+
+    Returns:
+        Union[List[dict], None]: The combined tasks, or `None` if every task list
+            was `None`.
+
+    Raises:
+        ValueError: If two tasks have the same name, but different types or shapes.
+    """
+    combined_tasks = {}
+    has_tasks = False
+    for task_list in task_lists:
+        if task_list is None:
+            continue
+        has_tasks = True
+        for task in task_list:
+            task_name = task["name"]
+            existing_task = combined_tasks.get(task_name)
+            if existing_task is None:
+                combined_tasks[task_name] = task
+                continue
+            if not existing_task["type"] == task["type"]:
+                raise ValueError(
+                    f"Found two tasks with name {task_name} but types {existing_task['type']} and {task['type']}"
+                )
+            if not existing_task["shape"] == task["shape"]:
+                raise ValueError(
+                    f"Found two tasks with name {task_name} and type {task['type']} but shapes {existing_task['shape']} and {task['shape']}"
+                )
+    if not has_tasks:
+        return None
+    return list(combined_tasks.values())
@@ -2,7 +2,8 @@ from typing import List
 
 import os
 import csv
-from setkit.datasets.base.dataset import RootflowDataset, RootflowDataItem
+from setkit.datasets.base.dataset import RootflowDataset
+from setkit.datasets.base.tabular import read_csv
 
 
 class ExampleTabular(RootflowDataset):
@@ -16,19 +17,16 @@ class ExampleTabular(RootflowDataset):
     EXAMPLE_DATASET_LENGTH = 1000
     EXAMPLE_DATASET_FILE_NAME = "example.csv"
 
+    FEATURE_COLUMNS = ["feature-one", "feature-two", "feature-three", "feature-four"]
+
     def prepare_data(self, path: str):
-        with open(os.path.join(path, self.EXAMPLE_DATASET_FILE_NAME)) as data_file:
-            csv_data = list(csv.reader(data_file))
-        data = []
-        for item in csv_data[1:]:
-            data.append(
-                RootflowDataItem(
-                    [float(feature) for feature in item[1:5]],
-                    id=item[0],
-                    target=float(item[5]),
-                )
-            )
-        return data
+        return read_csv(
+            os.path.join(path, self.EXAMPLE_DATASET_FILE_NAME),
+            data=self.FEATURE_COLUMNS,
+            id="id",
+            target="integer",
+            types={column: "float64" for column in self.FEATURE_COLUMNS + ["integer"]},
+        )
 
     def download(self, path: str):
         ids = [f"example_dataset-{i}" for i in range(self.EXAMPLE_DATASET_LENGTH)]
@@ -72,18 +70,16 @@ class ExampleNLP(RootflowDataset):
     EXAMPLE_DATASET_LENGTH = 1000
     EXAMPLE_DATASET_FILE_NAME = "example.csv"
 
+    LABEL_ENCODING = {"label-0": 0, "label-1": 1}
+
     def prepare_data(self, path: str):
-        with open(os.path.join(path, self.EXAMPLE_DATASET_FILE_NAME)) as data_file:
-            csv_data = list(csv.reader(data_file))
-        data = []
-        for item in csv_data[1:]:
-            data.append(RootflowDataItem(item[1], id=item[0], target=item[2]))
-        return data
-
-    def setup(self):
-        label_encoding = {"label-0": 0, "label-1": 1}
-        for idx, (id, data, label) in enumerate(self.data):
-            self.data[idx] = RootflowDataItem(data, id=id, target=label_encoding[label])
+        return read_csv(
+            os.path.join(path, self.EXAMPLE_DATASET_FILE_NAME),
+            data="data",
+            id="id",
+            target="oddness",
+            types={"oddness": self.LABEL_ENCODING.__getitem__},
+        )
 
     def download(self, path: str):
         ids = [f"example_dataset-{i}" for i in range(self.EXAMPLE_DATASET_LENGTH)]
@@ -114,18 +110,13 @@ class ExampleMultitask(RootflowDataset):
     EXAMPLE_DATASET_FILE_NAME = "example.csv"
 
     def prepare_data(self, path: str):
-        with open(os.path.join(path, self.EXAMPLE_DATASET_FILE_NAME)) as data_file:
-            csv_data = list(csv.reader(data_file))
-        data = []
-        for item in csv_data[1:]:
-            data.append(
-                RootflowDataItem(
-                    item[1],
-                    id=item[0],
-                    target={"is_even": int(item[2]), "is_threesy": int(item[3])},
-                )
-            )
-        return data
+        return read_csv(
+            os.path.join(path, self.EXAMPLE_DATASET_FILE_NAME),
+            data="data",
+            id="id",
+            target={"is_even": "evenness", "is_threesy": "threeness"},
+            types={"evenness": "int64", "threeness": "int64"},
+        )
 
     def download(self, path: str):
         ids = [f"example_dataset-{i}" for i in range(self.EXAMPLE_DATASET_LENGTH)]
@@ -157,12 +148,11 @@ class ExampleTextCorpus(RootflowDataset):
     EXAMPLE_DATASET_FILE_NAME = "example.csv"
 
     def prepare_data(self, path: str):
-        with open(os.path.join(path, self.EXAMPLE_DATASET_FILE_NAME)) as data_file:
-            csv_data = list(csv.reader(data_file))
-        data = []
-        for item in csv_data[1:]:
-            data.append(RootflowDataItem(item[1], id=item[0]))
-        return data
+        return read_csv(
+            os.path.join(path, self.EXAMPLE_DATASET_FILE_NAME),
+            data="data",
+            id="id",
+        )
 
     def download(self, path: str):
         ids = [f"example_dataset-{i}" for i in range(self.EXAMPLE_DATASET_LENGTH)]
@@ -20,5 +20,6 @@ if __name__ == "__main__":
         packages=find_packages(),
         install_requires=[
             "torch >=1.10.0, <2.0.0",
+            "numpy",
         ],
     )
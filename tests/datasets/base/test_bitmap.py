@@ -0,0 +1,79 @@
+import pickle
+import numpy as np
+import pytest
+from setkit.datasets.base.bitmap import (
+    ArrayContainer,
+    BitmapContainer,
+    IndexBitmap,
+    RunContainer,
+)
+
+
+def make_mask(length=300000, density=0.5, seed=0):
+    mask = np.random.default_rng(seed).random(length) < density
+    mask[150000:280000] = True
+    return mask
+
+
+def test_container_types():
+    mask = np.zeros(5 * 65536, dtype=bool)
+    mask[::100] = True
+    mask[65536 : 2 * 65536 : 2] = True
+    mask[2 * 65536 : 4 * 65536 - 5] = True
+    bitmap = IndexBitmap.from_mask(mask)
+    assert bitmap.keys.tolist() == [0, 1, 2, 3, 4]
+    assert [type(container) for container in bitmap.containers] == [
+        ArrayContainer,
+        BitmapContainer,
+        RunContainer,
+        RunContainer,
+        ArrayContainer,
+    ]
+    assert np.array_equal(bitmap.to_array(), np.flatnonzero(mask))
+    assert bitmap.nbytes < np.flatnonzero(mask).astype(np.int32).nbytes / 10
+
+
+@pytest.mark.parametrize("density", [0.001, 0.3, 0.999])
+def test_select_and_rank(density):
+    mask = make_mask(density=density)
+    indices = np.flatnonzero(mask)
+    bitmap = IndexBitmap.from_mask(mask)
+    assert len(bitmap) == len(indices)
+    assert bitmap[7] == indices[7] and bitmap[-1] == indices[-1]
+    positions = np.random.default_rng(1).integers(-len(indices), len(indices), 500)
+    assert np.array_equal(bitmap[positions], indices[positions])
+    assert np.array_equal(bitmap[5:20000:3], indices[5:20000:3])
+    sliced = bitmap[1000:-1000]
+    assert isinstance(sliced, IndexBitmap)
+    assert np.array_equal(sliced.to_array(), indices[1000:-1000])
+    values = np.random.default_rng(2).integers(-10, len(mask) + 70000, 500)
+    assert np.array_equal(bitmap.rank(values), np.searchsorted(indices, values))
+    assert (int(indices[3]) in bitmap) and (len(mask) + 1 not in bitmap)
+    with pytest.raises(IndexError):
+        bitmap[len(indices)]
+
+
+def test_from_indices():
+    assert IndexBitmap.from_indices(range(70000, 140000)).tolist() == list(
+        range(70000, 140000)
+    )
+    bitmap = IndexBitmap.from_indices([200000, 3, 3, 70000])
+    assert bitmap.tolist() == [3, 70000, 200000]
+    assert np.array_equal(bitmap.to_mask(10), np.arange(10) == 3)
+    with pytest.raises(ValueError):
+        IndexBitmap.from_indices([-1, 2])
+
+
+def test_set_operations():
+    mask, other_mask = make_mask(seed=0), make_mask(density=0.1, seed=1)
+    bitmap, other = IndexBitmap.from_mask(mask), IndexBitmap.from_mask(other_mask)
+    assert np.array_equal(
+        (bitmap & other).to_array(), np.flatnonzero(mask & other_mask)
+    )
+    assert np.array_equal(
+        (bitmap | other).to_array(), np.flatnonzero(mask | other_mask)
+    )
+    assert np.array_equal(
+        (bitmap - other).to_array(), np.flatnonzero(mask & ~other_mask)
+    )
+    assert pickle.loads(pickle.dumps(bitmap)) == bitmap
@@ -0,0 +1,102 @@
+import os
+import pytest
+from setkit.datasets.base.dataset import RootflowDataset, RootflowDataItem
+from setkit.datasets.base.cache import (
+    cache_path,
+    directory_fingerprint,
+    load_cached_data,
+    save_cached_data,
+)
+
+
+class CountingDataset(RootflowDataset):
+    prepare_calls = 0
+    setup_calls = 0
+
+    def prepare_data(self, path: str):
+        CountingDataset.prepare_calls += 1
+        with open(os.path.join(path, "data.csv")) as data_file:
+            lines = data_file.read().splitlines()
+        return [
+            RootflowDataItem(int(value), id=f"item-{idx}", target=int(value) % 2)
+            for idx, value in enumerate(lines)
+        ]
+
+    def setup(self):
+        CountingDataset.setup_calls += 1
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / "data"
+    root.mkdir()
+    (root / "data.csv").write_text("\n".join(str(i) for i in range(20)))
+    CountingDataset.prepare_calls = 0
+    CountingDataset.setup_calls = 0
+    return str(root)
+
+
+def test_directory_fingerprint(root):
+    fingerprint = directory_fingerprint(root)
+    assert len(fingerprint) == 1
+    assert fingerprint[0][0] == "data.csv"
+    hash_fingerprint = directory_fingerprint(root, validation="hash")
+    assert hash_fingerprint == directory_fingerprint(root, validation="hash")
+    with pytest.raises(ValueError):
+        directory_fingerprint(root, validation="unsupported")
+
+
+def test_save_and_load_cached_data(tmp_path):
+    path = str(tmp_path / "cache" / "Dataset.prepared.pkl")
+    items = [RootflowDataItem(i, id=str(i), target=[[i]]) for i in range(5)]
+    save_cached_data(path, {"version": 0}, items)
+    loaded_items = load_cached_data(path, {"version": 0})
+    assert [tuple(item) for item in loaded_items] == [tuple(item) for item in items]
+    assert load_cached_data(path, {"version": 1}) is None
+    assert load_cached_data(str(tmp_path / "missing.pkl"), {"version": 0}) is None
+
+
+def test_prepared_cache(root):
+    dataset = CountingDataset(root, cache=True)
+    assert os.path.exists(cache_path(root, "CountingDataset", "prepared"))
+    cached_dataset = CountingDataset(root, cache=True)
+    assert CountingDataset.prepare_calls == 1
+    assert CountingDataset.setup_calls == 2
+    assert cached_dataset[7] == dataset[7]
+    assert len(cached_dataset) == 20
+
+
+def test_setup_cache(root):
+    CountingDataset(root, cache="setup", storage="columnar")
+    cached_dataset = CountingDataset(root, cache="setup", storage="columnar")
+    assert CountingDataset.prepare_calls == 1
+    assert CountingDataset.setup_calls == 1
+    assert cached_dataset[3]["data"] == 3
+
+
+def test_setup_cache_attributes(root):
+    class LabeledDataset(CountingDataset):
+        def setup(self):
+            self.labels = ["even", "odd"]
+
+    with pytest.raises(ValueError):
+        LabeledDataset(root, cache="setup")
+    assert LabeledDataset(root, cache="prepared").labels == ["even", "odd"]
+
+
+def test_cache_invalidation(root):
+    CountingDataset(root, cache=True)
+    with open(os.path.join(root, "data.csv"), "a") as data_file:
+        data_file.write("\n20")
+    dataset = CountingDataset(root, cache=True)
+    assert CountingDataset.prepare_calls == 2
+    assert len(dataset) == 21
+
+    CountingDataset(root, cache=True, cache_validation="hash")
+    CountingDataset(root, cache=True, cache_validation="hash")
+    assert CountingDataset.prepare_calls == 3
+
+
+def test_unsupported_cache(root):
+    with pytest.raises(ValueError):
+        CountingDataset(root, cache="unsupported")
@@ -0,0 +1,110 @@
+import numpy as np
+import torch
+from torch.utils.data.dataloader import default_collate
+import pytest
+from setkit.datasets.base.collate import (
+    DefaultField,
+    MappingField,
+    OptionalField,
+    SchemaCollate,
+    TensorField,
+    infer_field,
+)
+
+
+def make_rows(length=4):
+    return [
+        {
+            "id": f"item-{i}",
+            "data": {
+                "image": torch.full((2, 3), float(i)),
+                "features": np.arange(3, dtype=np.float32) + i,
+                "mask": None,
+            },
+            "target": (i % 2, float(i)),
+        }
+        for i in range(length)
+    ]
+
+
+def test_infer_field():
+    assert isinstance(infer_field(None), OptionalField)
+    field = infer_field({"a": torch.zeros(2), "b": None, "c": object()})
+    assert isinstance(field, MappingField)
+    assert set(field.fields) == {"a", "b", "c"}
+    assert isinstance(field.fields["b"], OptionalField)
+    assert isinstance(field.fields["a"], TensorField)
+    assert field.fields["a"].shape == (2,)
+    assert isinstance(field.fields["c"], DefaultField)
+
+
+def test_collate_rows():
+    rows = make_rows()
+    collate = SchemaCollate(rows[0])
+    batch = collate.collate_rows(rows)
+    expected = default_collate(
+        [
+            {
+                "id": row["id"],
+                "data": {key: row["data"][key] for key in ("image", "features")},
+                "target": row["target"],
+            }
+            for row in rows
+        ]
+    )
+    assert batch["id"] == expected["id"]
+    assert set(batch["data"]) == {"image", "features"}
+    for key in ("image", "features"):
+        assert batch["data"][key].dtype == expected["data"][key].dtype
+        assert torch.equal(batch["data"][key], expected["data"][key])
+    assert isinstance(batch["target"], tuple)
+    for collated, expected_target in zip(batch["target"], expected["target"]):
+        assert collated.dtype == expected_target.dtype
+        assert torch.equal(collated, expected_target)
+
+
+def test_collate_columns():
+    collate = SchemaCollate()
+    batch = collate(
+        {
+            "id": ["a", "b"],
+            "data": np.zeros((2, 3), dtype=np.float32),
+            "target": None,
+        }
+    )
+    assert set(batch) == {"id", "data"}
+    assert batch["data"].shape == (2, 3)
+    assert set(collate.fields) == {"id", "data", "target"}
+
+    rows = make_rows()
+    collate = SchemaCollate(rows[0])
+    batch = collate(
+        {
+            "id": [row["id"] for row in rows],
+            "data": [row["data"] for row in rows],
+            "target": [row["target"] for row in rows],
+        }
+    )
+    assert batch["data"]["image"].shape == (4, 2, 3)
+    assert batch["target"][0].tolist() == [0, 1, 0, 1]
+
+
+def test_collate_mismatched_examples():
+    collate = SchemaCollate()
+    rows = [{"id": i, "data": [1.0] * (2 + i % 2), "target": None} for i in range(4)]
+    with pytest.raises(RuntimeError):
+        collate.collate_rows(rows)
+
+    # Keys which are absent in the first example are kept once they are present
+    rows = [
+        {"id": i, "data": {"a": i, "b": None if i == 0 else float(i)}, "target": None}
+        for i in range(2)
+    ]
+    collate = SchemaCollate(rows[0])
+    assert set(collate.collate_rows(rows[:1])["data"]) == {"a"}
+    with pytest.raises(TypeError):
+        collate.collate_rows(rows)
+    batch = collate.collate_rows([rows[1], rows[1]])
+    assert batch["data"]["b"].tolist() == [1.0, 1.0]
+    with pytest.raises(TypeError):
+        collate({"id": [0, 1], "data": [rows[1]["data"]] * 2, "target": [None, 1]})
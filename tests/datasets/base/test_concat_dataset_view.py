@@ -1,9 +1,11 @@
 from typing import Tuple
+import pickle
 import pytest
 from setkit.datasets.base.dataset import (
     RootflowDataItem,
     RootflowDataset,
     ConcatRootflowDatasetView,
+    RootflowDatasetView,
 )
 
 
@@ -142,7 +144,35 @@ def test_get_task_shapes_concat_dataset_view():
 
 
 def test_stats_concat_dataset_view():
-    raise NotImplementedError
+    dataset = DatasetForTesting()
+    dataset_view = ConcatRootflowDatasetView(dataset, dataset[:10])
+    stats = dataset_view.stats()
+    assert stats["length"] == 110
+    assert stats["data_statistics"]["data"]["count"] == 110
+    assert stats["data_statistics"]["data"]["mean"] == pytest.approx((4950 + 45) / 110)
+    assert stats["target_statistics"]["target"]["value_counts"][True] == 33 + 3
+    assert dataset_view.stats(num_workers=2) == stats
+
+
+def test_approximate_stats_concat_dataset_view():
+    dataset, other_dataset = DatasetForTesting(), DatasetForTesting()
+    dataset_view = ConcatRootflowDatasetView(dataset, other_dataset[:10])
+    dataset.sketches(num_workers=2)
+    # The sketches of the first dataset are merged, rather than read again
+    dataset.index_batch = None
+    stats = dataset_view.stats(approximate=True)
+    assert stats["length"] == 110
+    assert stats["distinct_ids"] == pytest.approx(100, rel=0.05)
+    assert stats["data_statistics"]["data"]["count"] == 110
+    assert stats["data_statistics"]["data"]["quantiles"][0.5] == pytest.approx(
+        45, abs=2
+    )
+    assert stats["target_statistics"]["target"]["heavy_hitters"] == {
+        False: 67 + 7,
+        True: 33 + 3,
+    }
+    assert dataset_view.stats(approximate=True) is stats
+    assert "heavy_hitters" not in dataset_view.stats()["target_statistics"]["target"]
 
 
 def test_examples_concat_dataset_view():
@@ -151,3 +181,96 @@ def test_examples_concat_dataset_view():
 
 def test_describe_concat_dataset_view():
     raise NotImplementedError
+
+
+def test_concat_many_datasets():
+    dataset = DatasetForTesting()
+    shards = [dataset[i * 10 : (i + 1) * 10] for i in range(10)]
+    concat_result = ConcatRootflowDatasetView(*shards)
+    assert len(concat_result) == len(dataset)
+    for index in [0, 9, 10, 55, 99, -1]:
+        assert concat_result[index] == dataset[index]
+
+
+def test_sum_datasets():
+    dataset = DatasetForTesting()
+    shards = [dataset[i : i + 1] for i in range(len(dataset))] * 20
+    concat_result = sum(shards)
+    assert len(concat_result) == 20 * len(dataset)
+    assert concat_result[1234]["data"] == 34
+    assert concat_result[len(concat_result) - 1]["data"] == 99
+
+
+def test_transform_nested_concat_dataset_view():
+    dataset = DatasetForTesting()
+    inner_concat = dataset + dataset
+    outer_concat = inner_concat + dataset
+    outer_concat.transform(lambda x: x * 2)
+    assert outer_concat[105]["data"] == 10
+    inner_concat.transform(lambda x: x + 1)
+    assert outer_concat[105]["data"] == 12
+    assert outer_concat[205]["data"] == 10
+
+
+def test_flatten_nested_concat_dataset_view():
+    dataset = DatasetForTesting()
+    inner_concat = dataset + dataset[:10]
+    outer_concat = inner_concat + dataset
+    leaves = outer_concat._leaves[: outer_concat._leaf_count]
+    assert [type(leaf) for leaf in leaves] == [
+        DatasetForTesting,
+        RootflowDatasetView,
+        DatasetForTesting,
+    ]
+    # Nested concatenations which cache their transforms are indexed as a whole
+    inner_concat.transform(str).cache_transforms()
+    assert outer_concat[105]["data"] == "5"
+    assert outer_concat[110]["data"] == 0
+    copy = pickle.loads(pickle.dumps(outer_concat))
+    assert [item for item in copy] == [item for item in outer_concat]
+
+
+def test_concat_conflicting_tasks():
+    class OtherDatasetForTesting(DatasetForTesting):
+        def tasks(self):
+            return [{"name": "task", "type": "regression", "shape": 1}]
+
+    dataset = DatasetForTesting()
+    with pytest.raises(ValueError):
+        ConcatRootflowDatasetView(dataset, dataset, OtherDatasetForTesting())
+
+
+def test_index_batch_concat_dataset_view():
+    dataset = DatasetForTesting()
+    columnar_dataset = DatasetForTesting(storage="columnar")
+    concat_result = dataset[:10] + columnar_dataset + dataset[:10].transform(str)
+    indices = [115, 3, 50, 109, 12, -1]
+    ids, data, targets = concat_result.index_batch(indices)
+    for index, id, example_data, target in zip(indices, ids, data, targets):
+        assert (id, example_data, target) == concat_result.index(index)
+
+
+def test_pickle_concat_dataset_view():
+    dataset = DatasetForTesting()
+    columnar_dataset = DatasetForTesting(storage="columnar")
+    concat_result = (dataset[:10] + columnar_dataset).transform(str)
+    assert concat_result[15]["data"] == "5"
+    concat_result.share_memory()
+    copy = pickle.loads(pickle.dumps(concat_result))
+    assert [item for item in copy] == [item for item in concat_result]
+    assert len(pickle.dumps(concat_result)) < 4096
+
+
+def test_by_id_concat_dataset_view():
+    dataset = DatasetForTesting()
+    other_dataset = DatasetForTesting(storage="columnar").transform(str)
+    concat_result = dataset[:10] + other_dataset[50:]
+    assert concat_result.by_id("data_item-3")["data"] == 3
+    assert concat_result.by_id("data_item-75")["data"] == "75"
+    with pytest.raises(KeyError):
+        concat_result.by_id("data_item-30")
+    # Ids in both datasets are found in the first
+    repeated = dataset[:10] + other_dataset
+    assert repeated.by_id("data_item-4")["data"] == 4
+    ids_view = repeated.ids_to_view(["data_item-60", "data_item-2"])
+    assert [item["data"] for item in ids_view] == ["60", 2]
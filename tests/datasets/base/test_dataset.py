@@ -1,10 +1,13 @@
 from typing import Tuple
+import numpy as np
 import pytest
 from setkit.datasets.base.dataset import (
     RootflowDataset,
     RootflowDataItem,
     ConcatRootflowDatasetView,
+    ShardedRootflowDataset,
 )
+from setkit.datasets.base.bitmap import IndexBitmap
 
 
 class DatasetForTesting(RootflowDataset):
@@ -161,7 +164,49 @@ def test_get_task_shapes_dataset():
 
 
 def test_stats_dataset():
-    raise NotImplementedError
+    dataset = DatasetForTesting()
+    stats = dataset.stats()
+    assert stats["length"] == 100
+    assert stats["data_statistics"]["data"]["mean"] == pytest.approx(49.5)
+    assert stats["data_statistics"]["data"]["std"] == pytest.approx(
+        np.std(np.arange(100))
+    )
+    assert stats["data_statistics"]["data"]["min"] == 0
+    assert stats["data_statistics"]["data"]["max"] == 99
+    assert stats["target_statistics"]["target"]["value_counts"] == {
+        False: 67,
+        True: 33,
+    }
+    assert dataset.stats() is stats
+    assert dataset.stats(num_workers=2) is stats
+    dataset.map(lambda x: x * 2)
+    mapped_stats = dataset.stats(num_workers=2)
+    assert mapped_stats is not stats
+    assert mapped_stats["data_statistics"]["data"]["mean"] == pytest.approx(99.0)
+    assert mapped_stats["data_statistics"]["data"]["max"] == 198
+
+
+def test_save_dataset(tmp_path):
+    dataset = DatasetForTesting()
+    dataset_view = dataset.where(lambda x: x % 2 == 0).transform(
+        lambda x: {"value": x, "half": x // 2}
+    )
+    dataset_view.save(str(tmp_path), shard_size=16, num_workers=2)
+    saved_dataset = ShardedRootflowDataset(str(tmp_path))
+    assert len(saved_dataset) == 50
+    assert saved_dataset.data.num_shards == 4
+    assert saved_dataset.tasks() == dataset.tasks()
+    for index in (0, 17, 49):
+        assert saved_dataset[index] == dataset_view[index]
+    ids, data, targets = saved_dataset.index_batch([33, 2])
+    assert ids == ["data_item-66", "data_item-4"]
+    assert data == [{"value": 66, "half": 33}, {"value": 4, "half": 2}]
+    assert targets.tolist() == [False, True]
+    saved_dataset.map(lambda x: x["value"])
+    assert saved_dataset[-1]["data"] == 98
+
+    with pytest.raises(FileNotFoundError):
+        ShardedRootflowDataset(str(tmp_path / "missing"))
 
 
 def test_examples_dataset():
@@ -170,3 +215,134 @@ def test_examples_dataset():
 
 def test_describe_dataset():
     raise NotImplementedError
+
+
+def test_columnar_dataset():
+    dataset = DatasetForTesting(storage="columnar")
+    assert dataset[3]["id"] == "data_item-3"
+    assert dataset[3]["data"] == 3
+    assert dataset[4]["target"] == True
+    assert len(dataset) == 100
+
+    dataset.map(lambda batch: batch * 2, batch_size=16)
+    assert dataset[7]["data"] == 14
+    dataset_view = dataset[10:20]
+    assert dataset_view[1]["data"] == 22
+
+
+def test_unsupported_storage_dataset():
+    with pytest.raises(ValueError):
+        DatasetForTesting(storage="unsupported")
+
+
+def test_index_batch_dataset():
+    for storage in ["list", "columnar"]:
+        dataset = DatasetForTesting(storage=storage)
+        ids, data, targets = dataset.index_batch([3, 1, 4])
+        assert list(ids) == ["data_item-3", "data_item-1", "data_item-4"]
+        assert list(data) == [3, 1, 4]
+        assert list(targets) == [False, True, True]
+
+        dataset.transform(lambda x: x * 2)
+        ids, data, targets = dataset.index_batch([5])
+        assert data == [10]
+
+
+def test_filter_dataset_batched():
+    for storage in ["list", "columnar"]:
+        dataset = DatasetForTesting(storage=storage)
+        filtered_dataset = dataset.where(
+            lambda batch: [data % 7 == 0 for data in batch], batch_size=16
+        )
+        assert isinstance(filtered_dataset.data_indices, IndexBitmap)
+        assert [item["data"] for item in filtered_dataset] == list(range(0, 100, 7))
+
+        filtered_targets = dataset.where(
+            lambda batch: np.asarray(batch) == True, targets=True, batch_size=32
+        )
+        assert len(filtered_targets) == 33
+        assert filtered_targets[0]["id"] == "data_item-1"
+
+    dataset = DatasetForTesting(storage="columnar")
+    filtered_dataset = dataset[10:].where(lambda batch: batch > 80, batch_size=7)
+    assert filtered_dataset[0]["data"] == 81
+    with pytest.raises(AssertionError):
+        dataset.where(lambda batch: [True], batch_size=8)
+
+
+def test_lazy_map_dataset():
+    for storage in ["list", "columnar"]:
+        calls = []
+
+        def double(x):
+            calls.append(x)
+            return x * 2
+
+        dataset = DatasetForTesting(storage=storage)
+        dataset.map(double, lazy=True)
+        dataset.map(lambda batch: [x + 1 for x in batch], batch_size=8, lazy=True)
+        assert dataset.has_pending_maps
+        assert calls == []
+
+        view = dataset[:10]
+        assert view[3]["data"] == 7
+        assert [item["data"] for item in view] == [x * 2 + 1 for x in range(10)]
+        assert len(calls) == 10
+        assert list(dataset.index_batch([2, 50])[1]) == [5, 101]
+        assert len(calls) == 11
+
+        dataset.materialize()
+        assert not dataset.has_pending_maps
+        assert [item["data"] for item in dataset] == [x * 2 + 1 for x in range(100)]
+
+        dataset.map(lambda x: -x, lazy=True)
+        dataset.map(lambda x: x + 1)
+        assert not dataset.has_pending_maps
+        assert dataset[1]["data"] == -2
+
+
+def test_lazy_map_after_reads():
+    for storage in ["list", "columnar"]:
+        calls = []
+
+        def increment(x):
+            calls.append(x)
+            return x + 1
+
+        dataset = DatasetForTesting(storage=storage)
+        dataset.map(increment, lazy=True)
+        assert dataset[3]["data"] == 4
+        # Negative indices share the results of the items they count back to
+        assert dataset[-1]["data"] == 100
+        assert dataset[99]["data"] == 100
+        assert list(dataset.index_batch([-2, 98])[1]) == [99, 99]
+        assert calls == [3, 99, 98]
+
+        dataset.map(lambda x: x * 2, lazy=True)
+        assert dataset[3]["data"] == 8
+        assert dataset[4]["data"] == 10
+        assert dataset[-1]["data"] == 200
+        dataset.materialize()
+        assert [item["data"] for item in dataset] == [(x + 1) * 2 for x in range(100)]
+
+
+def test_infer_tasks_dataset():
+    class MultitaskDatasetForTesting(RootflowDataset):
+        def prepare_data(self, path: str):
+            return [
+                RootflowDataItem(i, target={"a": i % 5, "b": float(i), "c": i > 50})
+                for i in range(100)
+            ]
+
+    for storage in ["list", "columnar"]:
+        tasks = MultitaskDatasetForTesting(storage=storage).tasks()
+        assert tasks == [
+            {"name": "a", "type": "classification", "shape": 4},
+            {"name": "b", "type": "regression", "shape": 1},
+            {"name": "c", "type": "binary", "shape": 2},
+        ]
+    sampled_tasks = MultitaskDatasetForTesting(task_inference_sample=2).tasks()
+    assert sampled_tasks[0] == {"name": "a", "type": "binary", "shape": 1}
+    assert DatasetForTesting(storage="columnar").tasks() == [
+        {"name": "task", "type": "binary", "shape": 2}
+    ]
@@ -1,4 +1,7 @@
 from typing import Tuple
+import pickle
+import numpy as np
+import torch
 import pytest
 from setkit.datasets.base.dataset import (
     ConcatRootflowDatasetView,
@@ -6,6 +9,7 @@ from setkit.datasets.base.dataset import (
     RootflowDataset,
     RootflowDatasetView,
 )
+from setkit.datasets.base.bitmap import IndexBitmap
 
 
 class DatasetForTesting(RootflowDataset):
@@ -149,7 +153,20 @@ def test_get_task_shapes_dataset_view():
 
 
 def test_stats_dataset_view():
-    raise NotImplementedError
+    dataset = DatasetForTesting()
+    dataset_view = RootflowDatasetView(dataset, [1, 6, 2, 7, 3, 10])
+    stats = dataset_view.stats()
+    assert stats["length"] == 6
+    assert stats["data_statistics"]["data"]["mean"] == pytest.approx(29 / 6)
+    assert stats["data_statistics"]["data"]["min"] == 1
+    assert stats["data_statistics"]["data"]["max"] == 10
+    assert stats["target_statistics"]["target"]["value_counts"] == {
+        True: 3,
+        False: 3,
+    }
+    dataset_view.transform(lambda x: -x)
+    stats = dataset_view.stats()
+    assert stats["data_statistics"]["data"]["max"] == -1
 
 
 def test_examples_dataset_view():
@@ -158,3 +175,152 @@ def test_examples_dataset_view():
 
 def test_describe_dataset_view():
     raise NotImplementedError
+
+
+def test_flatten_nested_dataset_view():
+    dataset = DatasetForTesting()
+    dataset_view = dataset[10:90][5:60].where(lambda data: data % 2 == 0)[2:10:3]
+    assert dataset_view.dataset is dataset
+    assert len(dataset_view.parent_views) == 3
+    assert [item["data"] for item in dataset_view] == [20, 26, 32]
+    assert list(dataset_view.data_indices) == [20, 26, 32]
+
+
+def test_transform_nested_dataset_view():
+    dataset = DatasetForTesting()
+    outer_view = dataset[10:]
+    outer_view.transform(lambda x: x * 10)
+    inner_view = outer_view[5:]
+    inner_view.transform(lambda x: x + 1)
+    assert inner_view[0]["data"] == 151
+
+    outer_view.transform(lambda x: -x)
+    assert inner_view[0]["data"] == -149
+    assert outer_view[0]["data"] == -100
+
+
+def test_index_batch_dataset_view():
+    dataset = DatasetForTesting()
+    dataset_view = dataset[10:50][::2].transform(lambda x: x + 1)
+    ids, data, targets = dataset_view.index_batch([0, 3, 1])
+    assert ids == ["data_item-10", "data_item-16", "data_item-12"]
+    assert data == [11, 17, 13]
+    assert targets == [True, True, False]
+
+
+def double(value):
+    return value * 2
+
+
+def test_pickle_dataset_view():
+    dataset = DatasetForTesting()
+    dataset_view = dataset[10:90].transform(double)[5:50:2]
+    full_size = len(pickle.dumps(dataset_view))
+    dataset.share_memory()
+    copy = pickle.loads(pickle.dumps(dataset_view))
+    assert len(pickle.dumps(dataset_view)) < full_size / 2
+    assert copy.data_indices == dataset_view.data_indices == range(15, 60, 2)
+    assert [item for item in copy] == [item for item in dataset_view]
+    assert copy[0]["data"] == 30
+    # The copy's parent views keep only their transforms
+    assert copy.parent_views[0].data_transforms == [double]
+
+
+def test_slice_dataset_view_memory():
+    dataset = DatasetForTesting()
+    dataset_view = dataset[::2][::-1][5:]
+    assert dataset_view.data_indices == range(88, -1, -2)
+    assert dataset_view[0]["data"] == 88
+    assert dataset_view[-1]["data"] == 0
+    assert RootflowDatasetView(dataset, range(50, 10, -10)).data_indices == range(
+        20, 60, 10
+    )
+    with pytest.raises(IndexError):
+        RootflowDatasetView(dataset[10:20], range(5, 15))
+
+    list_view = dataset[[5, 3, 5, 90]]
+    assert list_view.data_indices.dtype == np.int32
+    assert list_view.data_indices.tolist() == [3, 5, 90]
+    nested_view = dataset[::3][[2, 0, 1, 0]]
+    assert nested_view.data_indices.tolist() == [0, 3, 6]
+    ids, data, targets = dataset[10:50:4].index_batch([0, 3, -1])
+    assert data == [10, 22, 46]
+
+
+def test_array_index_dataset_view():
+    dataset = DatasetForTesting(storage="columnar")
+    assert dataset[np.int64(3)]["data"] == 3
+    assert dataset[torch.tensor(4)]["data"] == 4
+    assert dataset[range(10, 20, 5)].data_indices == range(10, 20, 5)
+
+    array_view = dataset[np.array([7, 2, 7, 40], dtype=np.int64)]
+    assert array_view.data_indices.dtype == np.int32
+    assert array_view.data_indices.tolist() == [2, 7, 40]
+    tensor_view = dataset[10:][torch.tensor([5, 1])]
+    assert tensor_view.data_indices.tolist() == [11, 15]
+    ids, data, targets = tensor_view.index_batch([0, 1])
+    assert isinstance(data, np.ndarray)
+    assert data.tolist() == [11, 15]
+
+    mask = np.arange(100) % 10 == 0
+    assert dataset[mask].data_indices.tolist() == list(range(0, 100, 10))
+    assert len(dataset[::2][torch.from_numpy(mask[:50])]) == 5
+    with pytest.raises(IndexError):
+        dataset[mask[:50]]
+    with pytest.raises(IndexError):
+        dataset[np.array([0.5])]
+    with pytest.raises(TypeError):
+        dataset["0"]
+
+
+def test_bitmap_dataset_view():
+    dataset = DatasetForTesting(storage="columnar")
+    evens = dataset.where(lambda data: data % 2 == 0)
+    thirds = dataset.where(lambda batch: batch % 3 == 0, batch_size=16)
+    assert isinstance(evens.data_indices, IndexBitmap)
+    assert evens[10]["data"] == 20
+    assert evens[-1]["data"] == 98
+    assert evens.index_batch([1, 0])[1].tolist() == [2, 0]
+    assert isinstance(evens[5:].data_indices, IndexBitmap)
+    assert [item["data"] for item in evens[5:8]] == [10, 12, 14]
+    assert [item["data"] for item in evens[::-10]] == [98, 78, 58, 38, 18]
+
+    assert [item["data"] for item in evens & thirds] == list(range(0, 100, 6))
+    assert len(evens | thirds) == 67
+    assert [item["data"] for item in thirds - evens][:3] == [3, 9, 15]
+    assert [item["data"] for item in dataset[40:50] & evens] == [40, 42, 44, 46, 48]
+    assert len(dataset[[1, 3, 5]] | dataset[::-1]) == 100
+
+    nested = dataset[10:].where(lambda data: data % 5 == 0)
+    assert isinstance(nested.data_indices, IndexBitmap)
+    assert nested.data_indices.tolist() == list(range(10, 100, 5))
+    with pytest.raises(ValueError):
+        evens & nested
+
+
+def test_by_id_dataset_view():
+    dataset = DatasetForTesting(storage="columnar")
+    assert dataset.by_id("data_item-42")["data"] == 42
+    with pytest.raises(KeyError):
+        dataset.by_id("data_item-100")
+
+    range_view = dataset[10:90:4]
+    assert range_view.by_id("data_item-18")["data"] == 18
+    with pytest.raises(KeyError):
+        range_view.by_id("data_item-20")
+    array_view = dataset[[30, 5, 60]]
+    assert array_view.by_id("data_item-60")["data"] == 60
+    unsorted_view = RootflowDatasetView(dataset, [30, 5, 60], sorted=False)
+    assert unsorted_view.by_id("data_item-5")["data"] == 5
+    evens = dataset.where(lambda data: data % 2 == 0)
+    assert evens.by_id("data_item-64")["data"] == 64
+    with pytest.raises(KeyError):
+        evens.by_id("data_item-63")
+
+    ids_view = evens[::-1].ids_to_view(["data_item-8", "data_item-2", "data_item-96"])
+    assert [item["data"] for item in ids_view] == [8, 2, 96]
+    with pytest.raises(KeyError):
+        evens.ids_to_view(["data_item-8", "data_item-3"])
+    # The index is built once, on the underlying dataset, and is not pickled
+    assert dataset._id_index is not None
+    assert "_id_index" not in pickle.loads(pickle.dumps(dataset)).__dict__
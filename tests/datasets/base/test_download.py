@@ -0,0 +1,202 @@
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import os
+import pathlib
+import threading
+import time
+import pytest
+from setkit.datasets.base.dataset import RootflowDataset, RootflowDataItem
+from setkit.datasets.base.download import (
+    DownloadLock,
+    RemoteFile,
+    download_files,
+)
+
+CONTENT = bytes(range(256)) * 1000
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Serves files with support for single byte range requests"""
+
+    requests = []
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            return super().send_head()
+        with open(path, "rb") as file:
+            content = file.read()
+        start, stop = 0, len(content)
+        byte_range = self.headers.get("Range")
+        type(self).requests.append(byte_range)
+        if byte_range is not None:
+            first, _, last = byte_range.replace("bytes=", "").partition("-")
+            start, stop = int(first), int(last) + 1 if last else len(content)
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{stop - 1}/{len(content)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(stop - start))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        return _BytesFile(content[start:stop])
+
+    def log_message(self, *args):
+        pass
+
+
+class _BytesFile:
+    def __init__(self, content):
+        self.content = content
+
+    def read(self, *args):
+        content, self.content = self.content, b""
+        return content
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def remote_file(tmp_path):
+    remote = tmp_path / "remote"
+    remote.mkdir()
+    (remote / "data.bin").write_bytes(CONTENT)
+    return remote / "data.bin"
+
+
+def sha256(content):
+    return f"sha256:{hashlib.sha256(content).hexdigest()}"
+
+
+def test_download_file_url(tmp_path, remote_file):
+    url = remote_file.as_uri()
+    directory = tmp_path / "local"
+    files = [RemoteFile(url, checksum=sha256(CONTENT))]
+    paths = download_files(files, str(directory), num_connections=3)
+    assert pathlib.Path(paths[0]).read_bytes() == CONTENT
+    assert os.listdir(directory) == ["data.bin"]
+
+    remote_file.write_bytes(b"changed")
+    download_files(files, str(directory))
+    assert pathlib.Path(paths[0]).read_bytes() == CONTENT
+
+
+def test_resume_download(tmp_path, remote_file):
+    directory = tmp_path / "local"
+    directory.mkdir()
+    (directory / "data.bin.part").write_bytes(CONTENT[:1000])
+    # Changing the start of the remote file shows that it was not fetched again
+    remote_file.write_bytes(b"x" * 1000 + CONTENT[1000:])
+    paths = download_files([remote_file.as_uri()], str(directory))
+    assert pathlib.Path(paths[0]).read_bytes() == CONTENT
+
+
+def test_download_checksum_mismatch(tmp_path, remote_file):
+    directory = tmp_path / "local"
+    with pytest.raises(ValueError):
+        download_files(
+            [RemoteFile(remote_file.as_uri(), checksum=sha256(b"other"))],
+            str(directory),
+        )
+    assert os.listdir(directory) == []
+
+
+def test_download_http(tmp_path, remote_file):
+    handler = partial(RangeRequestHandler, directory=str(remote_file.parent))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/data.bin"
+        RangeRequestHandler.requests = []
+        paths = download_files(
+            [RemoteFile(url, name="ranges.bin", checksum=sha256(CONTENT))],
+            str(tmp_path / "local"),
+            num_connections=4,
+        )
+        assert pathlib.Path(paths[0]).read_bytes() == CONTENT
+        assert (
+            len([request for request in RangeRequestHandler.requests if request]) == 4
+        )
+
+        paths = download_files([url], str(tmp_path / "local"))
+        assert pathlib.Path(paths[0]).read_bytes() == CONTENT
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_download_lock(tmp_path):
+    root = str(tmp_path / "dataset")
+    events = []
+
+    def download():
+        with DownloadLock(root) as lock:
+            if lock.completed_by_other():
+                events.append("skipped")
+            else:
+                time.sleep(0.2)
+                events.append("downloaded")
+                lock.mark_complete()
+
+    threads = [threading.Thread(target=download) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(events) == ["downloaded", "skipped", "skipped"]
+    assert os.path.exists(root + ".lock")
+
+    # A later request downloads again
+    download()
+    assert events[-1] == "downloaded"
+
+
+def test_dataset_download_lock(tmp_path, remote_file):
+    class DownloadedDatasetForTesting(RootflowDataset):
+        def download(self, directory: str):
+            download_files([remote_file.as_uri()], directory)
+
+        def prepare_data(self, directory: str):
+            with open(os.path.join(directory, "data.bin"), "rb") as file:
+                return [RootflowDataItem(file.read(), target=0)]
+
+    dataset = DownloadedDatasetForTesting(str(tmp_path / "dataset"), download=True)
+    assert dataset[0]["data"] == CONTENT
+    assert os.path.exists(str(tmp_path / "dataset") + ".lock")
+
+
+def test_dataset_waits_for_download(tmp_path):
+    root = tmp_path / "dataset"
+    started = threading.Event()
+
+    def download():
+        with DownloadLock(str(root)) as lock:
+            root.mkdir()
+            (root / "data.bin").write_bytes(CONTENT)
+            started.set()
+            time.sleep(0.3)
+            (root / "targets.bin").write_bytes(bytes([1]))
+            lock.mark_complete()
+
+    class MultiFileDatasetForTesting(RootflowDataset):
+        def download(self, directory: str):
+            raise AssertionError("The data is being downloaded by another process")
+
+        def prepare_data(self, directory: str):
+            return [
+                RootflowDataItem(name, target=0)
+                for name in sorted(os.listdir(directory))
+            ]
+
+    thread = threading.Thread(target=download)
+    thread.start()
+    started.wait()
+    # The root exists, but the download is not finished until the lock is released
+    dataset = MultiFileDatasetForTesting(str(root))
+    thread.join()
+    assert [item["data"] for item in dataset] == ["data.bin", "targets.bin"]
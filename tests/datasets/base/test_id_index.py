@@ -0,0 +1,97 @@
+import pickle
+import numpy as np
+import pytest
+from setkit.datasets.base.dataset import (
+    JoinedRootflowDatasetView,
+    RootflowDataItem,
+    RootflowDataset,
+)
+from setkit.datasets.base.id_index import IdIndex, id_array
+from setkit.datasets.base.sketches import hash_values
+
+
+class DatasetForTesting(RootflowDataset):
+    def __init__(self, ids, offset=0, **kwargs):
+        self.ids = ids
+        self.offset = offset
+        super().__init__(**kwargs)
+
+    def prepare_data(self, path: str):
+        return [
+            RootflowDataItem(index + self.offset, id=id, target=index % 2)
+            for index, id in enumerate(self.ids)
+        ]
+
+    def setup(self):
+        pass
+
+
+def test_id_index():
+    ids = [f"item-{i}" for i in range(1000)] + [7, "item-3"]
+    index = IdIndex.from_ids(ids)
+    assert len(index) == 1002
+    assert len(index.table) >= 2 * len(index)
+    lookup_ids = ["item-999", 7.0, "item-3", "missing"]
+    positions = index.lookup(hash_values(lookup_ids), lookup_ids)
+    assert positions.tolist() == [999, 1000, 3, -1]
+    assert index.lookup(hash_values(["item-10"]), ["item-10"]).tolist() == [10]
+    assert index.lookup(hash_values(["missing"]), ["missing"]).tolist() == [-1]
+    empty = IdIndex.from_ids([])
+    assert empty.lookup(hash_values(["a", "b"]), ["a", "b"]).tolist() == [-1, -1]
+
+    # Ids which share a hash are told apart by comparing the ids themselves
+    colliding = IdIndex(
+        np.zeros(3, dtype=np.uint64), id_array(["a", "b", "c"]).__getitem__
+    )
+    assert colliding.lookup(
+        np.zeros(4, dtype=np.uint64), ["c", "a", "z", "b"]
+    ).tolist() == [2, 0, -1, 1]
+    assert colliding.lookup(np.zeros(1, dtype=np.uint64), ["b"]).tolist() == [1]
+    assert colliding.lookup(np.zeros(1, dtype=np.uint64), ["z"]).tolist() == [-1]
+
+
+def test_large_integer_ids():
+    base = 1234567890123456789
+    ids = [base + i for i in range(1000)]
+    assert len(set(hash_values(ids).tolist())) == 1000
+    assert hash_values(np.array(ids)).tolist() == hash_values(ids).tolist()
+    dataset = DatasetForTesting(ids)
+    assert dataset.by_id(base + 500)["data"] == 500
+    assert dataset.by_id(base)["data"] == 0
+    with pytest.raises(KeyError):
+        dataset.by_id(base + 1000)
+    with pytest.raises(KeyError):
+        dataset.by_id(float(base))
+    view = dataset.ids_to_view([base + 999, base + 1, base + 2])
+    assert [item["data"] for item in view] == [999, 1, 2]
+    assert dataset[100:].ids_to_view(np.array([base + 101]))[0]["data"] == 101
+    joined = dataset.join(DatasetForTesting(ids[::-2], offset=1000))
+    assert len(joined) == 500
+    assert joined.by_id(base + 1)["data"] == (1, 1499)
+
+
+def test_join_datasets():
+    dataset = DatasetForTesting([f"item-{i}" for i in range(20)])
+    other = DatasetForTesting([f"item-{i}" for i in range(30, 5, -3)], offset=100)
+    joined = dataset.join(other)
+    assert isinstance(joined, JoinedRootflowDatasetView)
+    assert [item["id"] for item in joined] == ["item-6", "item-9", "item-12"] + [
+        "item-15",
+        "item-18",
+    ]
+    assert joined[0]["data"] == (6, 108)
+    assert joined[0]["target"] == (0, 0)
+    ids, data, targets = joined.index_batch([4, 1])
+    assert ids == ["item-18", "item-9"]
+    assert data == [(18, 104), (9, 107)]
+    assert targets == [(0, 0), (1, 1)]
+    assert joined.by_id("item-12")["data"] == (12, 106)
+    with pytest.raises(KeyError):
+        joined.by_id("item-7")
+
+    transformed = joined.transform(sum)[1:]
+    assert [item["data"] for item in transformed] == [116, 118, 120, 122]
+    copy = pickle.loads(pickle.dumps(joined))
+    assert [item for item in copy] == [item for item in joined]
+    with pytest.raises(AttributeError):
+        joined.map(sum)
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+import tracemalloc
+import pytest
+from setkit.datasets.base.dataset import RootflowDataItem
+from setkit.datasets.base.download import DownloadLock
+from setkit.datasets.base.iterable import IterableRootflowDataset
+from setkit.datasets.base.loader import RootflowDataLoader
+
+
+class StreamForTesting(IterableRootflowDataset):
+    def __init__(self, length: int = 100, **kwargs):
+        self.length = length
+        super().__init__(root=".", **kwargs)
+
+    def prepare_data(self, path: str):
+        for i in range(self.length):
+            yield RootflowDataItem(i, id=f"data_item-{i}", target=i % 3)
+
+
+class UnlabeledStreamForTesting(IterableRootflowDataset):
+    def prepare_data(self, path: str):
+        return (RootflowDataItem(float(i)) for i in range(10))
+
+
+def test_iterate_stream():
+    stream = StreamForTesting()
+    items = list(stream)
+    assert len(items) == 100
+    assert items[5] == {"id": "data_item-5", "data": 5, "target": 2}
+    assert list(stream) == items
+    assert stream.tasks() == [{"name": "task", "type": "classification", "shape": 2}]
+
+
+def test_stream_operations():
+    stream = StreamForTesting().transform(lambda x: x * 2)
+    evens = stream.where(lambda target: target == 0, targets=True)
+    assert [item["data"] for item in evens.take(3)] == [0, 6, 12]
+    mapped = stream.map(lambda batch: [x + 1 for x in batch], batch_size=8)
+    assert [item["data"] for item in mapped.take(3)] == [1, 3, 5]
+    assert [item["data"] for item in stream.take(2)] == [0, 2]
+
+    batches = list(stream.batch(32).transform(lambda x: x + 1))
+    assert [len(batch["data"]) for batch in batches] == [32, 32, 32, 4]
+    assert batches[-1]["data"] == [193, 195, 197, 199]
+    assert len(list(stream.batch(32, drop_last=True))) == 3
+
+
+def test_shuffle_stream():
+    stream = StreamForTesting()
+    shuffled = [item["data"] for item in stream.shuffle(10, seed=0)]
+    assert shuffled != list(range(100))
+    assert sorted(shuffled) == list(range(100))
+    assert shuffled == [item["data"] for item in stream.shuffle(10, seed=0)]
+    with pytest.raises(ValueError):
+        stream.shuffle(0)
+
+
+def test_stream_without_ids_or_targets():
+    stream = UnlabeledStreamForTesting(root=".")
+    assert next(iter(stream))["id"] == "UnlabeledStreamForTesting-0"
+    assert stream.tasks() is None
+    batch = next(iter(RootflowDataLoader(stream, batch_size=4)))
+    assert "target" not in batch
+    assert batch["data"].tolist() == [0.0, 1.0, 2.0, 3.0]
+
+
+def test_load_stream_with_workers():
+    stream = StreamForTesting().where(lambda x: x % 2 == 0)
+    loader = RootflowDataLoader(stream, batch_size=8, num_workers=2)
+    ids = [id for batch in loader for id in batch["id"]]
+    assert sorted(ids) == sorted(f"data_item-{i}" for i in range(0, 100, 2))
+
+    batched_loader = RootflowDataLoader(stream.batch(10), num_workers=2)
+    batches = list(batched_loader)
+    assert sum(len(batch["id"]) for batch in batches) == 50
+    assert batches[0]["data"].shape == (10,)
+
+
+def test_stream_memory_is_constant():
+    stream = StreamForTesting(length=200000).shuffle(100).batch(64)
+    tracemalloc.start()
+    num_batches = sum(1 for _ in stream)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert num_batches == 3125
+    assert peak < 1 << 20
+
+
+def test_stream_waits_for_download(tmp_path):
+    root = tmp_path / "stream"
+    started = threading.Event()
+    downloads = []
+
+    def download():
+        with DownloadLock(str(root)) as lock:
+            root.mkdir()
+            started.set()
+            time.sleep(0.3)
+            (root / "data.txt").write_text("1\n2\n3")
+            lock.mark_complete()
+
+    class FileStreamForTesting(IterableRootflowDataset):
+        def download(self, directory: str):
+            downloads.append(directory)
+
+        def prepare_data(self, path: str):
+            with open(os.path.join(path, "data.txt")) as file:
+                for line in file:
+                    yield RootflowDataItem(int(line))
+
+    thread = threading.Thread(target=download)
+    thread.start()
+    started.wait()
+    # The root exists, but the download is not finished until the lock is released
+    stream = FileStreamForTesting(root=str(root))
+    items = [item["data"] for item in stream]
+    thread.join()
+    assert downloads == []
+    assert items == [1, 2, 3]
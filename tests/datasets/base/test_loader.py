@@ -0,0 +1,177 @@
+import gc
+import os
+import pickle
+import pytest
+import torch
+from torch.utils.data import get_worker_info
+from setkit.datasets.base.dataset import RootflowDataset, RootflowDataItem
+from setkit.datasets.base.loader import RootflowDataLoader
+from setkit.datasets.base.storage import SharedStorage
+
+
+class DatasetForTesting(RootflowDataset):
+    def prepare_data(self, path: str):
+        return [
+            RootflowDataItem([i, i + 0.5], id=f"data_item-{i}", target=i % 3)
+            for i in range(100)
+        ]
+
+
+class UnlabeledDatasetForTesting(RootflowDataset):
+    def prepare_data(self, path: str):
+        return [RootflowDataItem(float(i)) for i in range(100)]
+
+
+def test_loader_batches():
+    for storage in ["list", "columnar"]:
+        dataset = DatasetForTesting(storage=storage)
+        loader = RootflowDataLoader(dataset, batch_size=16)
+        batches = list(loader)
+        assert len(batches) == len(loader) == 7
+        assert batches[0]["id"][2] == "data_item-2"
+        assert batches[0]["target"].tolist()[:4] == [0, 1, 2, 0]
+        assert len(batches[-1]["id"]) == 4
+
+
+def test_loader_shuffle_and_drop_last():
+    dataset = DatasetForTesting(storage="columnar")
+    loader = RootflowDataLoader(
+        dataset,
+        batch_size=16,
+        shuffle=True,
+        drop_last=True,
+        generator=torch.Generator().manual_seed(0),
+    )
+    batches = list(loader)
+    assert len(batches) == 6
+    seen_ids = [id for batch in batches for id in batch["id"]]
+    assert len(set(seen_ids)) == 96
+    assert batches[0]["data"].shape == (16, 2)
+
+
+def test_loader_dataset():
+    dataset = DatasetForTesting()
+    loader = RootflowDataLoader(dataset, batch_size=16)
+    assert loader.dataset.dataset is dataset
+    assert len(loader.dataset) == 100
+    assert loader.dataset.tasks() == dataset.tasks()
+    assert loader.dataset[3]["id"] == "data_item-3"
+    assert [item["id"] for item in loader.dataset][:2] == ["data_item-0", "data_item-1"]
+    assert pickle.loads(pickle.dumps(loader.dataset))[5]["id"] == "data_item-5"
+
+    sampler = torch.utils.data.SequentialSampler(dataset)
+    with pytest.raises(ValueError):
+        RootflowDataLoader(dataset, batch_size=16, sampler=sampler, shuffle=True)
+    batch_sampler = torch.utils.data.BatchSampler(sampler, 16, False)
+    with pytest.raises(ValueError):
+        RootflowDataLoader(dataset, batch_size=16, batch_sampler=batch_sampler)
+    loader = RootflowDataLoader(dataset, batch_sampler=batch_sampler)
+    assert len(list(loader)) == 7
+
+
+def test_loader_without_targets():
+    dataset = UnlabeledDatasetForTesting()
+    batch = next(iter(RootflowDataLoader(dataset, batch_size=8)))
+    assert "target" not in batch
+    assert batch["data"].tolist() == [float(i) for i in range(8)]
+
+
+def test_loader_custom_collate():
+    dataset = DatasetForTesting()
+    loader = RootflowDataLoader(dataset, batch_size=4, collate_fn=lambda batch: batch)
+    batch = next(iter(loader))
+    assert batch[1]["id"] == "data_item-1"
+
+
+def test_loader_schema_collate():
+    class TensorDatasetForTesting(RootflowDataset):
+        def prepare_data(self, path: str):
+            return [
+                RootflowDataItem(
+                    {"pixels": torch.full((2, 2), float(i)), "caption": f"image {i}"},
+                    target=None,
+                )
+                for i in range(10)
+            ]
+
+    dataset = TensorDatasetForTesting()
+    loader = RootflowDataLoader(dataset, batch_size=4, num_workers=1)
+    batches = list(loader)
+    assert "target" not in batches[0]
+    assert batches[0]["data"]["pixels"].shape == (4, 2, 2)
+    assert batches[-1]["data"]["pixels"][:, 0, 0].tolist() == [8.0, 9.0]
+    assert batches[1]["data"]["caption"][0] == "image 4"
+
+
+def private_memory():
+    with open("/proc/self/smaps_rollup") as smaps:
+        for line in smaps:
+            if line.startswith("Private_Dirty:"):
+                return int(line.split()[1]) * 1024
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/smaps_rollup"), reason="Requires Linux smaps"
+)
+def test_loader_shared_storage_memory():
+    class TextDatasetForTesting(RootflowDataset):
+        def prepare_data(self, path: str):
+            return [
+                RootflowDataItem(
+                    {"text": f"sentence number {i}", "length": i},
+                    id=f"item-{i}",
+                    target=i % 5,
+                )
+                for i in range(100000)
+            ]
+
+    growth = {}
+    for storage in ["list", "shared"]:
+        dataset = TextDatasetForTesting(storage=storage)
+        # Each batch reports the private memory of the worker which loaded it
+        loader = RootflowDataLoader(
+            dataset,
+            batch_size=1000,
+            num_workers=2,
+            collate_fn=lambda rows: (get_worker_info().id, private_memory()),
+            multiprocessing_context="fork",
+        )
+        first, last = {}, {}
+        # Frozen objects are not traversed by collections in the workers, which would
+        # otherwise copy the pages of every object left over from earlier tests
+        gc.collect()
+        gc.freeze()
+        try:
+            for worker_id, memory in loader:
+                first.setdefault(worker_id, memory)
+                last[worker_id] = memory
+        finally:
+            gc.unfreeze()
+        growth[storage] = max(last[id] - first[id] for id in first)
+    # Reading a list of items copies its pages into every worker, shared storage not
+    assert growth["shared"] < 2**21
+    assert growth["list"] > 4 * growth["shared"]
+
+
+def test_loader_spawn_workers():
+    dataset = DatasetForTesting()
+    view = dataset[20:60]
+    RootflowDataLoader(
+        view, batch_size=10, num_workers=1, multiprocessing_context="spawn"
+    )
+    # The storage of the dataset is only changed when asked for
+    assert not isinstance(dataset.data, SharedStorage)
+    loader = RootflowDataLoader(
+        view,
+        batch_size=10,
+        num_workers=1,
+        multiprocessing_context="spawn",
+        share_memory=True,
+    )
+    # The dataset is moved to shared memory, so workers are sent only its location
+    assert isinstance(dataset.data, SharedStorage)
+    assert len(pickle.dumps(view)) < 2048
+    batches = list(loader)
+    assert [id for batch in batches for id in batch["id"]] == [
+        f"data_item-{i}" for i in range(20, 60)
+    ]
@@ -0,0 +1,86 @@
+import pytest
+from setkit.datasets.base.dataset import RootflowDataset, RootflowDataItem
+from setkit.datasets.base.parallel import chunk_slices, run_chunks
+
+
+class DatasetForTesting(RootflowDataset):
+    def prepare_data(self, path: str):
+        return [
+            RootflowDataItem(i, id=f"data_item-{i}", target=i % 3) for i in range(100)
+        ]
+
+
+def fail_on_large(values):
+    if max(values) >= 50:
+        raise ValueError("Too large")
+    return values
+
+
+def test_chunk_slices():
+    slices = chunk_slices(10, 1, chunk_size=4)
+    assert slices == [slice(0, 4), slice(4, 8), slice(8, 10)]
+    assert chunk_slices(10, 2, chunk_size=3, multiple_of=2)[0] == slice(0, 4)
+    assert chunk_slices(0, 2) == []
+
+
+def test_run_chunks_in_order():
+    values = list(range(100))
+    slices = chunk_slices(len(values), 2)
+    progress = []
+    results = run_chunks(
+        sum,
+        slices,
+        lambda chunk: values[chunk],
+        num_workers=2,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+    assert results == [sum(values[chunk]) for chunk in slices]
+    assert progress[-1] == (len(slices), len(slices))
+
+
+def test_run_chunks_error():
+    values = list(range(100))
+    with pytest.raises(RuntimeError, match="rows 50 to 75"):
+        run_chunks(
+            fail_on_large,
+            chunk_slices(len(values), 1),
+            lambda chunk: values[chunk],
+            num_workers=2,
+        )
+
+
+def test_parallel_map():
+    for storage in ["list", "columnar"]:
+        serial_dataset = DatasetForTesting(storage=storage)
+        parallel_dataset = DatasetForTesting(storage=storage)
+        serial_dataset.map(lambda x: x * 2)
+        parallel_dataset.map(lambda x: x * 2, num_workers=2)
+        assert list(parallel_dataset) == list(serial_dataset)
+        parallel_dataset.map(
+            lambda targets: [t + 1 for t in targets],
+            targets=True,
+            batch_size=8,
+            num_workers=2,
+        )
+        assert parallel_dataset[99]["target"] == 1
+
+
+def test_parallel_where():
+    for storage in ["list", "columnar"]:
+        dataset = DatasetForTesting(storage=storage)
+        serial_view = dataset.where(lambda x: x % 7 == 0)
+        parallel_view = dataset.where(lambda x: x % 7 == 0, num_workers=2)
+        assert list(parallel_view) == list(serial_view)
+        batched_view = dataset.where(
+            lambda targets: [t == 0 for t in targets],
+            targets=True,
+            batch_size=16,
+            num_workers=2,
+        )
+        assert len(batched_view) == 34
+
+
+def test_parallel_task_inference():
+    dataset = DatasetForTesting(num_workers=2)
+    assert dataset.tasks() == DatasetForTesting().tasks()
+    assert dataset.tasks()[0]["type"] == "classification"
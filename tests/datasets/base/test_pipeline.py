@@ -0,0 +1,83 @@
+import pickle
+import numpy as np
+import pytest
+from setkit.datasets.base.dataset import RootflowDataset, RootflowDataItem
+from setkit.datasets.base.pipeline import TransformPipeline, batched, compose
+
+
+class DatasetForTesting(RootflowDataset):
+    def prepare_data(self, path: str):
+        return [
+            RootflowDataItem(i, id=f"data_item-{i}", target=i % 3) for i in range(100)
+        ]
+
+
+def add_one(x):
+    return x + 1
+
+
+@batched
+def double_batch(batch):
+    return [x * 2 for x in batch]
+
+
+def test_compose():
+    assert compose([]) is None
+    assert compose([add_one]) is add_one
+    assert compose([add_one, str, len])(99) == 3
+    assert compose([add_one] * 1000)(0) == 1000
+
+    dataset = DatasetForTesting()
+    for _ in range(250):
+        dataset.transform(add_one)
+    assert dataset[0]["data"] == 250
+    assert list(dataset.index_batch([1, 2])[1]) == [251, 252]
+
+
+def test_transform_pipeline():
+    pipeline = TransformPipeline([add_one, double_batch, add_one])
+    assert pipeline(1) == 5
+    assert pipeline.batch([1, 2]) == [5, 7]
+    assert pipeline.batch(np.array([1, 2])) == [5, 7]
+    assert not TransformPipeline()
+    assert TransformPipeline().batch([1]) == [1]
+
+    @batched
+    def bad_batch(batch):
+        return batch[:1]
+
+    with pytest.raises(AssertionError):
+        TransformPipeline([bad_batch]).batch([1, 2])
+
+    loaded_pipeline = pickle.loads(pickle.dumps(pipeline))
+    assert loaded_pipeline.batch([1, 2]) == [5, 7]
+
+
+def test_pipeline_fused_across_layers():
+    dataset = DatasetForTesting().transform(add_one)
+    view = dataset[10:20].transform(add_one)[2:].transform(double_batch)
+    concat = (view + dataset).transform(add_one)
+    assert view[0]["data"] == (12 + 2) * 2
+    assert concat[0]["data"] == (12 + 2) * 2 + 1
+    assert concat[8]["data"] == 0 + 1 + 1
+    assert list(concat.index_batch([0, 8])[1]) == [29, 2]
+    assert view.index_batch([0, 1])[1] == [28, 30]
+
+    dataset.transform(add_one)
+    assert view[0]["data"] == (13 + 2) * 2
+    assert concat.index_batch([8])[1] == [3]
+
+
+def test_batched_transform_called_once_per_batch():
+    batches = []
+
+    @batched
+    def record(batch):
+        batches.append(len(batch))
+        return batch
+
+    for storage in ["list", "columnar"]:
+        batches.clear()
+        dataset = DatasetForTesting(storage=storage).transform(record)
+        dataset[1:].index_batch(list(range(16)))
+        assert batches == [16]
@@ -0,0 +1,58 @@
+from collections import Counter
+import pickle
+import numpy as np
+import pytest
+from setkit.datasets.base.sketches import (
+    CountMinSketch,
+    HyperLogLog,
+    KLLSketch,
+    hash_values,
+)
+
+
+def test_hash_values():
+    assert (
+        hash_values([1, 1.0, True, -0.0])[:3].tolist()
+        == [hash_values(np.array([1]))[0]] * 3
+    )
+    assert hash_values([-0.0])[0] == hash_values(np.array([0.0]))[0]
+    assert hash_values(["a", "b"])[0] != hash_values(["a", "b"])[1]
+    assert hash_values(["a"])[0] == pickle.loads(pickle.dumps(hash_values(["a"])))[0]
+
+
+def test_hyperloglog():
+    sketch = HyperLogLog()
+    for chunk in np.array_split(np.arange(100000) % 20000, 10):
+        sketch.update(hash_values(chunk))
+    assert sketch.estimate() == pytest.approx(20000, rel=0.05)
+    other = HyperLogLog().update(hash_values(np.arange(10000, 30000)))
+    assert sketch.merge(other).estimate() == pytest.approx(30000, rel=0.05)
+    with pytest.raises(ValueError):
+        sketch.merge(HyperLogLog(precision=10))
+
+
+def test_kll_sketch():
+    values = np.random.default_rng(0).random(100000)
+    sketch = KLLSketch()
+    for chunk in np.array_split(values, 4):
+        sketch.merge(KLLSketch().update(chunk))
+    assert sketch.count == len(values)
+    assert sum(len(level) for level in sketch.levels) < 1000
+    estimates = sketch.quantiles([0.1, 0.5, 0.9])
+    assert estimates == pytest.approx(np.quantile(values, [0.1, 0.5, 0.9]), abs=0.02)
+    assert KLLSketch().quantiles([0.5]) is None
+
+
+def test_count_min_sketch():
+    values = np.random.default_rng(0).zipf(1.5, size=50000)
+    sketch = CountMinSketch(num_heavy_hitters=3)
+    for chunk in np.array_split(values, 5):
+        sketch.merge(
+            CountMinSketch(num_heavy_hitters=3).update(chunk, hash_values(chunk))
+        )
+    counts = Counter(values.tolist())
+    assert list(sketch.heavy_hitters()) == [value for value, _ in counts.most_common(3)]
+    assert sketch.estimate(1) >= counts[1]
+    labels = ["cat", "dog", "cat"]
+    sketch = CountMinSketch().update(labels, hash_values(labels))
+    assert sketch.heavy_hitters() == {"cat": 2, "dog": 1}
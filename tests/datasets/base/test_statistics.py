@@ -0,0 +1,97 @@
+import math
+import numpy as np
+import pytest
+import torch
+from setkit.datasets.base.statistics import (
+    MAX_TRACKED_VALUES,
+    ColumnSketch,
+    ColumnStatistics,
+    accumulate_sketches,
+    accumulate_statistics,
+    merge_sketches,
+    merge_statistics,
+    split_columns,
+)
+
+
+def test_merge_column_statistics():
+    values = np.random.default_rng(0).normal(3.0, 2.0, size=1000)
+    statistics = ColumnStatistics()
+    for chunk in np.array_split(values, 7):
+        statistics.merge(ColumnStatistics().update(chunk))
+    result = statistics.result()
+    assert result["count"] == 1000
+    assert result["mean"] == pytest.approx(np.mean(values))
+    assert result["std"] == pytest.approx(np.std(values))
+    assert result["min"] == values.min()
+    assert result["max"] == values.max()
+    assert result == pytest.approx(ColumnStatistics().update(values).result())
+
+
+def test_feature_column_statistics():
+    values = [torch.tensor([i, 2.0 * i]) for i in range(10)]
+    result = ColumnStatistics().update(values).result()
+    assert np.allclose(result["mean"], [4.5, 9.0])
+    assert np.allclose(result["max"], [9.0, 18.0])
+
+
+def test_missing_column_statistics():
+    values = [1.0, None, 3.0, math.nan]
+    result = ColumnStatistics().update(values).result()
+    assert result["missing"] == 2
+    assert result["missing_rate"] == 0.5
+    assert result["mean"] == 2.0
+
+
+def test_value_counts_column_statistics():
+    statistics = ColumnStatistics(count_values=True)
+    statistics.update(["cat", "dog", "cat", None])
+    result = statistics.result()
+    assert result["value_counts"] == {"cat": 2, "dog": 1}
+    assert result["missing"] == 1
+    assert "mean" not in result
+    statistics.update(list(range(MAX_TRACKED_VALUES)))
+    assert "value_counts" not in statistics.result()
+
+
+def test_accumulate_statistics():
+    data = [{"text": "a", "length": i} for i in range(4)]
+    targets = [0, 1, 1, 2]
+    chunk_statistics = [
+        accumulate_statistics((data[:2], targets[:2])),
+        accumulate_statistics((data[2:], targets[2:])),
+    ]
+    data_statistics = merge_statistics([data for data, _ in chunk_statistics])
+    target_statistics = merge_statistics([target for _, target in chunk_statistics])
+    assert set(data_statistics) == set(split_columns(data, "data"))
+    assert data_statistics["data.text"]["value_counts"] == {"a": 4}
+    assert data_statistics["data.length"]["mean"] == 1.5
+    assert target_statistics["target"]["value_counts"] == {1: 2, 0: 1, 2: 1}
+
+
+def test_column_sketch():
+    values = [1.0, None, 3.0, 2.0]
+    sketch = ColumnSketch().update(values[:2]).merge(ColumnSketch().update(values[2:]))
+    result = sketch.result()
+    assert result["missing"] == 1
+    assert result["distinct"] == 3
+    assert result["quantiles"][0.5] == 2.0
+    assert "heavy_hitters" not in result
+    arrays = [np.zeros(2), np.ones(2)]
+    assert "distinct" not in ColumnSketch().update(arrays).result()
+
+
+def test_accumulate_sketches():
+    ids = [f"item-{i}" for i in range(4)]
+    data = [{"text": "a", "length": i} for i in range(4)]
+    targets = [True, False, True, True]
+    sketches = merge_sketches(
+        [
+            accumulate_sketches((ids[:2], data[:2], targets[:2])),
+            accumulate_sketches((ids[2:], data[2:], targets[2:])),
+        ]
+    )
+    assert set(sketches) == {"id", "data.text", "data.length", "target"}
+    assert sketches["id"].result()["distinct"] == 4
+    assert sketches["data.text"].result()["heavy_hitters"] == {"a": 4}
+    assert sketches["target"].result()["heavy_hitters"] == {True: 3, False: 1}
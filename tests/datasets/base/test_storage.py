@@ -0,0 +1,215 @@
+import os
+import pickle
+import numpy as np
+import pytest
+from setkit.datasets.base.dataset import RootflowDataset, RootflowDataItem
+from setkit.datasets.base.loader import RootflowDataLoader
+from setkit.datasets.base.storage import (
+    ColumnarStorage,
+    MemmapStorage,
+    RaggedColumn,
+    ShardedStorage,
+    SharedStorage,
+    pack_column,
+    shard_directory_name,
+    write_shard,
+)
+
+
+def make_items():
+    return [
+        RootflowDataItem([i, i * 2], id=f"item-{i}", target=float(i)) for i in range(10)
+    ]
+
+
+def test_pack_column():
+    assert pack_column([None, None]) is None
+    numeric_column = pack_column([[1, 2], [3, 4]])
+    assert numeric_column.dtype.kind == "i"
+    assert numeric_column.shape == (2, 2)
+    string_column = pack_column(["a", "bc"])
+    assert string_column.dtype == object
+    ragged_column = pack_column([[1], [2, 3]])
+    assert ragged_column.dtype == object
+    assert ragged_column[1] == [2, 3]
+
+
+def test_create_columnar_storage():
+    storage = ColumnarStorage.from_items(make_items())
+    assert len(storage) == 10
+    assert storage.column("data").shape == (10, 2)
+    assert storage.column("target").dtype == np.float64
+    id, data, target = storage.row(3)
+    assert id == "item-3"
+    assert list(data) == [3, 6]
+    assert target == 3.0
+    assert isinstance(target, float)
+
+
+def test_columnar_storage_without_ids():
+    storage = ColumnarStorage(data=[1, 2, 3])
+    assert storage.column("id") is None
+    assert storage.row(1) == (None, 2, None)
+
+
+def test_columnar_storage_mismatched_lengths():
+    with pytest.raises(ValueError):
+        ColumnarStorage(ids=["a", "b"], data=[1, 2, 3])
+
+
+def test_columnar_storage_set_item():
+    storage = ColumnarStorage.from_items(make_items())
+    storage[2] = RootflowDataItem([0, 0], id="new", target="label")
+    assert storage[2].id == "new"
+    assert storage[2].target == "label"
+    assert storage[3].target == 3.0
+
+    storage = ColumnarStorage(data=[1, 2, 3])
+    storage[0] = RootflowDataItem(0.5)
+    assert storage.row(0)[1] == 0.5
+
+
+def test_columnar_storage_map_column():
+    storage = ColumnarStorage.from_items(make_items())
+    storage.map_column("target", lambda target: target + 1)
+    assert storage.row(0)[2] == 1.0
+
+    storage.map_column("data", lambda batch: batch.sum(axis=1), batch_size=3)
+    assert storage.column("data").shape == (10,)
+    assert storage.row(4)[1] == 12
+
+    storage.map_column("id", lambda batch: [id.upper() for id in batch], batch_size=4)
+    assert storage.row(9)[0] == "ITEM-9"
+
+
+def test_ragged_column():
+    column = RaggedColumn.from_records([[1, 2, 3], [], [4]])
+    assert len(column) == 3
+    assert list(column[0]) == [1, 2, 3]
+    assert len(column[1]) == 0
+    assert list(column[-1]) == [4]
+    assert np.shares_memory(column[0], column.values)
+
+    string_column = RaggedColumn.from_records(["hello", "", "wörld"])
+    assert string_column[2] == "wörld"
+    assert string_column[0:2] == ["hello", ""]
+
+
+def test_write_memmap_storage(tmp_path):
+    items = make_items()
+    storage = MemmapStorage.write(
+        str(tmp_path),
+        ids=[item.id for item in items],
+        data=[item.data for item in items],
+        targets=[item.target for item in items],
+    )
+    assert isinstance(storage.column("data"), np.memmap)
+    assert len(storage) == 10
+    id, data, target = storage.row(4)
+    assert id == "item-4"
+    assert list(data) == [4, 8]
+    assert target == 4.0
+    assert np.shares_memory(data, storage.column("data"))
+
+    reopened_storage = pickle.loads(pickle.dumps(storage))
+    assert reopened_storage.row(9)[0] == "item-9"
+
+    with pytest.raises(ValueError):
+        MemmapStorage.write(str(tmp_path / "invalid"), data=[{"a": 1}, {"b": 2}])
+
+
+def test_create_memmap_storage(tmp_path):
+    storage = MemmapStorage.create(str(tmp_path), 100, data_shape=(3,), target_shape=())
+    storage.column("data")[:50] = 1.0
+    storage.column("target")[50:] = 1
+    storage.flush()
+
+    storage = MemmapStorage(str(tmp_path))
+    assert list(storage.row(0)[1]) == [1.0, 1.0, 1.0]
+    assert storage.row(0)[2] == 0
+    assert storage.row(99)[2] == 1
+    assert storage.row(99)[0] is None
+
+
+def test_memmap_dataset(tmp_path):
+    class MemmapDatasetForTesting(RootflowDataset):
+        def prepare_data(self, path: str):
+            return MemmapStorage(path)
+
+    data = np.arange(200, dtype=np.float32).reshape(100, 2)
+    targets = np.arange(100) % 3
+    MemmapStorage.write(str(tmp_path), data=data, targets=targets)
+
+    dataset = MemmapDatasetForTesting(str(tmp_path))
+    assert dataset[5]["id"] == "MemmapDatasetForTesting-5"
+    assert list(dataset[5]["data"]) == [10.0, 11.0]
+    train_split, validation_split = dataset.split(seed=0)
+    assert len(train_split) + len(validation_split) == 100
+
+    loader = RootflowDataLoader(dataset[10:30], batch_size=8)
+    batch = next(iter(loader))
+    assert batch["data"].shape == (8, 2)
+    assert batch["data"][0, 0] == 20.0
+
+
+def test_sharded_storage(tmp_path):
+    data = np.arange(50, dtype=np.float32).reshape(25, 2)
+    shard_results = [
+        write_shard(
+            (
+                str(tmp_path / shard_directory_name(shard_index)),
+                [f"item-{i}" for i in range(start, min(start + 10, 25))],
+                data[start : start + 10],
+                [{"label": i} for i in range(start, min(start + 10, 25))],
+            )
+        )
+        for shard_index, start in enumerate(range(0, 25, 10))
+    ]
+    ShardedStorage.write_manifest(str(tmp_path), 10, shard_results, {"name": "test"})
+
+    storage = ShardedStorage(str(tmp_path))
+    assert len(storage) == 25
+    assert storage.num_shards == 3
+    assert storage.metadata == {"name": "test"}
+    assert storage.row(13) == ("item-13", pytest.approx([26.0, 27.0]), {"label": 13})
+    # Only the shard which was read has been opened
+    assert [shard is not None for shard in storage._shards] == [False, True, False]
+    gathered = storage.gather("data", [24, 0, 11])
+    assert isinstance(gathered, np.ndarray)
+    assert gathered[:, 0].tolist() == [48.0, 0.0, 22.0]
+    assert storage.gather("id", range(8, 12)) == [f"item-{i}" for i in range(8, 12)]
+    assert storage.column("target")[-1] == {"label": 24}
+
+    reopened_storage = pickle.loads(pickle.dumps(storage))
+    assert len(pickle.dumps(storage)) < 500
+    assert reopened_storage.row(24)[0] == "item-24"
+
+
+def test_shared_storage():
+    items = [
+        RootflowDataItem(
+            {"text": f"text {i}", "length": i}, id=f"item-{i}", target=np.arange(i)
+        )
+        for i in range(10)
+    ]
+    storage = SharedStorage.from_storage(items)
+    directory = storage.directory
+    assert storage.row(3)[0] == "item-3"
+    assert storage.row(3)[1] == {"text": "text 3", "length": 3}
+    assert storage.row(3)[2].tolist() == [0, 1, 2]
+    assert isinstance(storage.column("id"), RaggedColumn)
+    assert isinstance(storage.column("data"), RaggedColumn)
+    assert storage.gather("data", [1, 2])[1]["length"] == 2
+
+    copy = pickle.loads(pickle.dumps(storage))
+    assert copy.directory == directory
+    assert copy.row(9)[1]["text"] == "text 9"
+    del copy
+    assert os.path.exists(directory)
+    del storage
+    assert not os.path.exists(directory)
+
+    numeric = SharedStorage.from_storage(ColumnarStorage.from_items(make_items()))
+    assert numeric.column("data").shape == (10, 2)
+    id, data, target = numeric.row(4)
+    assert (id, data.tolist(), target) == ("item-4", [4, 8], 4.0)
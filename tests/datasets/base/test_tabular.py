@@ -0,0 +1,104 @@
+import csv
+import numpy as np
+import pytest
+from setkit.datasets.base.dataset import RootflowDataset
+from setkit.datasets.base.storage import ColumnarStorage
+from setkit.datasets.base.tabular import convert_column, read_csv
+
+
+def write_csv(path, length=100):
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["id", "text", "x", "y", "label", "flag"])
+        for i in range(length):
+            writer.writerow(
+                [f"row-{i}", f"text, {i}", i, "" if i == 5 else i / 2, i % 3, i % 2]
+            )
+    return str(path)
+
+
+def test_convert_column():
+    assert convert_column(["1", "2"], "int64").tolist() == [1, 2]
+    assert np.isnan(convert_column(["1.5", ""], "float32")[1])
+    assert convert_column(["True", "0", "yes"], "bool").tolist() == [True, False, True]
+    assert convert_column(["a", "b"], {"a": 0, "b": 1}.__getitem__) == [0, 1]
+    with pytest.raises(ValueError):
+        convert_column(["1.5"], "int64")
+
+
+def test_read_csv(tmp_path):
+    path = write_csv(tmp_path / "data.csv")
+    storage = read_csv(
+        path,
+        data=["x", "y"],
+        id="id",
+        target={"label": "label", "flag": "flag"},
+        types={"x": "float32", "y": "float32", "label": "int64", "flag": "bool"},
+        chunk_size=7,
+    )
+    assert isinstance(storage, ColumnarStorage)
+    assert len(storage) == 100
+    assert storage.column("data").shape == (100, 2)
+    assert storage.column("data").dtype == np.float32
+    id, data, target = storage.row(4)
+    assert id == "row-4"
+    assert data.tolist() == [4.0, 2.0]
+    assert target == {"label": 1, "flag": False}
+    assert np.isnan(storage.row(5)[1][1])
+
+    text_storage = read_csv(path, data="text")
+    assert text_storage.row(10) == (None, "text, 10", None)
+
+    with pytest.raises(ValueError):
+        read_csv(path, data="missing")
+
+
+def test_read_csv_blank_lines(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("id,x\n" + "\n" * 10 + "a,1\n\nb,2\n")
+    for num_workers in [0, 2]:
+        storage = read_csv(
+            str(path),
+            data="x",
+            id="id",
+            types={"x": "int64"},
+            chunk_size=5,
+            num_workers=num_workers,
+        )
+        assert len(storage) == 2
+        assert storage.gather("id", range(2)) == ["a", "b"]
+        assert storage.column("data").tolist() == [1, 2]
+
+
+def test_parallel_read_csv(tmp_path):
+    path = write_csv(tmp_path / "data.csv", length=1000)
+    arguments = dict(data="text", id="id", target="y", types={"y": "float64"})
+    storage = read_csv(path, **arguments)
+    # Small byte chunks split most rows across chunk boundaries
+    parallel_storage = read_csv(path, num_workers=2, chunk_size=100, **arguments)
+    assert len(parallel_storage) == 1000
+    assert parallel_storage.gather("id", range(1000)) == storage.gather(
+        "id", range(1000)
+    )
+    assert parallel_storage.gather("data", range(1000)) == storage.gather(
+        "data", range(1000)
+    )
+    assert np.array_equal(
+        parallel_storage.column("target"), storage.column("target"), equal_nan=True
+    )
+
+    with pytest.raises(RuntimeError):
+        read_csv(path, num_workers=2, data="text", types={"text": "int64"})
+
+
+def test_read_csv_dataset(tmp_path):
+    path = write_csv(tmp_path / "data.csv")
+
+    class CsvDatasetForTesting(RootflowDataset):
+        def prepare_data(self, directory: str):
+            return read_csv(path, data="text", target="label", types={"label": "int64"})
+
+    dataset = CsvDatasetForTesting(str(tmp_path))
+    assert dataset[3]["data"] == "text, 3"
+    assert dataset[3]["target"] == 0
+    assert dataset.tasks()[0]["type"] == "classification"
@@ -0,0 +1,127 @@
+import numpy as np
+from setkit.datasets.base.dataset import RootflowDataset, RootflowDataItem
+from setkit.datasets.base.transform_cache import (
+    TransformCache,
+    estimate_size,
+    get_transform_cache,
+    nondeterministic,
+)
+
+
+class DatasetForTesting(RootflowDataset):
+    def prepare_data(self, path: str):
+        return [
+            RootflowDataItem(i, id=f"data_item-{i}", target=i % 3) for i in range(100)
+        ]
+
+
+class CountingTransform:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, x):
+        self.calls += 1
+        return x * 2
+
+
+def test_transform_cache_eviction():
+    cache = TransformCache(max_bytes=3 * estimate_size(np.zeros(10)))
+    for key in range(3):
+        cache.put(key, np.zeros(10))
+    assert cache.get(0)[0]
+    cache.put(3, np.zeros(10))
+    assert len(cache) == 3
+    assert not cache.get(1)[0]
+    assert cache.get(0)[0]
+    cache.put("large", np.zeros(1000))
+    assert not cache.get("large")[0]
+    cache.set_max_bytes(0)
+    assert len(cache) == 0 and cache.used_bytes == 0
+
+
+def test_cache_dataset_transforms():
+    transform = CountingTransform()
+    dataset = DatasetForTesting().transform(transform).cache_transforms()
+    assert [item["data"] for item in dataset] == [i * 2 for i in range(100)]
+    assert [item["data"] for item in dataset] == [i * 2 for i in range(100)]
+    assert transform.calls == 100
+    assert list(dataset.index_batch([1, 2, 3])[1]) == [2, 4, 6]
+    assert transform.calls == 100
+
+    dataset.map(lambda x: x + 1)
+    assert dataset[1]["data"] == 4
+    assert transform.calls == 101
+
+
+def test_cache_view_and_concat_transforms():
+    transform = CountingTransform()
+    view = DatasetForTesting()[10:20].transform(transform).cache_transforms()
+    assert view.index_batch([0, 1])[1] == [20, 22]
+    assert view[1]["data"] == 22
+    assert transform.calls == 2
+
+    concat_transform = CountingTransform()
+    concat = (DatasetForTesting() + DatasetForTesting()).transform(concat_transform)
+    concat.cache_transforms()
+    assert concat[150]["data"] == 100
+    assert concat.index_batch([150, 151])[1] == [100, 102]
+    assert concat_transform.calls == 2
+
+
+def test_nondeterministic_transforms_bypass_cache():
+    transform = CountingTransform()
+    random_calls = []
+
+    @nondeterministic
+    def augment(x):
+        random_calls.append(x)
+        return x + 1
+
+    dataset = DatasetForTesting().transform([transform, augment]).cache_transforms()
+    assert dataset[5]["data"] == 11
+    assert dataset[5]["data"] == 11
+    assert transform.calls == 1
+    assert len(random_calls) == 2
+    assert get_transform_cache().hits > 0
+
+
+def test_cached_dataset_through_view():
+    transform = CountingTransform()
+    dataset = DatasetForTesting().transform(transform).cache_transforms()
+    view = dataset[:10].transform(lambda x: x + 1)
+    assert [item["data"] for item in view] == [i * 2 + 1 for i in range(10)]
+    assert view.index_batch([0, 1])[1] == [1, 3]
+    assert transform.calls == 10
+
+
+def test_unrelated_transforms_keep_cache():
+    transform = CountingTransform()
+    dataset = DatasetForTesting().transform(transform).cache_transforms()
+    stats = dataset.stats()
+    assert [item["data"] for item in dataset][:3] == [0, 2, 4]
+    calls = transform.calls
+    other_dataset = DatasetForTesting()
+    other_dataset.transform(str)
+    other_dataset[:10].transform(str)
+    assert [item["data"] for item in dataset][:3] == [0, 2, 4]
+    assert transform.calls == calls
+    assert dataset.stats() is stats
+
+    # Concatenating merges lineages, so transforms of either dataset apply
+    concat_result = dataset + other_dataset
+    assert concat_result[100]["data"] == "0"
+    other_dataset.transform(len)
+    assert concat_result[100]["data"] == 1
+
+
+def test_negative_indices_share_cache():
+    transform = CountingTransform()
+    dataset = DatasetForTesting().transform(transform).cache_transforms()
+    assert dataset[99]["data"] == dataset[-1]["data"] == 198
+    assert list(dataset.index_batch([-2, 98])[1]) == [196, 196]
+    assert transform.calls == 2
+
+    view_transform = CountingTransform()
+    view = DatasetForTesting()[:10].transform(view_transform).cache_transforms()
+    assert view[9]["data"] == view[-1]["data"] == 18
+    assert view_transform.calls == 1
@@ -1,3 +1,6 @@
+import pytest
+import numpy as np
+import torch
 from setkit.datasets.base.utils import *
 
 
@@ -74,6 +77,82 @@ def test_get_unique_unordered():
 
 
 def test_predict_task():
-    # Remember to test inputs for tensor types
-    # Test for single element lists as well
-    raise NotImplementedError
+    assert infer_task_from_targets([0, 2, 1]) == ("classification", 2)
+    assert infer_task_from_targets(iter([1, 0])) == ("binary", 1)
+    assert infer_task_from_targets([True, False]) == ("binary", 2)
+    assert infer_task_from_targets([0.5]) == ("regression", 1)
+    assert infer_task_from_targets([[0, 1], [1, 0]]) == ("classification", 2)
+    assert infer_task_from_targets([[1, 1], [0, 1]]) == ("binary", 2)
+    assert infer_task_from_targets([[0.5, 1.0, 2.0]]) == ("regression", 3)
+    assert infer_task_from_targets([torch.tensor(3), torch.tensor(1)]) == (
+        "classification",
+        3,
+    )
+    assert infer_task_from_targets(np.array([0, 4, 1])) == ("classification", 4)
+    assert infer_task_from_targets(np.zeros((5, 3))) == ("regression", 3)
+    assert infer_task_from_targets(["a", "b"]) == (None, None)
+    assert infer_task_from_targets([1, 0.5]) == (None, None)
+    assert infer_task_from_targets([]) is None
+
+
+def test_task_accumulator_merge():
+    targets = np.array([0, 1, 1, 5, 2])
+    accumulator = TaskAccumulator().update(targets[:2])
+    accumulator.merge(TaskAccumulator().update(targets[2:].tolist()))
+    assert accumulator.count == 5
+    assert accumulator.result() == infer_task_from_targets(targets)
+    accumulator.merge(TaskAccumulator().update([0.5]))
+    assert accumulator.result() == (None, None)
+
+    multitask = accumulate_tasks(["a", "b"], [{"a": 1, "b": 0.5}, {"a": 3, "b": 1.0}])
+    assert [task.result() for task in multitask] == [
+        ("classification", 3),
+        ("regression", 1),
+    ]
+
+
+def test_combine_tasks():
+    tasks_one = [{"name": "a", "type": "binary", "shape": 2}]
+    tasks_two = [
+        {"name": "b", "type": "regression", "shape": 1},
+        {"name": "a", "type": "binary", "shape": 2},
+    ]
+    combined_tasks = combine_tasks([tasks_one, None, tasks_two])
+    assert [task["name"] for task in combined_tasks] == ["a", "b"]
+    assert combine_tasks([None, None]) is None
+    with pytest.raises(ValueError):
+        combine_tasks([tasks_one, [{"name": "a", "type": "binary", "shape": 3}]])
+
+
+def test_get_unique_array():
+    indices = np.array([0, 5, 2, 6, 1, 7, 8, 2])
+    assert get_unique_array(indices).tolist() == [0, 1, 2, 5, 6, 7, 8]
+    assert get_unique_array(indices, ordered=False).tolist() == [0, 5, 2, 6, 1, 7, 8]
+    sorted_indices = np.arange(10)
+    assert get_unique_array(sorted_indices).tolist() == list(range(10))
+
+
+def test_index_array():
+    assert index_array([3, 1, 2]).dtype == np.int32
+    assert index_array(range(0, 10, 3)).tolist() == [0, 3, 6, 9]
+    assert index_array([2**40, 0]).dtype == np.int64
+    assert index_array(np.array([], dtype=np.int64)).dtype == np.int32
+
+
+def test_compose_indices():
+    assert compose_indices(range(10, 100, 2), range(5, 10)) == range(20, 30, 2)
+    assert compose_indices(range(10, 20), range(9, -1, -1)) == range(19, 9, -1)
+    assert compose_indices(range(10, 20), [0, -1]).tolist() == [10, 19]
+    indices = np.arange(100, 200)
+    assert compose_indices(indices, range(4, -1, -2)).tolist() == [104, 102, 100]
+    assert compose_indices(indices, [5, 1]).tolist() == [105, 101]
+    with pytest.raises(IndexError):
+        compose_indices(range(10), [10])
+    with pytest.raises(IndexError):
+        compose_indices(range(10), range(5, 15))
+
+
+def test_search_indices():
+    positions = search_indices(np.array([2, 5, 9]), np.array([9, 3, 2, 10, -1]))
+    assert positions.tolist() == [2, -1, 0, -1, -1]
+    assert search_indices(np.array([], dtype=np.int32), np.array([1])).tolist() == [-1]